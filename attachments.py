@@ -0,0 +1,149 @@
+import logging
+import time
+from telegram import Update
+from telegram.ext import ContextTypes, filters
+from database import add_media_group_attachment, claim_unrelayed_attachments, release_attachments
+from jobqueue import job_handler, submit_jobs
+from logsetup import with_log_context
+from metrics import timed, HANDLER_LATENCY
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 支持的附件类型
+ATTACHMENT_KINDS = {
+    'photo': '图片',
+    'document': '文件',
+    'video': '视频'
+}
+
+# 带附件的消息
+MEDIA_FILTER = filters.PHOTO | filters.Document.ALL | filters.VIDEO
+
+# 相册中的消息分别到达，等待这么久（秒）后再复制到管理群组，使同一相册一起复制
+MEDIA_GROUP_WAIT = 2
+
+# 相册中先于带标签的消息到达的附件在内存中保留的时间（秒）
+MEDIA_GROUP_HOLD = 60
+
+def extract_attachment(message):
+    """提取消息中附件的 file_id 和元数据，没有支持的附件时返回 None"""
+    if message.photo:
+        # 同一图片的多个尺寸，取最大的
+        media, kind = message.photo[-1], 'photo'
+    elif message.video:
+        media, kind = message.video, 'video'
+    elif message.document:
+        media, kind = message.document, 'document'
+    else:
+        return None
+    return {
+        'chat_id': message.chat_id,
+        'message_id': message.message_id,
+        'media_group_id': message.media_group_id,
+        'kind': kind,
+        'file_id': media.file_id,
+        'file_unique_id': media.file_unique_id,
+        'file_name': getattr(media, 'file_name', None),
+        'mime_type': getattr(media, 'mime_type', None),
+        'file_size': media.file_size,
+        'width': getattr(media, 'width', None),
+        'height': getattr(media, 'height', None),
+        'duration': getattr(media, 'duration', None)
+    }
+
+def describe_attachments(attachments):
+    """管理群组消息中的附件说明，如“图片 ×3”"""
+    counts = {}
+    for attachment in attachments:
+        counts[attachment['kind']] = counts.get(attachment['kind'], 0) + 1
+    parts = [f"{ATTACHMENT_KINDS[kind]} ×{count}" if count > 1 else ATTACHMENT_KINDS[kind] for kind, count in counts.items()]
+    suffix = "（相册，稍后复制全部附件）" if any(attachment['media_group_id'] for attachment in attachments) else ""
+    return "、".join(parts) + suffix
+
+class MediaGroupBuffer:
+    """暂存相册中先于带 #反馈 标签的消息到达的附件
+
+    这些附件可能属于普通的相册而不是反馈，只在内存中保留 MEDIA_GROUP_HOLD 秒，
+    带标签的消息到达后随反馈一起写入数据库，超时未认领的直接丢弃。
+    """
+
+    def __init__(self, hold=MEDIA_GROUP_HOLD):
+        self.hold = hold
+        self._groups = {}
+
+    def __len__(self):
+        """暂存的附件数"""
+        return sum(len(items) for _, items in self._groups.values())
+
+    def add(self, attachment):
+        """暂存一条附件"""
+        self._expire()
+        _, items = self._groups.setdefault(attachment['media_group_id'], (time.monotonic(), []))
+        items.append(attachment)
+
+    def take(self, media_group_id):
+        """取出相册中暂存的附件"""
+        if media_group_id is None:
+            return []
+        return self._groups.pop(media_group_id, (None, []))[1]
+
+    def _expire(self):
+        """丢弃超时未认领的相册"""
+        deadline = time.monotonic() - self.hold
+        for media_group_id in [key for key, (added, _) in self._groups.items() if added < deadline]:
+            del self._groups[media_group_id]
+
+@timed(HANDLER_LATENCY)
+@with_log_context
+async def handle_media_group_item(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """相册中没有 #反馈 标签的其他附件：归入同一相册的反馈，已转发的反馈补充复制到管理群组"""
+    message = update.effective_message
+    if not message.media_group_id or not context.bot_data['admin_router'].is_user_group(update.effective_chat.id):
+        return
+    attachment = extract_attachment(message)
+    if attachment is None:
+        return
+
+    result = add_media_group_attachment(attachment)
+    if result is None:
+        return
+    feedback_id, relay_chat_id, relay_message_id = result
+    if feedback_id is None:
+        # 带标签的消息还没到，可能是普通相册
+        context.bot_data['media_groups'].add(attachment)
+    elif relay_chat_id is not None:
+        submit_jobs(context.bot_data, [('attachments', {
+            'feedback_id': feedback_id,
+            'chat_id': relay_chat_id,
+            'reply_to': relay_message_id
+        })])
+
+@job_handler('attachments')
+async def deliver_attachments(pool, payload):
+    """把反馈的附件复制到管理群组：只传 file 所在的消息 ID，文件不经过本机"""
+    chat_id, reply_to = payload['chat_id'], payload['reply_to']
+    attachments = claim_unrelayed_attachments(payload['feedback_id'], chat_id, reply_to)
+    if attachments is None:
+        raise RuntimeError("读取附件失败")
+    if not attachments:
+        return
+
+    try:
+        if len(attachments) == 1:
+            _, from_chat_id, message_id, _ = attachments[0]
+            await pool.bot.copy_message(
+                chat_id=chat_id, from_chat_id=from_chat_id, message_id=message_id,
+                reply_to_message_id=reply_to, allow_sending_without_reply=True
+            )
+        else:
+            # 一次复制多条消息，同一相册的附件仍为相册（不支持回复，紧跟在反馈消息之后）
+            await pool.bot.copy_messages(
+                chat_id=chat_id, from_chat_id=attachments[0][1],
+                message_ids=[attachment[2] for attachment in attachments]
+            )
+    except Exception:
+        # 释放认领，重试时重新认领（包括期间到达的附件）
+        release_attachments([attachment[0] for attachment in attachments])
+        raise
+    logger.info("已复制 %s 个附件到管理群组 %s", len(attachments), chat_id)
@@ -0,0 +1,327 @@
+"""端到端性能测试：在本地模拟的 Bot API 上运行 bot.py 的应用，按目标速率发送反馈和回调
+
+用法示例：
+    python3 bench_bot.py --rate 200 --duration 30 --latency 0.02 --rate-limit 0.01 --output bench_bot.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import random
+import subprocess
+import tempfile
+import time
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 模拟的群组 ID
+ADMIN_CHAT_ID = -1000000000001
+USER_CHAT_ID = -1000000000002
+
+# 反馈内容样例
+FEEDBACK_TEMPLATES = [
+    '#反馈 #问题反馈 播放器在第 {n} 集卡住了 !!',
+    '#反馈 #功能建议 希望增加按年份筛选，编号 {n}',
+    '#反馈 #疑问咨询 第 {n} 号资源为什么无法下载？',
+    '#反馈 字幕和画面不同步，大约差了 {n} 秒 !!!',
+    '#反馈 #一般建议 首页加载有点慢 {n}'
+]
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='bot.py 端到端性能测试')
+    parser.add_argument('--rate', type=float, default=100, help='目标更新速率（条/秒）')
+    parser.add_argument('--duration', type=float, default=10, help='发送持续时间（秒）')
+    parser.add_argument('--callback-ratio', type=float, default=0.3, help='回调查询占比')
+    parser.add_argument('--request-ratio', type=float, default=0.1, help='求片消息占比（其余为反馈）')
+    parser.add_argument('--media-ratio', type=float, default=0.0, help='带图片的反馈占比，其中一半为 3 张图片的相册')
+    parser.add_argument('--titles', type=int, default=50, help='求片涉及的影片数，越少重复请求越多')
+    parser.add_argument('--users', type=int, default=500, help='模拟用户数')
+    parser.add_argument('--latency', type=float, default=0.0, help='每次 API 调用的固定延迟（秒）')
+    parser.add_argument('--jitter', type=float, default=0.0, help='每次 API 调用的随机附加延迟上限（秒）')
+    parser.add_argument('--rate-limit', type=float, default=0.0, help='API 调用返回 429 的概率')
+    parser.add_argument('--retry-after', type=int, default=1, help='429 响应中的 retry_after（秒）')
+    parser.add_argument('--admin-groups', type=int, default=1, help='管理群组数，反馈按默认路由分配到各群组')
+    parser.add_argument('--pin-mode', choices=('message', 'dashboard'), default='message', help='置顶模式')
+    parser.add_argument('--drain-timeout', type=float, default=30, help='发送结束后等待处理完成的最长时间（秒）')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    parser.add_argument('--record', default='', help='同时写入回放日志（供 replay.py 使用）')
+    parser.add_argument('--output', default='bench_bot.json', help='结果文件（JSON）')
+    return parser.parse_args()
+
+def write_bench_config(directory, **overrides):
+    """生成测试用配置文件，默认放宽限流以免丢弃合成流量"""
+    path = os.path.join(directory, 'config.json')
+    data = {
+        'bot_token': '123456:BENCH',
+        'admin_ids': [],
+        'admin_group_id': ADMIN_CHAT_ID,
+        'feedback_groups': [USER_CHAT_ID],
+        'db_file': os.path.join(directory, 'feedback.db'),
+        'throttle_user_per_minute': 1000000,
+        'throttle_user_burst': 1000000,
+        'throttle_chat_per_minute': 1000000,
+        'throttle_chat_burst': 1000000,
+        'tmdb_api_key': 'bench',
+        'moviepoilt_username': 'admin',
+        'moviepoilt_password': 'password'
+    }
+    data.update(overrides)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    return path
+
+def percentile(values, q):
+    """最近秩法计算百分位数"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, math.ceil(q / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+def summarize(values):
+    """汇总耗时分布（毫秒）"""
+    return {
+        'count': len(values),
+        'p50_ms': round(percentile(values, 50) * 1000, 3) if values else None,
+        'p99_ms': round(percentile(values, 99) * 1000, 3) if values else None,
+        'max_ms': round(max(values) * 1000, 3) if values else None,
+        'mean_ms': round(sum(values) / len(values) * 1000, 3) if values else None
+    }
+
+def git_revision():
+    """获取当前代码版本，便于比较不同版本的结果"""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+def make_user(user_id):
+    """生成用户字典"""
+    return {'id': user_id, 'is_bot': False, 'first_name': f'user{user_id}', 'username': f'user{user_id}'}
+
+class TrafficGenerator:
+    """按目标速率生成反馈消息和对管理群组消息的回调"""
+
+    def __init__(self, api, args):
+        self.api = api
+        self.args = args
+        self.sent_at = {}
+        self._clicked = 0
+        self._admins = [make_user(900000000 + i) for i in range(5)]
+        self.admin_chats = {ADMIN_CHAT_ID - i * 10 for i in range(args.admin_groups)}
+
+    def _feedback_update(self):
+        user = make_user(random.randint(1, self.args.users))
+        text = random.choice(FEEDBACK_TEMPLATES).format(n=random.randint(1, 100000))
+        message = self.api.make_message(USER_CHAT_ID, text, from_user=user)
+        return {'message': message}
+
+    def _media_updates(self):
+        # 带 #反馈 说明的图片，一半附带同一相册中的另外两张
+        user = make_user(random.randint(1, self.args.users))
+        caption = random.choice(FEEDBACK_TEMPLATES).format(n=random.randint(1, 100000))
+        album = random.random() < 0.5
+        media_group_id = str(random.getrandbits(63)) if album else None
+        updates = []
+        for index in range(3 if album else 1):
+            message = self.api.make_message(USER_CHAT_ID, None, from_user=user)
+            del message['text']
+            if index == 0:
+                message['caption'] = caption
+            if media_group_id:
+                message['media_group_id'] = media_group_id
+            message['photo'] = [{
+                'file_id': f"photo-{message['message_id']}",
+                'file_unique_id': f"unique-{message['message_id']}",
+                'width': 1280,
+                'height': 720
+            }]
+            updates.append({'message': message})
+        return updates
+
+    def _request_update(self):
+        user = make_user(random.randint(1, self.args.users))
+        media_type = random.choice(('movie', 'tv'))
+        text = f"#求片 https://www.themoviedb.org/{media_type}/{random.randint(1, self.args.titles)}"
+        message = self.api.make_message(USER_CHAT_ID, text, from_user=user)
+        return {'message': message}
+
+    def _callback_update(self):
+        # 找到尚未被点击的管理群组反馈消息
+        while self._clicked < len(self.api.sent_messages):
+            message = self.api.sent_messages[self._clicked]
+            self._clicked += 1
+            if message['chat']['id'] not in self.admin_chats or 'reply_markup' not in message:
+                continue
+            button = random.choice(message['reply_markup']['inline_keyboard'][0])
+            return {
+                'callback_query': {
+                    'id': str(random.getrandbits(63)),
+                    'from': random.choice(self._admins),
+                    'chat_instance': str(message['chat']['id']),
+                    'data': button['callback_data'],
+                    'message': message
+                }
+            }
+        return None
+
+    async def run(self):
+        """在 duration 内按 rate 发送更新，返回发送数量"""
+        interval = 1 / self.args.rate
+        total = int(self.args.rate * self.args.duration)
+        sent = 0
+        start = time.monotonic()
+        for index in range(total):
+            # 按计划时间发送，落后时不补睡
+            delay = start + index * interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            update = None
+            if random.random() < self.args.callback_ratio:
+                update = self._callback_update()
+            if update is None and random.random() < self.args.request_ratio:
+                update = self._request_update()
+            if update is None and random.random() < self.args.media_ratio:
+                updates = self._media_updates()
+            else:
+                updates = [update or self._feedback_update()]
+            for update in updates:
+                update_id = self.api.add_update(update)
+                self.sent_at[update_id] = time.monotonic()
+            sent += len(updates)
+        return sent
+
+async def run_benchmark(args, bot, database):
+    """启动模拟服务和应用，发送流量并收集结果"""
+    from fake_bot_api import FakeBotAPI
+    from fake_tmdb import FakeTMDB
+    from fake_moviepoilt import FakeMoviePoilt
+
+    api = FakeBotAPI(args.latency, args.jitter, args.rate_limit, args.retry_after)
+    await api.start()
+    tmdb = FakeTMDB(args.latency)
+    await tmdb.start()
+    moviepoilt = FakeMoviePoilt(latency=args.latency)
+    await moviepoilt.start()
+
+    database.init_db()
+    for index in range(args.admin_groups):
+        database.add_group(ADMIN_CHAT_ID - index * 10, f'bench admin {index + 1}', True)
+    database.add_group(USER_CHAT_ID, 'bench users')
+
+    application = bot.build_application(api.base_url)
+    application.bot_data['tmdb'].base_url = tmdb.base_url
+    application.bot_data['moviepoilt'].base_url = moviepoilt.base_url
+
+    # 记录每个更新的处理耗时和完成时间
+    handler_latency = []
+    end_to_end = []
+    generator = TrafficGenerator(api, args)
+    process_update = application.process_update
+
+    async def timed_process_update(update):
+        start = time.monotonic()
+        try:
+            await process_update(update)
+        finally:
+            end = time.monotonic()
+            handler_latency.append(end - start)
+            sent_at = generator.sent_at.get(getattr(update, 'update_id', None))
+            if sent_at is not None:
+                end_to_end.append(end - sent_at)
+
+    application.process_update = timed_process_update
+
+    await application.initialize()
+    await application.start()
+    await application.updater.start_polling(poll_interval=0, timeout=1)
+    await bot.post_init(application)
+    api.reset_counts()
+
+    start = time.monotonic()
+    sent = await generator.run()
+
+    # 等待所有更新处理完成
+    deadline = time.monotonic() + args.drain_timeout
+    while len(handler_latency) < sent and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+    elapsed = time.monotonic() - start
+    processed = len(handler_latency)
+
+    await application.updater.stop()
+    await application.stop()
+    await bot.post_stop(application)
+    await application.shutdown()
+    await api.stop()
+    await tmdb.stop()
+    await moviepoilt.stop()
+
+    # 轮询请求不计入每条更新的 API 调用数
+    calls = dict(api.call_counts)
+    calls.pop('getUpdates', None)
+    total_calls = sum(calls.values())
+    return {
+        'revision': git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'params': vars(args),
+        'updates_sent': sent,
+        'updates_processed': processed,
+        'elapsed_seconds': round(elapsed, 3),
+        'updates_per_second': round(processed / elapsed, 2) if elapsed else None,
+        'handler_latency': summarize(handler_latency),
+        'end_to_end_latency': summarize(end_to_end),
+        'api_calls': calls,
+        'api_calls_total': total_calls,
+        'api_calls_per_update': round(total_calls / processed, 3) if processed else None,
+        'rate_limited': dict(api.rate_limited),
+        'tmdb_requests': sum(tmdb.request_counts.values()),
+        'moviepoilt_subscriptions': len(moviepoilt.subscriptions),
+        'moviepoilt_logins': moviepoilt.logins,
+        'moviepoilt_max_active': moviepoilt.max_active,
+        'copied_messages': api.copied_messages,
+        'admin_routes': {
+            f"{route}:{chat_id}": count
+            for (route, chat_id), count in sorted(application.bot_data['admin_router'].counts.items())
+        }
+    }
+
+def main():
+    """主函数"""
+    args = parse_args()
+    random.seed(args.seed)
+
+    with tempfile.TemporaryDirectory(prefix='feedback-bench-') as directory:
+        # 在导入 bot 之前指定测试配置和数据库
+        os.environ['FEEDBACK_BOT_CONFIG'] = write_bench_config(directory, pin_mode=args.pin_mode, record_journal=args.record)
+        import database
+        database.DB_FILE = os.path.join(directory, 'feedback.db')
+        import bot
+
+        # 业务日志会严重拖慢测试，只保留警告和错误
+        logging.getLogger().setLevel(logging.WARNING)
+
+        result = asyncio.run(run_benchmark(args, bot, database))
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+
+    print(
+        f"{result['updates_processed']}/{result['updates_sent']} 条更新，"
+        f"{result['updates_per_second']} 条/秒，"
+        f"p50 {result['handler_latency']['p50_ms']} ms，"
+        f"p99 {result['handler_latency']['p99_ms']} ms，"
+        f"每条更新 {result['api_calls_per_update']} 次 API 调用"
+    )
+    print(f"结果已写入 {args.output}")
+
+if __name__ == '__main__':
+    main()
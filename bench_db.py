@@ -0,0 +1,287 @@
+"""database.py 性能测试：在临时数据库中生成百万级反馈记录，测量各公开函数的耗时
+
+用法示例：
+    python3 bench_db.py --rows 1000000 --threads 8 --output bench_db.json
+    python3 bench_db.py --rows 1000000 --baseline bench_db.json
+
+同一个 --db 文件中的记录数不少于 --rows 时直接复用，修改表结构或索引后可加 --refill 重新生成
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import random
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import database
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 生成数据时使用的反馈内容片段
+CONTENT_TEXT = (
+    '播放到一半突然卡住，重新进入后字幕和画面不同步，换了几个清晰度都一样，'
+    '希望尽快修复，另外能不能增加按年份和地区筛选的功能，首页推荐也经常重复。'
+)
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='database.py 性能测试')
+    parser.add_argument('--db', default='bench_feedback.db', help='测试数据库文件')
+    parser.add_argument('--rows', type=int, default=1000000, help='反馈记录数')
+    parser.add_argument('--groups', type=int, default=200, help='用户群组数')
+    parser.add_argument('--users', type=int, default=200000, help='用户数')
+    parser.add_argument('--pending-ratio', type=float, default=0.02, help='待处理反馈占比')
+    parser.add_argument('--refill', action='store_true', help='删除并重新生成测试数据库')
+    parser.add_argument('--budget', type=float, default=2.0, help='每个函数每种模式的测试时间（秒）')
+    parser.add_argument('--max-calls', type=int, default=500, help='每个函数每种模式的最大调用次数')
+    parser.add_argument('--cold-runs', type=int, default=3, help='冷缓存调用次数')
+    parser.add_argument('--threads', type=int, default=8, help='并发测试的线程数')
+    parser.add_argument('--only', nargs='*', help='只测试指定的函数')
+    parser.add_argument('--output', help='结果文件（JSON）')
+    parser.add_argument('--baseline', help='用于对比的历史结果文件（JSON）')
+    return parser.parse_args()
+
+def fill_database(args):
+    """用递归 CTE 批量生成反馈和群组记录"""
+    if args.refill and os.path.exists(args.db):
+        os.remove(args.db)
+
+    database.DB_FILE = args.db
+    database.init_db()
+
+    conn = sqlite3.connect(args.db)
+    c = conn.cursor()
+    existing = c.execute('SELECT COUNT(*) FROM feedback').fetchone()[0]
+    if existing >= args.rows:
+        logger.warning("复用已有的 %s 条记录: %s", existing, args.db)
+        conn.close()
+        return existing
+
+    start = time.monotonic()
+    c.execute('PRAGMA journal_mode = OFF')
+    c.execute('PRAGMA synchronous = OFF')
+
+    # 1 个管理群组和若干用户群组
+    c.execute('INSERT OR IGNORE INTO groups (group_id, group_name, is_admin_group) VALUES (?, ?, 1)',
+              (-1000000000000, 'bench admin'))
+    c.executemany('INSERT OR IGNORE INTO groups (group_id, group_name, is_admin_group) VALUES (?, ?, 0)',
+                  [(-1000000000001 - i, f'bench group {i}') for i in range(args.groups)])
+
+    # message_id 与行号一一对应，便于随机抽取已有记录
+    pending_threshold = int(args.pending_ratio * 1000000)
+    batch = 500000
+    for offset in range(existing, args.rows, batch):
+        count = min(batch, args.rows - offset)
+        c.execute('''INSERT INTO feedback
+                     (user_id, username, content, message_id, feedback_type, group_id,
+                      priority, status, created_at, updated_at)
+                     WITH RECURSIVE seq(n) AS (
+                         SELECT :start UNION ALL SELECT n + 1 FROM seq LIMIT :count
+                     )
+                     SELECT abs(random()) % :users + 1,
+                            'user' || (abs(random()) % :users + 1),
+                            '#' || n || ' ' || substr(:text, 1, abs(random()) % length(:text) + 1),
+                            n,
+                            CASE abs(random()) % 5
+                                WHEN 0 THEN 'bug' WHEN 1 THEN 'feature' WHEN 2 THEN 'question'
+                                WHEN 3 THEN 'suggestion' ELSE 'general'
+                            END,
+                            -1000000000001 - abs(random()) % :groups,
+                            CASE abs(random()) % 10 WHEN 0 THEN '!!!' WHEN 1 THEN '!!' WHEN 2 THEN '!!' ELSE '!' END,
+                            CASE WHEN abs(random()) % 1000000 < :pending THEN 'pending'
+                                 WHEN abs(random()) % 5 = 0 THEN 'rejected'
+                                 ELSE 'resolved'
+                            END,
+                            datetime('now', '-' || (abs(random()) % 31536000) || ' seconds'),
+                            CURRENT_TIMESTAMP
+                       FROM seq''',
+                  {'start': offset + 1, 'count': count, 'users': args.users, 'groups': args.groups,
+                   'text': CONTENT_TEXT, 'pending': pending_threshold})
+        conn.commit()
+        logger.warning("已生成 %s/%s 条记录", offset + count, args.rows)
+
+    c.execute('ANALYZE')
+    conn.commit()
+    conn.close()
+    logger.warning("生成测试数据耗时 %.1f 秒", time.monotonic() - start)
+    return args.rows
+
+def build_cases(args, rows):
+    """待测函数及其参数生成方式，每次调用返回 (函数, 参数)"""
+    user_group = lambda: -1000000000001 - random.randrange(args.groups)
+    existing_message = lambda: random.randint(1, rows)
+    new_message = iter(range(rows + 1, 2 ** 62))
+    now = time.time()
+
+    return {
+        'add_feedback': lambda: (database.add_feedback, (
+            random.randint(1, args.users), 'bench', CONTENT_TEXT, next(new_message),
+            'general', user_group(), '!'
+        )),
+        'update_feedback_status': lambda: (database.update_feedback_status, (existing_message(), 'resolved')),
+        'get_pending_feedback': lambda: (database.get_pending_feedback, ()),
+        'iter_pending_feedback': lambda: (lambda: sum(1 for _ in database.iter_pending_feedback()), ()),
+        'get_feedback_by_message_id': lambda: (database.get_feedback_by_message_id, (existing_message(),)),
+        'get_feedback_stats': lambda: (database.get_feedback_stats, ()),
+        'get_admin_group': lambda: (database.get_admin_group, ()),
+        'get_admin_groups': lambda: (database.get_admin_groups, ()),
+        'get_user_groups': lambda: (database.get_user_groups, ()),
+        'is_admin_group': lambda: (database.is_admin_group, (user_group(),)),
+        'is_user_group': lambda: (database.is_user_group, (user_group(),)),
+        'add_group': lambda: (database.add_group, (user_group(), 'bench group')),
+        'get_dashboard_message': lambda: (database.get_dashboard_message, (user_group(),)),
+        'set_dashboard_message': lambda: (database.set_dashboard_message, (user_group(), existing_message())),
+        'get_bot_state': lambda: (database.get_bot_state, ('bench',)),
+        'set_bot_state': lambda: (database.set_bot_state, ('bench', str(random.random()))),
+        'add_scheduled_action': lambda: (database.add_scheduled_action, ('delete', user_group(), existing_message(), now)),
+        'get_scheduled_actions': lambda: (database.get_scheduled_actions, ()),
+    }
+
+def evict_os_cache(path):
+    """尽量将数据库文件移出操作系统页缓存（仅 Linux 等支持 posix_fadvise 的系统）"""
+    if not hasattr(os, 'posix_fadvise'):
+        return False
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+    return True
+
+def call(case):
+    """执行一次调用并返回耗时（秒）"""
+    func, params = case()
+    start = time.perf_counter()
+    func(*params)
+    return time.perf_counter() - start
+
+def run_serial(case, args):
+    """单线程连续调用，直到用完时间或次数"""
+    timings = []
+    deadline = time.monotonic() + args.budget
+    while len(timings) < args.max_calls and time.monotonic() < deadline:
+        timings.append(call(case))
+    return timings
+
+def run_concurrent(case, args):
+    """多线程同时调用，返回每次调用的耗时和总耗时"""
+    deadline = time.monotonic() + args.budget
+    per_thread = max(1, args.max_calls // args.threads)
+
+    def worker():
+        timings = []
+        while len(timings) < per_thread and time.monotonic() < deadline:
+            timings.append(call(case))
+        return timings
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(args.threads) as executor:
+        results = list(executor.map(lambda _: worker(), range(args.threads)))
+    elapsed = time.monotonic() - start
+    return [t for timings in results for t in timings], elapsed
+
+def percentile(values, q):
+    """最近秩法计算百分位数"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+def to_ms(value):
+    return round(value * 1000, 3)
+
+def bench_function(case, args):
+    """测量单个函数的冷缓存、热缓存和并发耗时"""
+    cold = []
+    for _ in range(args.cold_runs):
+        evict_os_cache(args.db)
+        cold.append(call(case))
+
+    warm = run_serial(case, args)
+    concurrent, elapsed = run_concurrent(case, args)
+    return {
+        'cold_ms': to_ms(sum(cold) / len(cold)),
+        'warm_calls': len(warm),
+        'warm_p50_ms': to_ms(percentile(warm, 50)),
+        'warm_p99_ms': to_ms(percentile(warm, 99)),
+        'concurrent_calls': len(concurrent),
+        'concurrent_p50_ms': to_ms(percentile(concurrent, 50)),
+        'concurrent_p99_ms': to_ms(percentile(concurrent, 99)),
+        'concurrent_ops_per_second': round(len(concurrent) / elapsed, 1) if elapsed else None
+    }
+
+def format_change(current, baseline):
+    """相对基线的变化百分比"""
+    if not baseline:
+        return '-'
+    return f"{(current - baseline) / baseline * 100:+.1f}%"
+
+def print_table(results, baseline=None):
+    """输出结果对比表"""
+    columns = ['函数', '冷(ms)', '热p50', '热p99', '并发p50', '并发p99', '并发ops/s']
+    if baseline:
+        columns += ['基线热p50', '热p50变化', '基线并发p99', '并发p99变化']
+
+    rows = []
+    for name, result in results.items():
+        row = [
+            name, result['cold_ms'], result['warm_p50_ms'], result['warm_p99_ms'],
+            result['concurrent_p50_ms'], result['concurrent_p99_ms'], result['concurrent_ops_per_second']
+        ]
+        if baseline:
+            old = baseline.get(name)
+            if old:
+                row += [
+                    old['warm_p50_ms'], format_change(result['warm_p50_ms'], old['warm_p50_ms']),
+                    old['concurrent_p99_ms'], format_change(result['concurrent_p99_ms'], old['concurrent_p99_ms'])
+                ]
+            else:
+                row += ['-'] * 4
+        rows.append([str(value) for value in row])
+
+    widths = [max(len(columns[i]), *(len(row[i]) for row in rows)) for i in range(len(columns))]
+    print('  '.join(column.ljust(width) for column, width in zip(columns, widths)))
+    print('  '.join('-' * width for width in widths))
+    for row in rows:
+        print('  '.join(value.ljust(width) for value, width in zip(row, widths)))
+
+def main():
+    """主函数"""
+    args = parse_args()
+    random.seed(0)
+
+    # 每次调用的 INFO 日志会掩盖数据库本身的耗时
+    logging.getLogger().setLevel(logging.WARNING)
+
+    rows = fill_database(args)
+    cases = build_cases(args, rows)
+    names = args.only or list(cases)
+
+    results = {}
+    for name in names:
+        logger.warning("测试 %s", name)
+        results[name] = bench_function(cases[name], args)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+
+    print(f"\n{rows} 条记录，{args.groups} 个用户群组，{args.threads} 个并发线程\n")
+    print_table(results, baseline)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'params': vars(args),
+                'rows': rows,
+                'results': results
+            }, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已写入 {args.output}")
+
+if __name__ == '__main__':
+    main()
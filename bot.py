@@ -1,27 +1,56 @@
-import sqlite3
 import logging
-import schedule
 import time
-from datetime import datetime
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, BotCommandScopeDefault, BotCommandScopeChat, BotCommandScopeAllPrivateChats
-from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters, ContextTypes
-import json
+import asyncio
+import functools
+import signal
+from telegram import Update, BotCommandScopeDefault, BotCommandScopeChat, BotCommandScopeAllPrivateChats
+from telegram.ext import (
+    Application, CommandHandler, MessageHandler, CallbackQueryHandler, InlineQueryHandler, TypeHandler, filters,
+    ContextTypes
+)
 from database import (
-    init_db, add_feedback, update_feedback_status, get_pending_feedback,
+    init_db, add_feedback, update_feedback_status, iter_pending_feedback,
     get_feedback_by_message_id, get_feedback_stats, clear_database,
-    add_group, get_admin_group, get_user_groups, is_admin_group,
-    remove_group, is_user_group
+    add_group, get_admin_groups, get_user_groups, is_admin_group,
+    remove_group, get_job_counts, requeue_dead_jobs, count_digest_entries,
+    get_feedback_admin_chats
+)
+from dashboard import PendingDashboard
+from scheduler import ActionScheduler
+from summary import schedule_daily_summary, send_daily_summary, iter_group_feedback
+from report import build_report, format_duration, REPORT_WINDOWS
+from pending_index import PendingIndex
+from attachments import (
+    MediaGroupBuffer, MEDIA_FILTER, MEDIA_GROUP_WAIT, ATTACHMENT_KINDS,
+    extract_attachment, describe_attachments, handle_media_group_item
+)
+from routing import AdminRouter
+from history import mine_command, history_command, handle_history_callback
+from classifier import FeedbackClassifier
+from inline import InlineSearch, handle_inline_query
+from utils import MAX_MESSAGE_LENGTH
+from commands import register_commands
+from lease import PollerLease
+from jobqueue import JobWorkerPool, submit_jobs
+import delivery  # 注册各类投递任务的处理函数
+from subscriptions import handle_movie_request, handle_subscription_callback, approve_all_command
+from tmdb import TMDBMetadata
+from moviepoilt import MoviePoiltClient
+from throttle import FeedbackThrottle, check_throttle
+from loopwatch import LoopWatchdog
+from journal import Journal, RecordingRequest, install_recorder
+from logsetup import setup_logging, set_log_level, with_log_context, bind_log_context
+from metrics import (
+    timed, cached, start_metrics_server, InstrumentedRequest,
+    HANDLER_LATENCY, QUEUE_DEPTH, FEEDBACK_EVENTS
 )
+from config import get_config, add_config_listener, watch_config, install_reload_signal
+
+# 进程启动时间，用于统计启动到处理第一个更新的耗时
+PROCESS_START = time.monotonic()
 
-# 加载配置文件
-with open('config.json', 'r', encoding='utf-8') as f:
-    config = json.load(f)
 
 # 配置日志
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
 logger = logging.getLogger(__name__)
 
 # 反馈类型字典
@@ -56,9 +85,38 @@ PRIORITY_ICONS = {
     '!!!': '🔴'
 }
 
-# 初始化数据库
-init_db()
+# /pending 默认和最多列出的反馈数
+PENDING_LIST_LIMIT = 20
+PENDING_LIST_MAX = 100
 
+# 管理员命令列表
+ADMIN_COMMANDS = [
+    ("start", "开始使用机器人"),
+    ("help", "显示帮助信息"),
+    ("stats", "查看反馈统计"),
+    ("pending", "按紧急程度查看待处理的反馈"),
+    ("clear_db", "清除所有反馈记录"),
+    ("set_admin_group", "设置当前群组为管理群组"),
+    ("set_user_group", "设置当前群组为用户群组"),
+    ("remove_user_group", "移除当前用户群组"),
+    ("list_groups", "列出所有群组"),
+    ("debug_loop", "查看事件循环阻塞情况"),
+    ("jobs", "查看投递队列"),
+    ("approve_all", "同意全部待处理的求片"),
+    ("report", "查看反馈处理报告"),
+    ("routes", "查看管理群组路由和分配数量"),
+    ("history", "查看用户的反馈记录")
+]
+
+# 普通用户命令列表
+USER_COMMANDS = [
+    ("start", "开始使用机器人"),
+    ("help", "显示帮助信息"),
+    ("mine", "查看我提交的反馈")
+]
+
+@timed(HANDLER_LATENCY)
+@with_log_context
 async def handle_feedback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """处理反馈消息"""
     try:
@@ -66,27 +124,42 @@ async def handle_feedback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         message = update.effective_message
         chat_id = update.effective_chat.id
         
-        # 检查是否在用户群组中
-        if not is_user_group(chat_id):
+        # 检查消息（或图片、文件、视频的说明）是否以 #反馈 开头
+        content = message.text or message.caption
+        if not content or not content.startswith('#反馈'):
             return
 
-        # 检查消息是否以 #反馈 开头
-        content = message.text
-        if not content or not content.startswith('#反馈'):
+        # 检查是否在用户群组中（内存中的群组列表），其他群组的消息不计入限流，也不回复限流提示
+        if not context.bot_data['admin_router'].is_user_group(chat_id):
             return
 
+        # 限流检查，在任何数据库或 API 操作之前
+        if not await check_throttle(update, context):
+            return
+
+        # 附件只记录 file_id，相册中先到达的其他附件一并归入这条反馈
+        attachments = []
+        attachment = extract_attachment(message)
+        if attachment is not None:
+            attachments = [attachment] + context.bot_data['media_groups'].take(message.media_group_id)
+
         # 解析反馈内容
         content = content[3:].strip()  # 移除 #反馈 前缀
+        has_text = bool(content)
+        if not content and attachment is not None:
+            content = f"[{ATTACHMENT_KINDS[attachment['kind']]}]"
         if not content:
             await message.reply_text("请提供反馈内容。")
             return
 
         # 确定反馈类型
         feedback_type = 'general'
+        tagged = False
         for key, value in FEEDBACK_TYPES.items():
             if content.startswith(f"#{value}"):
                 feedback_type = key
                 content = content[len(value)+1:].strip()
+                tagged = True
                 break
 
         # 确定优先级
@@ -98,6 +171,15 @@ async def handle_feedback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             priority = '!!'
             content = content.replace('!!', '').strip()
 
+        # 未加类型标签时由本地模型判断类型，模型未加载或置信度不足时仍为一般反馈
+        prediction = None
+        if not tagged and has_text:
+            classifier = context.bot_data['classifier']
+            predicted = classifier.predict(content)
+            if predicted is not None:
+                feedback_type, confidence = predicted
+                prediction = (confidence, classifier.version)
+
         # 添加反馈到数据库
         feedback_id = add_feedback(
             user_id=user.id,
@@ -106,10 +188,19 @@ async def handle_feedback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             message_id=message.message_id,
             feedback_type=feedback_type,
             group_id=chat_id,
-            priority=priority
+            priority=priority,
+            attachments=attachments,
+            prediction=prediction
         )
 
         if feedback_id:
+            bind_log_context(feedback_id=feedback_id)
+            FEEDBACK_EVENTS.labels(feedback_type, priority, 'pending').inc()
+            context.bot_data['pending_index'].add((
+                feedback_id, user.id, user.username or user.first_name, content, message.message_id,
+                feedback_type, chat_id, priority, 'pending', None, None
+            ), created=time.time())
+
             # 构建确认消息
             confirm_message = (
                 f"{FEEDBACK_ICONS[feedback_type]} 感谢您的反馈！\n\n"
@@ -119,22 +210,20 @@ async def handle_feedback(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 f"⏳ 状态：待处理\n\n"
                 "我们会尽快处理您的反馈。"
             )
-            await message.reply_text(confirm_message)
+            jobs = [('reply', {'chat_id': chat_id, 'reply_to': message.message_id, 'text': confirm_message})]
 
-            # 获取管理群组
-            admin_group = get_admin_group()
-            if not admin_group:
-                logger.error("未找到管理群组")
-                await message.reply_text("抱歉，系统配置错误，请联系管理员。")
-                return
-
-            admin_group_id = admin_group[0]  # 获取群组ID
+            # 按路由规则选择管理群组
+            admin_group_id = context.bot_data['admin_router'].assign(
+                chat_id, feedback_type, priority, user.id, message.message_id
+            )
             if not admin_group_id:
-                logger.error("管理群组ID为空")
-                await message.reply_text("抱歉，系统配置错误，请联系管理员。")
-                return
-
-            try:
+                logger.error("未找到管理群组")
+                jobs.append(('reply', {
+                    'chat_id': chat_id,
+                    'reply_to': message.message_id,
+                    'text': "抱歉，系统配置错误，请联系管理员。"
+                }))
+            else:
                 # 构建管理群组消息
                 admin_message = (
                     f"📢 新反馈\n\n"
@@ -142,52 +231,40 @@ async def handle_feedback(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     f"- ID: {user.id}\n"
                     f"- 用户名: [{user.username or user.first_name}](tg://user?id={user.id})\n\n"
                     f"📝 反馈内容：\n{content}\n\n"
-                    f"📌 类型：{FEEDBACK_TYPES[feedback_type]}\n"
+                    f"📌 类型：{FEEDBACK_TYPES[feedback_type]}"
+                    f"{f'（自动识别 {prediction[0]:.0%}）' if prediction else ''}\n"
                     f"🔢 优先级：{PRIORITY_ICONS[priority]} {PRIORITY_LEVELS[priority]}"
                 )
-                
-                # 创建处理按钮
-                keyboard = [
-                    [
-                        InlineKeyboardButton("✅ 已解决", callback_data=f"resolve_{message.message_id}"),
-                        InlineKeyboardButton("❌ 已拒绝", callback_data=f"reject_{message.message_id}")
-                    ]
-                ]
-                reply_markup = InlineKeyboardMarkup(keyboard)
-                
-                # 发送到管理群组
-                logger.info(f"尝试发送消息到管理群组: {admin_group_id}")
-                admin_msg = await context.bot.send_message(
-                    chat_id=admin_group_id,
-                    text=admin_message,
-                    reply_markup=reply_markup,
-                    parse_mode='Markdown'
-                )
-                logger.info("成功发送消息到管理群组")
-                
-                # 置顶消息
-                try:
-                    await context.bot.pin_chat_message(
-                        chat_id=admin_group_id,
-                        message_id=admin_msg.message_id
-                    )
-                    logger.info("成功置顶消息")
-                except Exception as e:
-                    logger.error(f"置顶消息失败: {e}")
-                    # 继续执行，不中断流程
+                if attachments:
+                    admin_message += f"\n📎 附件：{describe_attachments(attachments)}"
 
-            except Exception as e:
-                logger.error(f"发送消息到管理群组失败: {str(e)}")
-                await message.reply_text("抱歉，发送反馈到管理群组时出现错误，请联系管理员。")
-                return
+                # 发送到管理群组并置顶，处理按钮为 (文字, 回调数据)
+                jobs.append(('admin_post', {
+                    'chat_id': admin_group_id,
+                    'text': admin_message,
+                    'buttons': [[
+                        ("✅ 已解决", f"resolve_{message.message_id}"),
+                        ("❌ 已拒绝", f"reject_{message.message_id}")
+                    ]],
+                    'reply_chat_id': chat_id,
+                    'reply_to': message.message_id,
+                    'feedback_id': feedback_id,
+                    'attachments_delay': (MEDIA_GROUP_WAIT if message.media_group_id else 0) if attachments else None
+                }))
+
+            # 由投递线程发送，处理器只负责校验和入库
+            if not submit_jobs(context.bot_data, jobs):
+                await message.reply_text("抱歉，提交反馈时出现错误。请稍后再试。")
 
         else:
             await message.reply_text("抱歉，提交反馈时出现错误。请稍后再试。")
 
     except Exception as e:
-        logger.error(f"处理反馈时出错: {str(e)}")
+        logger.error("处理反馈时出错: %s", str(e))
         await message.reply_text("处理反馈时出现错误，请稍后再试。")
 
+@timed(HANDLER_LATENCY)
+@with_log_context
 async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """处理回调查询"""
     try:
@@ -206,57 +283,56 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if action == 'resolve':
             # 处理反馈
             message_id = int(params[0])
-            success = update_feedback_status(message_id, 'resolved')
+            success = update_feedback_status(
+                message_id, 'resolved', query.from_user.id, query.from_user.username or query.from_user.first_name
+            )
             if success:
                 # 获取反馈详情
                 feedback = get_feedback_by_message_id(message_id)
                 if feedback:
+                    bind_log_context(feedback_id=feedback[0])
+                    FEEDBACK_EVENTS.labels(feedback[5], feedback[7], 'resolved').inc()
+                    context.bot_data['pending_index'].remove(feedback[0])
+
                     # 从反馈记录中获取所需字段
                     user_id = feedback[1]  # user_id
                     content = feedback[3]  # content
                     group_id = feedback[6]  # group_id
+                    username = feedback[2]  # username
                     
-                    logger.info(f"准备发送反馈处理通知: group_id={group_id}, user_id={user_id}")
-                    
-                    # 构建通知消息
-                    notification = (
-                        "📢 反馈处理通知\n\n"
-                        f"您的反馈已被处理：\n"
-                        f"📝 内容：{content}\n"
-                        f"✅ 状态：已解决\n"
-                        f"⏰ 处理时间：{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
-                        "感谢您的反馈！"
-                    )
-                    # 在原始群组发送通知
-                    try:
-                        logger.info(f"尝试发送消息到群组: {group_id}")
-                        # 获取用户信息
-                        user = await context.bot.get_chat_member(group_id, user_id)
-                        username = user.user.username or user.user.first_name
-                        # 发送带 @ 的通知
-                        await context.bot.send_message(
-                            chat_id=group_id,
-                            text=f"@{username} {notification}",
-                            parse_mode='HTML'
-                        )
-                        logger.info("成功发送反馈处理通知")
-                    except Exception as e:
-                        logger.error(f"发送反馈处理通知失败: {str(e)}")
-                        # 继续执行，不中断流程
+                    # 加入原始群组的汇总通知，窗口结束后合并发送
+                    logger.info("加入反馈处理通知汇总: group_id=%s, user_id=%s", group_id, user_id)
+                    submit_jobs(context.bot_data, [('notify', {
+                        'chat_id': group_id,
+                        'user_id': user_id,
+                        'username': username,
+                        'content': content,
+                        'status': '已解决'
+                    })])
                 
-                # 更新消息并取消置顶
+                # 更新消息并取消置顶（看板模式下刷新看板）
                 await query.edit_message_text(
                     text=f"{query.message.text}\n\n✅ 已标记为已解决\n👤 处理人：{query.from_user.username or query.from_user.first_name}",
                     reply_markup=None
                 )
-                try:
-                    await context.bot.unpin_chat_message(
-                        chat_id=query.message.chat_id,
-                        message_id=query.message.message_id
+                if get_config().pin_mode == 'dashboard':
+                    context.bot_data['dashboard'].request_refresh(query.message.chat_id)
+                else:
+                    submit_jobs(context.bot_data, [('unpin', {
+                        'chat_id': query.message.chat_id,
+                        'message_id': query.message.message_id
+                    })])
+                if get_config().delete_delay:
+                    # 延迟删除已处理的反馈消息（持久化，重启后仍会执行）
+                    context.bot_data['scheduler'].schedule_deletion(
+                        query.message.chat_id, query.message.message_id, get_config().delete_delay
                     )
-                    logger.info("成功取消置顶消息")
-                except Exception as e:
-                    logger.error(f"取消置顶消息失败: {e}")
+            elif success is False:
+                # 重复点击或其他管理员已处理，不再重复计数和通知用户
+                await query.edit_message_text(
+                    text=f"{query.message.text}\n\nℹ️ 该反馈已被处理",
+                    reply_markup=None
+                )
             else:
                 await query.edit_message_text(
                     text=f"{query.message.text}\n\n❌ 更新状态失败",
@@ -265,114 +341,106 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         elif action == 'reject':
             # 处理反馈
             message_id = int(params[0])
-            success = update_feedback_status(message_id, 'rejected')
+            success = update_feedback_status(
+                message_id, 'rejected', query.from_user.id, query.from_user.username or query.from_user.first_name
+            )
             if success:
                 # 获取反馈详情
                 feedback = get_feedback_by_message_id(message_id)
                 if feedback:
+                    bind_log_context(feedback_id=feedback[0])
+                    FEEDBACK_EVENTS.labels(feedback[5], feedback[7], 'rejected').inc()
+                    context.bot_data['pending_index'].remove(feedback[0])
+
                     # 从反馈记录中获取所需字段
                     user_id = feedback[1]  # user_id
                     content = feedback[3]  # content
                     group_id = feedback[6]  # group_id
+                    username = feedback[2]  # username
                     
-                    logger.info(f"准备发送反馈处理通知: group_id={group_id}, user_id={user_id}")
-                    
-                    # 构建通知消息
-                    notification = (
-                        "📢 反馈处理通知\n\n"
-                        f"您的反馈已被处理：\n"
-                        f"📝 内容：{content}\n"
-                        f"❌ 状态：已驳回\n"
-                        f"⏰ 处理时间：{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
-                        "如有疑问，请重新提交反馈或联系管理员。"
-                    )
-                    # 在原始群组发送通知
-                    try:
-                        logger.info(f"尝试发送消息到群组: {group_id}")
-                        # 获取用户信息
-                        user = await context.bot.get_chat_member(group_id, user_id)
-                        username = user.user.username or user.user.first_name
-                        # 发送带 @ 的通知
-                        await context.bot.send_message(
-                            chat_id=group_id,
-                            text=f"@{username} {notification}",
-                            parse_mode='HTML'
-                        )
-                        logger.info("成功发送反馈处理通知")
-                    except Exception as e:
-                        logger.error(f"发送反馈处理通知失败: {str(e)}")
-                        # 继续执行，不中断流程
+                    # 加入原始群组的汇总通知，窗口结束后合并发送
+                    logger.info("加入反馈处理通知汇总: group_id=%s, user_id=%s", group_id, user_id)
+                    submit_jobs(context.bot_data, [('notify', {
+                        'chat_id': group_id,
+                        'user_id': user_id,
+                        'username': username,
+                        'content': content,
+                        'status': '已驳回'
+                    })])
                 
-                # 更新消息并取消置顶
+                # 更新消息并取消置顶（看板模式下刷新看板）
                 await query.edit_message_text(
                     text=f"{query.message.text}\n\n❌ 已标记为已驳回\n👤 处理人：{query.from_user.username or query.from_user.first_name}",
                     reply_markup=None
                 )
-                try:
-                    await context.bot.unpin_chat_message(
-                        chat_id=query.message.chat_id,
-                        message_id=query.message.message_id
+                if get_config().pin_mode == 'dashboard':
+                    context.bot_data['dashboard'].request_refresh(query.message.chat_id)
+                else:
+                    submit_jobs(context.bot_data, [('unpin', {
+                        'chat_id': query.message.chat_id,
+                        'message_id': query.message.message_id
+                    })])
+                if get_config().delete_delay:
+                    # 延迟删除已处理的反馈消息（持久化，重启后仍会执行）
+                    context.bot_data['scheduler'].schedule_deletion(
+                        query.message.chat_id, query.message.message_id, get_config().delete_delay
                     )
-                    logger.info("成功取消置顶消息")
-                except Exception as e:
-                    logger.error(f"取消置顶消息失败: {e}")
+            elif success is False:
+                # 重复点击或其他管理员已处理，不再重复计数和通知用户
+                await query.edit_message_text(
+                    text=f"{query.message.text}\n\nℹ️ 该反馈已被处理",
+                    reply_markup=None
+                )
             else:
                 await query.edit_message_text(
                     text=f"{query.message.text}\n\n❌ 更新状态失败",
                     reply_markup=None
                 )
     except Exception as e:
-        logger.error(f"处理回调查询时出错: {str(e)}")
+        logger.error("处理回调查询时出错: %s", str(e))
         await query.edit_message_text(
             text=f"{query.message.text}\n\n❌ 处理失败",
             reply_markup=None
         )
 
+@timed(HANDLER_LATENCY)
+@with_log_context
 async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """处理统计命令"""
     # 检查是否是管理员
-    if update.effective_user.id not in config['admin_ids']:
+    if update.effective_user.id not in get_config().admin_ids:
         await update.message.reply_text("❌ 抱歉，您没有权限使用此命令。")
         return
 
     # 获取统计数据
-    conn = sqlite3.connect(config['db_file'])
-    c = conn.cursor()
-    
-    # 获取总反馈数
-    c.execute('SELECT COUNT(*) FROM feedback')
-    total = c.fetchone()[0]
-    
-    # 获取已解决反馈数
-    c.execute('SELECT COUNT(*) FROM feedback WHERE status = "resolved"')
-    resolved = c.fetchone()[0]
-    
-    # 获取待处理反馈数
-    c.execute('SELECT COUNT(*) FROM feedback WHERE status = "pending"')
-    pending = c.fetchone()[0]
-    
-    conn.close()
+    stats = get_feedback_stats()
+    if stats is None:
+        await update.message.reply_text("获取统计数据失败，请稍后再试。")
+        return
 
     # 创建统计消息
     stats_message = (
         f"📊 反馈统计\n\n"
-        f"总反馈数: {total}\n"
-        f"已解决: {resolved}\n"
-        f"待处理: {pending}"
+        f"总反馈数: {stats['total']}\n"
+        f"已解决: {stats['resolved']}\n"
+        f"待处理: {stats['pending']}"
     )
 
     await update.message.reply_text(stats_message)
 
+@timed(HANDLER_LATENCY)
+@with_log_context
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """处理 /help 命令"""
     # 检查是否是管理员
-    is_admin = update.effective_user.id in config['admin_ids']
+    is_admin = update.effective_user.id in get_config().admin_ids
     
     # 基础帮助信息
     help_text = (
         "🤖 反馈机器人使用说明\n\n"
         "📝 发送反馈：\n"
-        "- 使用 #反馈 开头发送一般反馈\n\n"
+        "- 使用 #反馈 开头发送一般反馈\n"
+        "- 使用 #求片 开头并附上 TMDB 链接请求影视资源\n\n"
         "🎯 反馈类型：\n"
         "- 问题反馈 🐛\n"
         "- 功能建议 💡\n"
@@ -386,21 +454,30 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         help_text += (
             "📊 管理员命令：\n"
             "/stats - 查看反馈统计\n"
-            "/pending - 查看待处理的反馈\n"
+            "/pending [数量] - 按紧急程度查看待处理的反馈\n"
             "/clear_db - 清除所有反馈记录\n"
             "/set_admin_group - 设置当前群组为管理群组\n"
             "/set_user_group - 设置当前群组为用户群组\n"
             "/remove_user_group - 移除当前用户群组\n"
             "/list_groups - 列出所有群组\n"
-            "/help - 显示此帮助信息"
+            "/debug_loop - 查看事件循环阻塞情况\n"
+            "/jobs - 查看投递队列，/jobs retry 重新投递死信任务\n"
+            "/approve_all - 同意全部待处理的求片\n"
+            "/report [day|week|month] - 查看反馈处理耗时报告\n"
+            "/routes - 查看管理群组路由和分配数量\n"
+            "/history @用户名 - 查看用户的反馈记录\n"
+            "/help - 显示此帮助信息\n\n"
+            "🔍 在任意聊天中输入 @机器人用户名 加反馈 ID、@用户名 或内容，可以查找并引用反馈"
         )
     else:
-        help_text += "📊 命令：\n/help - 显示此帮助信息"
+        help_text += "📊 命令：\n/mine - 查看我提交的反馈\n/help - 显示此帮助信息"
     
     await update.message.reply_text(help_text)
 
+@timed(HANDLER_LATENCY)
+@with_log_context
 async def pending(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """查看待处理的反馈"""
+    """查看最紧急的待处理反馈，/pending [数量]"""
     try:
         user = update.effective_user
         chat_id = update.effective_chat.id
@@ -410,38 +487,48 @@ async def pending(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text("此命令只能在管理员群组中使用。")
             return
 
-        # 获取待处理的反馈
-        pending_feedback = get_pending_feedback()
+        # 从内存索引中按优先级和等待时间取前 N 条
+        limit = PENDING_LIST_LIMIT
+        if context.args and context.args[0].isdigit():
+            limit = max(1, min(int(context.args[0]), PENDING_LIST_MAX))
+        index = context.bot_data['pending_index']
+        pending_feedback = index.top(limit)
 
         if not pending_feedback:
             await update.message.reply_text("目前没有待处理的反馈。")
             return
 
         # 构建消息
-        message = "待处理的反馈：\n\n"
-        
-        if pending_feedback:
-            message += "📝 待处理反馈：\n"
-            for feedback in pending_feedback:
-                message += f"- {feedback[3]} (来自: {feedback[2]})\n"
-            message += "\n"
+        message = f"待处理的反馈（共 {len(index)} 条，按紧急程度排列）：\n\n"
+        now = time.time()
+        for feedback in pending_feedback:
+            content = feedback[3] or ""
+            if len(content) > 60:
+                content = content[:60] + "…"
+            waited = format_duration(now - index.created_at(feedback[0]))
+            message += f"- {PRIORITY_ICONS.get(feedback[7], '')} {content} (来自: {feedback[2]}，已等待 {waited})\n"
+        if len(index) > len(pending_feedback):
+            message += f"\n…还有 {len(index) - len(pending_feedback)} 条，可用 /pending <数量> 查看更多"
 
-        await update.message.reply_text(message)
+        await update.message.reply_text(message[:MAX_MESSAGE_LENGTH])
 
     except Exception as e:
-        logger.error(f"查看待处理内容时出错: {str(e)}")
+        logger.error("查看待处理内容时出错: %s", str(e))
         await update.message.reply_text("获取待处理内容时出现错误，请稍后再试。")
 
+@timed(HANDLER_LATENCY)
+@with_log_context
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """处理 /start 命令"""
     # 检查是否是管理员
-    is_admin = update.effective_user.id in config['admin_ids']
+    is_admin = update.effective_user.id in get_config().admin_ids
     
     # 基础欢迎信息
     welcome_message = (
         "🤖 欢迎使用反馈机器人！\n\n"
         "📝 发送反馈：\n"
-        "- 使用 #反馈 开头发送一般反馈\n\n"
+        "- 使用 #反馈 开头发送一般反馈\n"
+        "- 使用 #求片 开头并附上 TMDB 链接请求影视资源\n\n"
         "🎯 反馈类型：\n"
         "- 问题反馈 🐛\n"
         "- 功能建议 💡\n"
@@ -455,31 +542,45 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         welcome_message += (
             "📊 管理员命令：\n"
             "/stats - 查看反馈统计\n"
-            "/pending - 查看待处理的反馈\n"
+            "/pending [数量] - 按紧急程度查看待处理的反馈\n"
             "/clear_db - 清除所有反馈记录\n"
             "/set_admin_group - 设置当前群组为管理群组\n"
             "/set_user_group - 设置当前群组为用户群组\n"
             "/remove_user_group - 移除当前用户群组\n"
             "/list_groups - 列出所有群组\n"
-            "/help - 显示此帮助信息"
+            "/debug_loop - 查看事件循环阻塞情况\n"
+            "/jobs - 查看投递队列，/jobs retry 重新投递死信任务\n"
+            "/approve_all - 同意全部待处理的求片\n"
+            "/report [day|week|month] - 查看反馈处理耗时报告\n"
+            "/routes - 查看管理群组路由和分配数量\n"
+            "/history @用户名 - 查看用户的反馈记录\n"
+            "/help - 显示此帮助信息\n\n"
+            "🔍 在任意聊天中输入 @机器人用户名 加反馈 ID、@用户名 或内容，可以查找并引用反馈"
         )
     else:
-        welcome_message += "📊 命令：\n/help - 显示此帮助信息"
+        welcome_message += "📊 命令：\n/mine - 查看我提交的反馈\n/help - 显示此帮助信息"
     
     await update.message.reply_text(welcome_message)
 
+@timed(HANDLER_LATENCY)
+@with_log_context
 async def clear_db(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """清除数据库中的所有反馈记录"""
     # 检查用户是否是管理员
-    if update.effective_user.id not in config.get('admin_ids', []):
+    if update.effective_user.id not in get_config().admin_ids:
         await update.message.reply_text("抱歉，只有管理员可以执行此操作。")
         return
     
     if clear_database():
+        context.bot_data['pending_index'].clear()
+        context.bot_data['inline_search'].clear()
+        context.bot_data['admin_router'].reload()
         await update.message.reply_text("数据库已成功清除。")
     else:
         await update.message.reply_text("清除数据库时发生错误。")
 
+@timed(HANDLER_LATENCY)
+@with_log_context
 async def set_admin_group(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """设置管理群组"""
     if not update.message:
@@ -489,10 +590,13 @@ async def set_admin_group(update: Update, context: ContextTypes.DEFAULT_TYPE):
     group_name = update.message.chat.title
     
     if add_group(group_id, group_name, is_admin_group=True):
+        context.bot_data['admin_router'].reload()
         await update.message.reply_text("✅ 已设置此群组为管理群组")
     else:
         await update.message.reply_text("❌ 设置管理群组失败")
 
+@timed(HANDLER_LATENCY)
+@with_log_context
 async def set_user_group(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """设置用户群组"""
     if not update.message:
@@ -502,13 +606,16 @@ async def set_user_group(update: Update, context: ContextTypes.DEFAULT_TYPE):
     group_name = update.message.chat.title
     
     if add_group(group_id, group_name, is_admin_group=False):
+        context.bot_data['admin_router'].reload()
         await update.message.reply_text("✅ 已设置此群组为用户群组")
     else:
         await update.message.reply_text("❌ 设置用户群组失败")
 
+@timed(HANDLER_LATENCY)
+@with_log_context
 async def remove_user_group(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """移除用户群组"""
-    if update.effective_user.id not in config['admin_ids']:
+    if update.effective_user.id not in get_config().admin_ids:
         await update.message.reply_text("只有管理员可以移除用户群组")
         return
     
@@ -518,22 +625,28 @@ async def remove_user_group(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     group_id = update.effective_chat.id
     remove_group(group_id)
+    context.bot_data['admin_router'].reload()
     await update.message.reply_text("已移除当前群组")
 
+@timed(HANDLER_LATENCY)
+@with_log_context
 async def list_groups(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """列出所有群组"""
     try:
         # 检查是否是管理员
-        if update.effective_user.id not in config['admin_ids']:
+        if update.effective_user.id not in get_config().admin_ids:
             await update.message.reply_text("❌ 抱歉，您没有权限执行此操作。")
             return
             
         # 获取管理群组
-        admin_group = get_admin_group()
+        admin_groups = get_admin_groups()
         message = "📋 群组列表：\n\n"
         
-        if admin_group:
-            message += f"管理群组：\n- ID: {admin_group[0]}\n\n"
+        if admin_groups:
+            message += "管理群组：\n"
+            for group in admin_groups:
+                message += f"- {group[1]} (ID: {group[0]})\n"
+            message += "\n"
         else:
             message += "管理群组：未设置\n\n"
             
@@ -549,54 +662,363 @@ async def list_groups(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(message)
         
     except Exception as e:
-        logger.error(f"列出群组时出错: {str(e)}")
+        logger.error("列出群组时出错: %s", str(e))
         await update.message.reply_text("❌ 列出群组时出错，请稍后重试。")
 
-def main():
-    """主函数"""
-    # 创建应用
-    application = Application.builder().token(config['bot_token']).build()
-
-    # 设置管理员命令列表
-    admin_commands = [
-        ("start", "开始使用机器人"),
-        ("help", "显示帮助信息"),
-        ("stats", "查看反馈统计"),
-        ("pending", "查看待处理的反馈"),
-        ("clear_db", "清除所有反馈记录"),
-        ("set_admin_group", "设置当前群组为管理群组"),
-        ("set_user_group", "设置当前群组为用户群组"),
-        ("remove_user_group", "移除当前用户群组"),
-        ("list_groups", "列出所有群组")
-    ]
-    
-    # 设置普通用户命令列表
-    user_commands = [
-        ("start", "开始使用机器人"),
-        ("help", "显示帮助信息")
+@timed(HANDLER_LATENCY)
+@with_log_context
+async def debug_loop(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """查看事件循环阻塞情况"""
+    if update.effective_user.id not in get_config().admin_ids:
+        await update.message.reply_text("❌ 抱歉，您没有权限执行此操作。")
+        return
+
+    watchdog = context.bot_data.get('loop_watchdog')
+    if watchdog is None:
+        await update.message.reply_text("事件循环阻塞检测未启用，请在配置中设置 loop_watchdog。")
+        return
+
+    await update.message.reply_text(watchdog.report())
+
+@timed(HANDLER_LATENCY)
+@with_log_context
+async def jobs_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """查看投递队列，/jobs retry 重新投递死信任务"""
+    if update.effective_user.id not in get_config().admin_ids:
+        await update.message.reply_text("❌ 抱歉，您没有权限执行此操作。")
+        return
+
+    if context.args and context.args[0] == 'retry':
+        count = requeue_dead_jobs()
+        pool = context.bot_data.get('job_pool')
+        if pool is not None:
+            pool.wake()
+        await update.message.reply_text(f"已重新投递 {count} 个死信任务")
+        return
+
+    counts = get_job_counts()
+    if counts is None:
+        await update.message.reply_text("获取投递队列失败，请稍后再试。")
+        return
+
+    pool = context.bot_data.get('job_pool')
+    await update.message.reply_text(
+        "📮 投递队列\n\n"
+        f"等待中: {counts.get('queued', 0)}\n"
+        f"执行中: {counts.get('running', 0)}\n"
+        f"死信: {counts.get('dead', 0)}\n"
+        f"本进程投递线程: {pool.concurrency if pool is not None else '未启用'}"
+    )
+
+@timed(HANDLER_LATENCY)
+@with_log_context
+async def report_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """查看反馈处理报告，/report [day|week|month]，默认近 7 天"""
+    if update.effective_user.id not in get_config().admin_ids:
+        await update.message.reply_text("❌ 抱歉，您没有权限执行此操作。")
+        return
+
+    window = context.args[0] if context.args else 'week'
+    if window not in REPORT_WINDOWS:
+        await update.message.reply_text(f"用法：/report [{'|'.join(REPORT_WINDOWS)}]")
+        return
+
+    report = build_report(window)
+    if report is None:
+        await update.message.reply_text("获取反馈处理报告失败，请稍后再试。")
+        return
+    await update.message.reply_text(report)
+
+@timed(HANDLER_LATENCY)
+@with_log_context
+async def routes_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """查看管理群组路由规则和各群组的分配数量"""
+    if update.effective_user.id not in get_config().admin_ids:
+        await update.message.reply_text("❌ 抱歉，您没有权限执行此操作。")
+        return
+
+    await update.message.reply_text(context.bot_data['admin_router'].report()[:MAX_MESSAGE_LENGTH])
+
+def escalate_feedback(application: Application, overdue):
+    """紧急反馈超过 SLA 仍未处理时提醒负责的管理群组，overdue 为 (反馈, 已等待秒数) 列表"""
+    # 提醒发送到反馈实际所在的管理群组，每个群组一条；没有记录的（升级前的反馈）按当前路由规则查找
+    router = application.bot_data['admin_router']
+    posted = get_feedback_admin_chats([feedback[0] for feedback, _ in overdue]) or {}
+    by_chat = {}
+    for feedback, waited in overdue:
+        chat_id = posted.get(feedback[0])
+        if chat_id is None:
+            _, chat_id = router.route(feedback[6], feedback[5], feedback[7], feedback[1], feedback[4])
+        if chat_id is None:
+            logger.error("未找到反馈 %s 的管理群组，跳过超时提醒", feedback[0])
+            continue
+        by_chat.setdefault(chat_id, []).append((feedback, waited))
+
+    jobs = []
+    for chat_id, items in by_chat.items():
+        lines = [f"⏰ {len(items)} 条紧急反馈已超过 {format_duration(get_config().escalation_sla)} 未处理：\n"]
+        for feedback, waited in items:
+            content = feedback[3] or ""
+            if len(content) > 60:
+                content = content[:60] + "…"
+            lines.append(f"- 🔴 #{feedback[0]} {content} (来自: {feedback[2]}，已等待 {format_duration(waited)})")
+        jobs.append(('reply', {
+            'chat_id': chat_id,
+            'reply_to': None,
+            'text': "\n".join(lines)[:MAX_MESSAGE_LENGTH]
+        }))
+    submit_jobs(application.bot_data, jobs)
+
+@timed(HANDLER_LATENCY)
+async def daily_summary(context: ContextTypes.DEFAULT_TYPE):
+    """每日向各管理群组发送其中未解决反馈的汇总"""
+    admin_groups = [group[0] for group in get_admin_groups()]
+    if not admin_groups:
+        logger.error("未找到管理群组，跳过每日汇总")
+        return
+    if len(admin_groups) == 1:
+        await send_daily_summary(context.bot, admin_groups[0])
+        return
+
+    router = context.bot_data['admin_router']
+
+    def route(feedback):
+        """按当前路由规则查找反馈所在的管理群组"""
+        return router.route(feedback[6], feedback[5], feedback[7], feedback[1], feedback[4])[1]
+
+    for chat_id in admin_groups:
+        await send_daily_summary(context.bot, chat_id, iter_group_feedback(chat_id, route))
+
+async def log_first_update(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """记录从进程启动到处理第一个更新的耗时"""
+    if context.bot_data.get('first_update_logged'):
+        return
+    context.bot_data['first_update_logged'] = True
+    logger.info("启动到处理第一个更新耗时: %.2f 秒", time.monotonic() - PROCESS_START)
+
+def command_scopes():
+    """生成各作用域需要注册的命令"""
+    # 默认命令（所有用户）和管理员命令（私聊）
+    scopes = [
+        ("default", BotCommandScopeDefault(), USER_COMMANDS),
+        ("all_private_chats", BotCommandScopeAllPrivateChats(), ADMIN_COMMANDS)
     ]
-    
-    # 设置默认命令（所有用户）
-    application.bot.set_my_commands(commands=user_commands, scope=BotCommandScopeDefault())
-    
-    # 设置管理员命令（私聊）
-    application.bot.set_my_commands(commands=admin_commands, scope=BotCommandScopeAllPrivateChats())
-    
-    # 设置群组命令
-    # 获取管理群组
-    admin_group = get_admin_group()
-    if admin_group:
-        admin_group_id = admin_group[0]
-        # 为管理群组设置管理员命令
-        application.bot.set_my_commands(commands=admin_commands, scope=BotCommandScopeChat(chat_id=admin_group_id))
-    
-    # 获取用户群组
-    user_groups = get_user_groups()
-    if user_groups:
-        for group in user_groups:
-            group_id = group[0]
-            # 为用户群组设置普通命令
-            application.bot.set_my_commands(commands=user_commands, scope=BotCommandScopeChat(chat_id=group_id))
+
+    # 为管理群组设置管理员命令
+    for group in get_admin_groups():
+        group_id = group[0]
+        scopes.append((f"chat:{group_id}", BotCommandScopeChat(chat_id=group_id), ADMIN_COMMANDS))
+
+    # 为用户群组设置普通命令
+    for group in get_user_groups():
+        group_id = group[0]
+        scopes.append((f"chat:{group_id}", BotCommandScopeChat(chat_id=group_id), USER_COMMANDS))
+
+    return scopes
+
+async def post_init(application: Application):
+    """接管轮询后初始化：加载定时任务，看板模式下根据数据库重建置顶看板"""
+    application.bot_data['scheduler'].start()
+
+    # 加载待处理反馈索引，启动超时提醒
+    application.bot_data['pending_index'].load(iter_pending_feedback())
+    application.bot_data['pending_index'].start()
+
+    # 后台加载分类模型，加载完成前的反馈不做自动分类
+    application.bot_data['classifier'].start_loading()
+
+    # 启动投递任务线程（job_workers 为 0 时由独立的 worker.py 进程投递）
+    if 'job_pool' in application.bot_data:
+        application.bot_data['job_pool'].start()
+
+    # 启动本地指标服务
+    settings = get_config()
+    if settings.metrics_port:
+        application.bot_data['metrics_server'] = await start_metrics_server(
+            settings.metrics_host, settings.metrics_port
+        )
+
+    # 启动事件循环阻塞检测（可选）
+    if settings.loop_watchdog:
+        watchdog = LoopWatchdog(settings.loop_block_threshold)
+        watchdog.start()
+        application.bot_data['loop_watchdog'] = watchdog
+
+    # 监听配置文件修改和 SIGHUP，热更新配置
+    application.bot_data['config_watcher'] = asyncio.create_task(watch_config())
+    install_reload_signal()
+
+    if get_config().pin_mode == 'dashboard':
+        for group in get_admin_groups():
+            application.create_task(application.bot_data['dashboard'].refresh(group[0]))
+
+    logger.info("初始化完成，耗时 %.2f 秒", time.monotonic() - PROCESS_START)
+
+def on_config_change(application: Application, old, new):
+    """配置热更新：原地调整各组件的参数"""
+    application.bot_data['dashboard'].debounce = new.dashboard_debounce
+    application.bot_data['dashboard'].min_interval = new.dashboard_min_interval
+    application.bot_data['throttle'].configure(new)
+    application.bot_data['pending_index'].configure(new.escalation_sla)
+    if old.log_level != new.log_level:
+        set_log_level(new.log_level)
+    if 'loop_watchdog' in application.bot_data:
+        application.bot_data['loop_watchdog'].threshold = new.loop_block_threshold
+    if 'job_pool' in application.bot_data:
+        application.bot_data['job_pool'].configure(new)
+    application.bot_data['tmdb'].configure(new)
+    application.bot_data['moviepoilt'].configure(new)
+    application.bot_data['classifier'].configure(new)
+    if old.admin_routes != new.admin_routes:
+        application.bot_data['admin_router'].reload(new)
+
+    # 汇总时间变化时重新注册每日任务
+    if (old.daily_summary_time, old.timezone) != (new.daily_summary_time, new.timezone):
+        for job in application.job_queue.get_jobs_by_name('daily_summary'):
+            job.schedule_removal()
+        schedule_daily_summary(application, daily_summary, new.daily_summary_time, new.timezone)
+
+async def post_stop(application: Application):
+    """停止前执行完到期的投递任务并停止定时任务，未发送的汇总通知保存在数据库中"""
+    if 'job_pool' in application.bot_data:
+        await application.bot_data['job_pool'].stop()
+    await application.bot_data['scheduler'].stop()
+    application.bot_data['pending_index'].stop()
+    application.bot_data['config_watcher'].cancel()
+    if 'metrics_server' in application.bot_data:
+        application.bot_data['metrics_server'].close()
+    if 'loop_watchdog' in application.bot_data:
+        application.bot_data['loop_watchdog'].stop()
+    await application.bot_data['tmdb'].close()
+    await application.bot_data['moviepoilt'].close()
+    if 'journal' in application.bot_data:
+        application.bot_data['journal'].close()
+
+async def run(application: Application):
+    """预热后获取轮询租约，持有期间轮询，交接或停止时处理完剩余更新再退出"""
+    loop = asyncio.get_running_loop()
+    stop_event = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    # 预热：连接 Bot API 并注册命令，此时旧实例仍在正常轮询
+    await application.initialize()
+    await register_commands(application.bot, command_scopes())
+
+    # 获取租约，必要时请求旧实例交接
+    lease = PollerLease()
+    if not await lease.acquire(stop_event):
+        await application.shutdown()
+        return
+
+    await application.start()
+    await application.updater.start_polling()
+    await post_init(application)
+
+    reason = await lease.hold(stop_event)
+    logger.info("停止轮询: %s", reason)
+
+    # 先停止拉取并确认更新，再处理完已拉取的更新和后台任务；未发送的汇总通知保存在数据库中，由下次启动继续发送
+    await application.updater.stop()
+    await application.stop()
+    await post_stop(application)
+    lease.release()
+    await application.shutdown()
+
+def build_application(base_url=None):
+    """创建应用并注册处理器，base_url 可指向自建或模拟的 Bot API 服务"""
+    # 启用回放日志时记录收到的更新和发出的 API 调用（修改后需重启生效）
+    settings = get_config()
+    journal = None
+    if settings.record_journal:
+        journal = Journal(settings.record_journal)
+        journal.write_header(settings, get_admin_groups(), get_user_groups())
+        request = RecordingRequest(journal, connection_pool_size=256)
+    else:
+        request = InstrumentedRequest(connection_pool_size=256)
+
+    builder = (
+        Application.builder()
+        .token(settings.bot_token)
+        .request(request)
+        .get_updates_request(InstrumentedRequest())
+    )
+    if base_url:
+        builder = builder.base_url(base_url)
+    application = builder.build()
+
+    if journal is not None:
+        application.bot_data['journal'] = journal
+        install_recorder(application, journal)
+
+    # 创建定时任务调度器
+    application.bot_data['scheduler'] = ActionScheduler(application.bot)
+
+    # 创建反馈提交限流器
+    application.bot_data['throttle'] = FeedbackThrottle(get_config())
+
+    # 创建置顶看板（内容取自下方的待处理反馈索引）
+    application.bot_data['dashboard'] = PendingDashboard(
+        application.bot,
+        get_config().dashboard_debounce,
+        get_config().dashboard_min_interval
+    )
+
+    # 创建 TMDB 元数据缓存（求片卡片使用）
+    application.bot_data['tmdb'] = TMDBMetadata(get_config())
+
+    # 创建 MoviePoilt 订阅客户端（同意求片后添加订阅）
+    application.bot_data['moviepoilt'] = MoviePoiltClient(get_config())
+
+    # 按路由规则把反馈分配到多个管理群组
+    application.bot_data['admin_router'] = AdminRouter()
+    application.bot_data['admin_router'].reload()
+
+    # 未加类型标签的反馈由本地模型分类，模型在 post_init 后于后台线程加载
+    application.bot_data['classifier'] = FeedbackClassifier(get_config())
+
+    # 内联查找反馈的结果缓存
+    application.bot_data['inline_search'] = InlineSearch()
+
+    # 暂存相册中先于反馈标签到达的附件
+    application.bot_data['media_groups'] = MediaGroupBuffer()
+
+    # 创建待处理反馈索引，紧急反馈超过 SLA 时提醒管理群组
+    application.bot_data['pending_index'] = PendingIndex(
+        functools.partial(escalate_feedback, application),
+        get_config().escalation_sla
+    )
+    application.bot_data['dashboard'].pending = application.bot_data['pending_index']
+
+    # 创建投递任务线程池，与独立的 worker.py 进程共享数据库中的任务
+    if get_config().job_workers:
+        application.bot_data['job_pool'] = JobWorkerPool(application.bot, application.bot_data, get_config())
+
+    # 队列深度指标在采集时读取
+    QUEUE_DEPTH.labels('updates').set_function(application.update_queue.qsize)
+    QUEUE_DEPTH.labels('digest').set_function(cached(lambda: count_digest_entries() or 0))
+    QUEUE_DEPTH.labels('scheduled_actions').set_function(lambda: len(application.bot_data['scheduler']))
+    QUEUE_DEPTH.labels('dashboard').set_function(lambda: len(application.bot_data['dashboard']))
+    QUEUE_DEPTH.labels('media_groups').set_function(lambda: len(application.bot_data['media_groups']))
+    QUEUE_DEPTH.labels('pending_feedback').set_function(lambda: len(application.bot_data['pending_index']))
+    # 两个投递队列指标在一次采集中共用一次统计查询
+    job_counts = cached(lambda: get_job_counts() or {})
+    QUEUE_DEPTH.labels('jobs').set_function(lambda: job_counts().get('queued', 0))
+    QUEUE_DEPTH.labels('jobs_dead').set_function(lambda: job_counts().get('dead', 0))
+
+    # 配置变更时原地更新各组件
+    add_config_listener(functools.partial(on_config_change, application))
+
+    # 注册每日汇总任务
+    schedule_daily_summary(
+        application,
+        daily_summary,
+        get_config().daily_summary_time,
+        get_config().timezone
+    )
+
+    # 记录第一个更新的处理耗时
+    application.add_handler(TypeHandler(Update, log_first_update), group=-1)
 
     # 添加命令处理器
     application.add_handler(CommandHandler("start", start))
@@ -608,15 +1030,41 @@ def main():
     application.add_handler(CommandHandler("set_user_group", set_user_group))
     application.add_handler(CommandHandler("remove_user_group", remove_user_group))
     application.add_handler(CommandHandler("list_groups", list_groups))
+    application.add_handler(CommandHandler("debug_loop", debug_loop))
+    application.add_handler(CommandHandler("jobs", jobs_command))
+    application.add_handler(CommandHandler("approve_all", approve_all_command))
+    application.add_handler(CommandHandler("report", report_command))
+    application.add_handler(CommandHandler("routes", routes_command))
+    application.add_handler(CommandHandler("mine", mine_command))
+    application.add_handler(CommandHandler("history", history_command))
 
-    # 添加反馈处理器
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_feedback))
+    # 添加求片和反馈处理器（同一组中先匹配的处理器生效）
+    application.add_handler(MessageHandler(filters.Regex(r'^#求片') & ~filters.COMMAND, handle_movie_request))
+    application.add_handler(MessageHandler(
+        (filters.TEXT & ~filters.COMMAND) | (MEDIA_FILTER & filters.CaptionRegex(r'^#反馈')), handle_feedback
+    ))
+    application.add_handler(MessageHandler(MEDIA_FILTER, handle_media_group_item))
 
     # 添加回调查询处理器
+    application.add_handler(CallbackQueryHandler(handle_subscription_callback, pattern=r'^sub_(approve|reject)_\d+$'))
+    application.add_handler(CallbackQueryHandler(handle_history_callback, pattern=r'^history_-?\d+_\d{14}_\d+$'))
     application.add_handler(CallbackQueryHandler(handle_callback))
 
-    # 启动应用
-    application.run_polling()
+    # 内联查找反馈，防抖等待期间不阻塞其他更新的处理
+    application.add_handler(InlineQueryHandler(handle_inline_query, block=False))
+
+    return application
+
+def main():
+    """主函数"""
+    # 配置日志（写文件在后台线程完成）
+    setup_logging(get_config())
+
+    # 初始化数据库
+    init_db()
+
+    # 启动应用（持有轮询租约期间运行）
+    asyncio.run(run(build_application()))
 
 if __name__ == '__main__':
     main() 
\ No newline at end of file
@@ -0,0 +1,251 @@
+"""查询计划检查：在填充了测试数据的数据库上调用 database.py 的各个函数，
+对实际执行的每条 SQL 运行 EXPLAIN QUERY PLAN，检查是否使用索引，并限制返回行数、执行步数和耗时
+
+用法示例：
+    python3 check_queries.py                 # 默认 20 万条记录
+    python3 check_queries.py --rows 1000000 --verbose
+
+有检查未通过时以非零状态退出，可以在部署前或 CI 中运行
+
+feedback.py 已不再被任何模块引用（其导入的函数已从 database.py 移除），其中的语句有意不作检查；
+只保留仍可在当前表结构上执行的统计查询，订阅相关的语句引用的列已不存在
+"""
+import argparse
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import time
+from argparse import Namespace
+
+import database
+from bench_db import fill_database, build_cases
+
+# 默认预算：返回行数、执行步数（千条虚拟机指令）、耗时（毫秒）
+DEFAULT_BUDGET = {'max_rows': 1000, 'max_kilo_steps': 2000, 'max_ms': 50}
+
+# 各函数的例外规则，allow_scan 中的表允许全表扫描，需写明原因
+RULES = {
+    # 反馈总数需要遍历整个索引，仅用于管理员统计命令
+    'get_feedback_stats': {'allow_scan': {'feedback'}, 'max_kilo_steps': 20000, 'max_ms': 500},
+    # 群组表只有几行
+    'get_admin_group': {'allow_scan': {'groups'}},
+    'get_admin_groups': {'allow_scan': {'groups'}},
+    'get_user_groups': {'allow_scan': {'groups'}},
+    # 返回全部待处理反馈，行数随积压量增长
+    'get_pending_feedback': {'max_rows': None, 'max_kilo_steps': 20000, 'max_ms': 500},
+    # 每页只沿索引读取两段，各不超过一页，与积压量无关
+    'iter_pending_feedback': {'max_rows': 200, 'max_kilo_steps': 100},
+    'iter_pending_feedback:next': {'max_rows': 200, 'max_kilo_steps': 100},
+    # 启动时按时间顺序读取全部未执行的定时任务（只包含尚未删除的消息）
+    'get_scheduled_actions': {'allow_scan': {'scheduled_actions'}, 'max_rows': None},
+    # 仅 feedback.py 的统计命令使用
+    'feedback.py:stats_command': {'allow_scan': {'feedback'}, 'max_kilo_steps': 20000, 'max_ms': 500},
+    # 投递队列中只有未完成和死信任务，完成的任务即被删除；仅用于指标和 /jobs 命令
+    'get_job_counts': {'allow_scan': {'jobs'}},
+    'requeue_dead_jobs': {'allow_scan': {'jobs'}},
+    # 待发送的汇总通知只保留一个汇总窗口，发送后即被删除；仅用于指标
+    'count_digest_entries': {'allow_scan': {'digest_entries'}},
+    # 离线训练分类模型时按 ID 顺序读取全部带标签的反馈，不在机器人进程中运行
+    'iter_labeled_feedback': {'allow_scan': {'feedback'}, 'max_kilo_steps': 20000, 'max_ms': 500},
+}
+
+# 不在 database.py 中、无法直接调用的语句（来源, SQL）
+# feedback.py 为未使用的旧代码：其待处理反馈和订阅查询不再检查，订阅语句引用的 user_id、original_message 列已不存在
+EXTRA_STATEMENTS = [
+    ('feedback.py:stats_command', 'SELECT COUNT(*) FROM feedback WHERE feedback_type = "request"'),
+]
+
+# 需要检查的语句类型
+CHECKED_STATEMENTS = ('SELECT', 'UPDATE', 'DELETE', 'INSERT', 'REPLACE', 'WITH')
+
+# 查询计划中的全表扫描（SCAN 表名，包括遍历覆盖索引；虚拟表由其自身的索引查找，不算在内）
+SCAN_PATTERN = re.compile(r'^SCAN (\w+)\b(?! VIRTUAL TABLE)')
+
+# 全文索引模块对其内部表执行的语句（表名带库名引号），不由 database.py 控制
+INTERNAL_PATTERN = re.compile(r"'main'\.'\w+'")
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='SQL 查询计划检查')
+    parser.add_argument('--db', help='测试数据库文件，默认在临时目录中生成')
+    parser.add_argument('--rows', type=int, default=200000, help='反馈记录数')
+    parser.add_argument('--groups', type=int, default=200, help='用户群组数')
+    parser.add_argument('--users', type=int, default=50000, help='用户数')
+    parser.add_argument('--pending-ratio', type=float, default=0.002, help='待处理反馈占比')
+    parser.add_argument('--verbose', action='store_true', help='输出所有语句的查询计划')
+    return parser.parse_args()
+
+class TracingSqlite:
+    """代替 database 模块中的 sqlite3，记录每个连接实际执行的 SQL（参数已展开）"""
+
+    def __init__(self):
+        self.source = None
+        self.statements = []
+
+    def __getattr__(self, name):
+        return getattr(sqlite3, name)
+
+    def connect(self, *args, **kwargs):
+        conn = sqlite3.connect(*args, **kwargs)
+        source = self.source
+        conn.set_trace_callback(lambda sql: self.statements.append((source, sql)))
+        return conn
+
+def collect_statements(args, rows):
+    """调用 database.py 的各个函数，收集其执行的 SQL"""
+    tracer = TracingSqlite()
+    database.sqlite3 = tracer
+    try:
+        cases = build_cases(args, rows)
+        cases.update({
+            'remove_scheduled_actions': lambda: (database.remove_scheduled_actions, ([1, 2, 3],)),
+            'acquire_lease': lambda: (database.acquire_lease, ('check', 'a', 15)),
+            'renew_lease': lambda: (database.renew_lease, ('check', 'a', 15)),
+            'request_lease_handover': lambda: (database.request_lease_handover, ('check', 'b')),
+            'withdraw_lease_handover': lambda: (database.withdraw_lease_handover, ('check', 'b')),
+            'release_lease': lambda: (database.release_lease, ('check', 'a')),
+            'remove_group': lambda: (database.remove_group, (-1,)),
+            'enqueue_jobs': lambda: (database.enqueue_jobs, ([('reply', {'chat_id': -1, 'text': 'check'})], 5)),
+            'claim_jobs': lambda: (database.claim_jobs, ('check', 8, 60)),
+            'complete_job': lambda: (database.complete_job, (1, 'check', 1)),
+            'retry_job': lambda: (database.retry_job, (1, 'check', 1, 2, 'check')),
+            'dead_letter_job': lambda: (database.dead_letter_job, (1, 'check', 1, 'check')),
+            'requeue_dead_jobs': lambda: (database.requeue_dead_jobs, ()),
+            'get_job_counts': lambda: (database.get_job_counts, ()),
+            'get_feedback_rollups': lambda: (database.get_feedback_rollups, ('day', 0)),
+            'add_subscription_request': lambda: (database.add_subscription_request, (
+                550, 'movie', 1, 'check', -1, '#求片 https://www.themoviedb.org/movie/550'
+            )),
+            'get_subscription': lambda: (database.get_subscription, (1,)),
+            'get_subscription_requesters': lambda: (database.get_subscription_requesters, (1, 10)),
+            'set_subscription_card': lambda: (database.set_subscription_card, (1, -1, 1, 1, True)),
+            'update_subscription_status': lambda: (database.update_subscription_status, (1, 'approved')),
+            'approve_pending_subscriptions': lambda: (database.approve_pending_subscriptions, ()),
+            'save_tmdb_metadata': lambda: (database.save_tmdb_metadata, (550, 'movie', 'check', '1999', '/check.jpg')),
+            'get_tmdb_metadata': lambda: (database.get_tmdb_metadata, (550, 'movie')),
+            'set_tmdb_poster_file_id': lambda: (database.set_tmdb_poster_file_id, (550, 'movie', 'check')),
+            'add_media_group_attachment': lambda: (database.add_media_group_attachment, (
+                {'chat_id': -1, 'message_id': 1, 'media_group_id': 'check', 'kind': 'photo', 'file_id': 'check'},
+            )),
+            'get_user_feedback_page': lambda: (database.get_user_feedback_page, (1, None, 11)),
+            'get_user_feedback_page:next': lambda: (database.get_user_feedback_page, (1, ('2024-01-01 00:00:00', 1000), 11)),
+            'get_user_stats': lambda: (database.get_user_stats, (1,)),
+            'find_user_by_name': lambda: (database.find_user_by_name, ('bench',)),
+            'claim_unrelayed_attachments': lambda: (database.claim_unrelayed_attachments, (1, -1, 1)),
+            'release_attachments': lambda: (database.release_attachments, ([1, 2],)),
+            'add_digest_entry': lambda: (database.add_digest_entry, (-1, 'check', 10, 5)),
+            'get_digest_entries': lambda: (database.get_digest_entries, (-1,)),
+            'remove_digest_entries': lambda: (database.remove_digest_entries, (-1, 1, 10, 5)),
+            'count_digest_entries': lambda: (database.count_digest_entries, ()),
+            'set_feedback_admin_message': lambda: (database.set_feedback_admin_message, (1, -1, 1)),
+            'get_feedback_admin_chats': lambda: (database.get_feedback_admin_chats, ([1, 2, 3],)),
+            'iter_labeled_feedback': lambda: (next, (database.iter_labeled_feedback(500), None)),
+            'iter_pending_feedback:next': lambda: (next, (database.iter_pending_feedback(200, (1, '', 0)), None)),
+            'iter_unclassified_pending': lambda: (next, (database.iter_unclassified_pending(500), None)),
+            'get_feedback_by_id': lambda: (database.get_feedback_by_id, (1,)),
+            'find_users_by_prefix': lambda: (database.find_users_by_prefix, ('user1', 5)),
+            'get_users_feedback_page': lambda: (database.get_users_feedback_page, ([1, 2, 3], None, 21)),
+            'get_users_feedback_page:next': lambda: (database.get_users_feedback_page, ([1, 2, 3], 1000, 21)),
+            'search_feedback_content': lambda: (database.search_feedback_content, ('字幕和画面', None, 21)),
+            'search_feedback_content:next': lambda: (database.search_feedback_content, ('字幕和画面', 1000, 21)),
+            'search_feedback_content:short': lambda: (database.search_feedback_content, ('字幕', None, 21)),
+            'set_predicted_types': lambda: (database.set_predicted_types, ([(1, 'bug', 0.9), (2, 'question', 0.85)], 'check')),
+        })
+        for name, case in cases.items():
+            tracer.source = name
+            func, params = case()
+            func(*params)
+    finally:
+        database.sqlite3 = sqlite3
+
+    statements = []
+    seen = set()
+    for source, sql in tracer.statements + EXTRA_STATEMENTS:
+        keyword = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else ''
+        if keyword not in CHECKED_STATEMENTS or INTERNAL_PATTERN.search(sql):
+            continue
+        # 分页查询等只检查第一条
+        key = (source, re.sub(r"'[^']*'|-?\d+(\.\d+)?", '?', sql))
+        if key not in seen:
+            seen.add(key)
+            statements.append((source, sql))
+    return statements
+
+def check_statement(conn, source, sql):
+    """检查单条语句，返回 (问题列表, 查询计划, 统计)"""
+    rules = dict(DEFAULT_BUDGET, allow_scan=set())
+    rules.update(RULES.get(source, {}))
+
+    try:
+        plan = [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql)]
+    except sqlite3.OperationalError as e:
+        # 表结构由 init_db 在测试数据库中创建，缺表或缺列同样是问题
+        return [f"无法生成查询计划: {e}"], [], {}
+
+    problems = []
+    for detail in plan:
+        match = SCAN_PATTERN.match(detail)
+        if match and match.group(1) not in rules['allow_scan']:
+            problems.append(f"全表扫描: {detail}")
+
+    # 在保存点中执行并回滚，写操作不会修改测试数据
+    steps = [0]
+
+    def count_steps():
+        steps[0] += 1
+        return 0
+
+    conn.set_progress_handler(count_steps, 1000)
+    conn.execute('SAVEPOINT check_query')
+    try:
+        start = time.perf_counter()
+        returned = len(conn.execute(sql).fetchall())
+        elapsed = (time.perf_counter() - start) * 1000
+    finally:
+        conn.execute('ROLLBACK TO check_query')
+        conn.execute('RELEASE check_query')
+        conn.set_progress_handler(None, 1000)
+
+    stats = {'rows': returned, 'kilo_steps': steps[0], 'ms': round(elapsed, 2)}
+    if rules['max_rows'] is not None and returned > rules['max_rows']:
+        problems.append(f"返回 {returned} 行，超过预算 {rules['max_rows']}")
+    if steps[0] > rules['max_kilo_steps']:
+        problems.append(f"执行 {steps[0]}k 步，超过预算 {rules['max_kilo_steps']}k")
+    if elapsed > rules['max_ms']:
+        problems.append(f"耗时 {elapsed:.1f} ms，超过预算 {rules['max_ms']} ms")
+    return problems, plan, stats
+
+def main():
+    """主函数"""
+    args = parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='feedback-queries-') as directory:
+        fill_args = Namespace(
+            db=args.db or os.path.join(directory, 'feedback.db'), refill=False,
+            rows=args.rows, groups=args.groups, users=args.users, pending_ratio=args.pending_ratio
+        )
+        rows = fill_database(fill_args)
+        statements = collect_statements(fill_args, rows)
+
+        conn = sqlite3.connect(fill_args.db, isolation_level=None)
+        failures = 0
+        for source, sql in statements:
+            problems, plan, stats = check_statement(conn, source, sql)
+            one_line = ' '.join(sql.split())
+            status = 'FAIL' if problems else 'OK  '
+            failures += bool(problems)
+            print(f"{status}  {source}: {one_line[:100]}  {stats}")
+            if problems or args.verbose:
+                for detail in plan:
+                    print(f"        计划: {detail}")
+                for problem in problems:
+                    print(f"        问题: {problem}")
+        conn.close()
+
+    print(f"\n共检查 {len(statements)} 条语句，{failures} 条未通过")
+    sys.exit(1 if failures else 0)
+
+if __name__ == '__main__':
+    main()
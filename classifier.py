@@ -0,0 +1,317 @@
+"""反馈类型自动分类：字符 n-gram 哈希特征 + 多项式朴素贝叶斯，权重矩阵保存为 .npz 文件
+
+用法示例：
+    python3 classifier.py train                        # 用已加标签的反馈训练，写入 classifier_file
+    python3 classifier.py train --output model.npz --bits 20
+    python3 classifier.py reclassify                   # 预览待处理的一般反馈的分类结果
+    python3 classifier.py reclassify --apply           # 写入数据库
+
+机器人启动后在后台线程中加载模型（不影响启动耗时），加载完成前的反馈不做自动分类。
+"""
+import argparse
+import itertools
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from config import get_config, FEEDBACK_TYPES
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 字符 n-gram 的长度
+NGRAM_SIZES = (1, 2, 3)
+
+# 默认哈希特征数为 2 ** CLASSIFIER_BITS
+CLASSIFIER_BITS = 18
+
+# 拉普拉斯平滑系数
+CLASSIFIER_ALPHA = 0.1
+
+# 批量分类时每批的反馈数
+CLASSIFY_BATCH = 5000
+
+# 滚动哈希的乘数和混合常数（64 位，溢出后自然取模）
+HASH_PRIME = 1099511628211
+HASH_MIX = 0x9E3779B97F4A7C15
+
+def featurize(np, texts, bits):
+    """把一批文本转换为哈希特征下标及其所属文本的序号，全部文本拼接后一次计算"""
+    parts = [f" {text.lower()} " for text in texts]
+    lengths = np.fromiter(map(len, parts), dtype=np.intp, count=len(parts))
+    codes = np.frombuffer(''.join(parts).encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+    owners = np.repeat(np.arange(len(parts)), lengths)
+
+    prime, mix, shift = np.uint64(HASH_PRIME), np.uint64(HASH_MIX), np.uint64(64 - bits)
+    indices, doc_ids = [], []
+    for n in NGRAM_SIZES:
+        count = len(codes) - n + 1
+        if count <= 0:
+            continue
+        hashes = np.full(count, n, dtype=np.uint64)
+        for offset in range(n):
+            hashes = hashes * prime + codes[offset:offset + count]
+        # 跨越两条文本的 n-gram 不计入，空格只作为词的边界，不单独作为特征
+        valid = owners[:count] == owners[n - 1:n - 1 + count]
+        if n == 1:
+            valid &= codes != ord(' ')
+        indices.append(((hashes[valid] * mix) >> shift).astype(np.intp))
+        doc_ids.append(owners[:count][valid])
+    if not indices:
+        return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+    return np.concatenate(indices), np.concatenate(doc_ids)
+
+def to_model(np, arrays):
+    """模型文件中的数组转换为打分使用的字典"""
+    return {
+        'np': np,
+        'weights': arrays['weights'],
+        'log_prior': arrays['log_prior'],
+        'classes': [str(name) for name in arrays['classes']],
+        'bits': int(arrays['bits']),
+        'version': str(arrays['version'])
+    }
+
+class FeedbackClassifier:
+    """判断未加类型标签的反馈属于哪种类型
+
+    模型为 (类别数, 2 ** bits) 的对数概率矩阵，打分时只取出文本中 n-gram 对应的列求和，
+    一条反馈的耗时为几十微秒；批量打分时所有文本拼接后一次计算。
+    最高的后验概率低于 classifier_threshold 时不做判断，仍为一般反馈。
+    """
+
+    def __init__(self, settings):
+        self._model = None
+        self._loading = None
+        self.path = None
+        self.configure(settings)
+
+    def configure(self, settings):
+        """读取模型文件和置信度阈值，模型文件修改后重新加载"""
+        self.threshold = settings.classifier_threshold
+        if settings.classifier_file != self.path:
+            self.path = settings.classifier_file
+            self._model = None
+            if self._loading is not None:
+                self.start_loading()
+
+    @property
+    def ready(self):
+        """模型是否已加载"""
+        return self._model is not None
+
+    @property
+    def version(self):
+        """已加载模型的版本（训练时间），记录在自动分类结果中"""
+        return self._model['version'] if self._model else None
+
+    def start_loading(self):
+        """在后台线程中加载模型"""
+        self._loading = threading.Thread(target=self.load, name='classifier-load', daemon=True)
+        self._loading.start()
+
+    def load(self):
+        """加载模型文件，未配置、文件不存在或未安装 numpy 时不启用自动分类"""
+        path = self.path
+        if not path or not os.path.exists(path):
+            logger.info("未找到分类模型 %s，不自动分类", path or "（未配置）")
+            return False
+        try:
+            import numpy as np
+        except ImportError:
+            logger.warning("未安装 numpy，不自动分类")
+            return False
+        try:
+            start = time.monotonic()
+            with np.load(path) as data:
+                model = to_model(np, data)
+        except Exception as e:
+            logger.error("加载分类模型失败: %s", e)
+            return False
+        if path == self.path:
+            self._model = model
+            logger.info("已加载分类模型 %s（%s），耗时 %.2f 秒", path, model['version'], time.monotonic() - start)
+        return True
+
+    def use(self, model):
+        """直接使用内存中的模型（训练时评估用）"""
+        self._model = model
+
+    def score(self, texts):
+        """批量计算每条文本的 (类型, 后验概率)，模型未加载时返回 None"""
+        model = self._model
+        if model is None:
+            return None
+        np = model['np']
+        weights = model['weights']
+        indices, doc_ids = featurize(np, texts, model['bits'])
+
+        # 每个类别的对数似然：取出各 n-gram 的权重后按文本累加
+        scores = np.empty((len(model['classes']), len(texts)))
+        for row in range(len(model['classes'])):
+            scores[row] = np.bincount(doc_ids, weights=weights[row, indices], minlength=len(texts))
+        scores += model['log_prior'][:, None]
+
+        scores -= scores.max(axis=0)
+        probabilities = np.exp(scores)
+        probabilities /= probabilities.sum(axis=0)
+        best = probabilities.argmax(axis=0)
+        return [(model['classes'][index], float(probabilities[index, column])) for column, index in enumerate(best)]
+
+    def predict(self, text):
+        """判断一条反馈的类型，返回 (类型, 置信度)；模型未加载或置信度不足时返回 None"""
+        if not text:
+            return None
+        result = self.score([text])
+        if result is None:
+            return None
+        feedback_type, confidence = result[0]
+        if confidence < self.threshold:
+            return None
+        return feedback_type, confidence
+
+def train(rows, bits=CLASSIFIER_BITS, alpha=CLASSIFIER_ALPHA):
+    """用 (内容, 类型) 列表训练，返回可保存的模型数组字典"""
+    import numpy as np
+
+    texts = [content or '' for content, _ in rows]
+    classes = sorted({feedback_type for _, feedback_type in rows})
+    labels = np.array([classes.index(feedback_type) for _, feedback_type in rows])
+    indices, doc_ids = featurize(np, texts, bits)
+    feature_labels = labels[doc_ids]
+
+    size = 1 << bits
+    weights = np.empty((len(classes), size), dtype=np.float32)
+    seen = np.zeros(size, dtype=bool)
+    for row in range(len(classes)):
+        counts = np.bincount(indices[feature_labels == row], minlength=size).astype(np.float64)
+        weights[row] = np.log((counts + alpha) / (counts.sum() + alpha * size))
+        seen |= counts > 0
+    # 训练中未出现的 n-gram 不提供信息，权重置 0，否则会偏向样本总数少的类别
+    weights[:, ~seen] = 0
+    log_prior = np.log(np.bincount(labels, minlength=len(classes)) / len(labels))
+
+    return {
+        'weights': weights,
+        'log_prior': log_prior,
+        'classes': np.array(classes),
+        'bits': np.array(bits),
+        'version': np.array(time.strftime('%Y%m%d%H%M%S'))
+    }
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='反馈类型分类模型')
+    parser.add_argument('--db', help='反馈数据库文件，默认为 feedback.db')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    train_parser = subparsers.add_parser('train', help='用已加类型标签的反馈训练模型')
+    train_parser.add_argument('--output', help='模型文件，默认为配置中的 classifier_file')
+    train_parser.add_argument('--bits', type=int, default=CLASSIFIER_BITS, help='哈希特征数的位数')
+    train_parser.add_argument('--alpha', type=float, default=CLASSIFIER_ALPHA, help='平滑系数')
+    train_parser.add_argument('--holdout', type=int, default=10, help='每 N 条留一条用于评估，0 为不评估')
+
+    reclassify_parser = subparsers.add_parser('reclassify', help='重新分类待处理的一般反馈')
+    reclassify_parser.add_argument('--model', help='模型文件，默认为配置中的 classifier_file')
+    reclassify_parser.add_argument('--threshold', type=float, help='置信度阈值，默认为配置中的 classifier_threshold')
+    reclassify_parser.add_argument('--apply', action='store_true', help='写入数据库（默认只统计）')
+    return parser.parse_args()
+
+def run_train(args):
+    """训练模型，按留出的样本评估准确率和打分耗时"""
+    import numpy as np
+    from database import iter_labeled_feedback
+
+    rows = [(feedback_id, content, feedback_type) for feedback_id, content, feedback_type in iter_labeled_feedback()
+            if feedback_type in FEEDBACK_TYPES]
+    if len({feedback_type for _, _, feedback_type in rows}) < 2:
+        print("已加类型标签的反馈不足两类，无法训练")
+        return 1
+    print(f"训练样本 {len(rows)} 条：" + "，".join(
+        f"{FEEDBACK_TYPES[name]} {count}" for name, count in Counter(row[2] for row in rows).most_common()
+    ))
+
+    if args.holdout:
+        test = [row for row in rows if row[0] % args.holdout == 0]
+        classifier = FeedbackClassifier(get_config())
+        classifier.use(to_model(np, train([row[1:] for row in rows if row[0] % args.holdout], args.bits, args.alpha)))
+
+        start = time.perf_counter()
+        predictions = classifier.score([content or '' for _, content, _ in test]) if test else []
+        batch_time = time.perf_counter() - start
+        correct = sum(predicted == row[2] for (predicted, _), row in zip(predictions, test))
+        print(f"留出样本 {len(test)} 条，准确率 {correct / max(len(test), 1):.1%}，"
+              f"批量打分 {batch_time / max(len(test), 1) * 1e6:.1f} 微秒/条")
+
+        sample = [content or '' for _, content, _ in test[:1000]]
+        start = time.perf_counter()
+        for text in sample:
+            classifier.score([text])
+        if sample:
+            print(f"逐条打分 {(time.perf_counter() - start) / len(sample) * 1e6:.1f} 微秒/条")
+
+    output = args.output or get_config().classifier_file
+    if not output:
+        print("未指定模型文件（--output 或 classifier_file）")
+        return 1
+    np.savez(output, **train([row[1:] for row in rows], args.bits, args.alpha))
+    print(f"模型已写入 {output}")
+    return 0
+
+def run_reclassify(args):
+    """分批对待处理的一般反馈打分，--apply 时写入数据库"""
+    from database import iter_unclassified_pending, set_predicted_types
+
+    settings = get_config()
+    classifier = FeedbackClassifier(settings)
+    if args.model:
+        classifier.path = args.model
+    if not classifier.load():
+        print("模型未加载，请先运行 train")
+        return 1
+    threshold = settings.classifier_threshold if args.threshold is None else args.threshold
+
+    total, counts, updated = 0, Counter(), 0
+    elapsed = 0.0
+    rows = iter_unclassified_pending(CLASSIFY_BATCH)
+    while True:
+        batch = list(itertools.islice(rows, CLASSIFY_BATCH))
+        if not batch:
+            break
+        start = time.perf_counter()
+        results = classifier.score([content or '' for _, content, _ in batch])
+        elapsed += time.perf_counter() - start
+        total += len(batch)
+
+        predictions = [
+            (feedback_id, feedback_type, confidence)
+            for (feedback_id, _, _), (feedback_type, confidence) in zip(batch, results)
+            if confidence >= threshold
+        ]
+        counts.update(feedback_type for _, feedback_type, _ in predictions)
+        if args.apply and predictions:
+            updated += set_predicted_types(predictions, classifier.version) or 0
+
+    print(f"待处理的一般反馈 {total} 条，置信度不低于 {threshold} 的 {sum(counts.values())} 条：" + "，".join(
+        f"{FEEDBACK_TYPES.get(name, name)} {count}" for name, count in counts.most_common()
+    ))
+    if total:
+        print(f"打分耗时 {elapsed:.3f} 秒（{elapsed / total * 1e6:.1f} 微秒/条）")
+    if args.apply:
+        print(f"已更新 {updated} 条反馈的类型")
+    return 0
+
+def main():
+    """主函数"""
+    args = parse_args()
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.WARNING)
+    if args.db:
+        import database
+        database.DB_FILE = args.db
+    if args.command == 'train':
+        return run_train(args)
+    return run_reclassify(args)
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,40 @@
+import asyncio
+import hashlib
+import json
+import logging
+from database import get_bot_state, set_bot_state
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 同时进行的 set_my_commands 调用数上限
+COMMAND_CONCURRENCY = 4
+
+def commands_hash(commands):
+    """计算命令列表的哈希，用于判断是否需要重新注册"""
+    data = json.dumps(commands, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+async def register_commands(bot, scopes, concurrency=COMMAND_CONCURRENCY):
+    """并发注册各作用域的命令，跳过与上次注册相同的作用域
+
+    scopes 为 (作用域标识, BotCommandScope, 命令列表) 的列表
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def register(scope_key, scope, commands):
+        state_key = f"commands:{scope_key}"
+        digest = commands_hash(commands)
+        if get_bot_state(state_key) == digest:
+            return False
+        async with semaphore:
+            try:
+                await bot.set_my_commands(commands=commands, scope=scope)
+            except Exception as e:
+                logger.error("注册命令失败 (%s): %s", scope_key, e)
+                return False
+        set_bot_state(state_key, digest)
+        return True
+
+    results = await asyncio.gather(*(register(*item) for item in scopes))
+    logger.info("命令注册完成: 更新 %s 个作用域，跳过 %s 个", sum(results), len(scopes) - sum(results))
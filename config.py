@@ -1,23 +1,363 @@
+import asyncio
 import json
+import logging
 import os
+import signal
+from dataclasses import dataclass
+from datetime import datetime
+from zoneinfo import ZoneInfo
 
-# 获取配置文件路径
-config_path = os.path.join(os.path.dirname(__file__), 'config.json')
+# 配置日志
+logger = logging.getLogger(__name__)
 
-# 加载配置文件
-with open(config_path, 'r', encoding='utf-8') as f:
-    config = json.load(f)
+# 获取配置文件路径，可通过 FEEDBACK_BOT_CONFIG 环境变量指定其他文件（如性能测试）
+config_path = os.environ.get('FEEDBACK_BOT_CONFIG') or os.path.join(os.path.dirname(__file__), 'config.json')
+
+# 配置文件检查间隔（秒）
+CONFIG_WATCH_INTERVAL = 5
+
+# 置顶模式
+PIN_MODES = ('message', 'dashboard')
+
+# 日志输出格式及按时间轮转的周期（留空为按大小轮转）
+LOG_FORMATS = ('text', 'json')
+LOG_ROTATE_WHENS = ('', 'S', 'M', 'H', 'D', 'midnight', 'W0', 'W1', 'W2', 'W3', 'W4', 'W5', 'W6')
+
+# 管理群组路由可匹配的类型（request 为求片卡片）和优先级
+ROUTE_TYPES = ('bug', 'feature', 'question', 'suggestion', 'general', 'request')
+ROUTE_PRIORITIES = ('!', '!!', '!!!')
+
+# 路由有多个目标群组时的哈希依据：同一用户、同一来源群组或每条反馈独立分配
+ROUTE_HASH_BY = ('user', 'group', 'item')
+
+# 路由规则允许的键
+ROUTE_KEYS = {'name', 'source_groups', 'types', 'priorities', 'admin_groups', 'hash_by'}
+
+class ConfigError(ValueError):
+    """配置文件内容无效"""
+
+@dataclass(frozen=True)
+class AdminRoute:
+    """一条管理群组路由规则，条件为空表示不限"""
+    name: str
+    source_groups: frozenset
+    types: frozenset
+    priorities: frozenset
+    admin_groups: frozenset
+    hash_by: str
+
+@dataclass(frozen=True)
+class BotConfig:
+    """经过校验的配置，创建后不可修改，重新加载时整体替换"""
+    bot_token: str
+    admin_ids: frozenset
+    admin_group_id: int
+    feedback_groups: frozenset
+    display_group: int
+    feedback_tag: str
+    db_file: str
+    log_file: str
+    log_level: str
+    log_format: str
+    log_max_bytes: int
+    log_backup_count: int
+    log_rotate_when: str
+    digest_window: float
+    pin_mode: str
+    dashboard_debounce: float
+    dashboard_min_interval: float
+    delete_delay: float
+    daily_summary_time: str
+    timezone: str
+    throttle_user_per_minute: float
+    throttle_user_burst: float
+    throttle_chat_per_minute: float
+    throttle_chat_burst: float
+    throttle_notice_window: float
+    metrics_host: str
+    metrics_port: int
+    loop_watchdog: bool
+    loop_block_threshold: float
+    record_journal: str
+    job_workers: int
+    job_max_attempts: int
+    job_visibility_timeout: float
+    job_retry_base: float
+    job_poll_interval: float
+    tmdb_api_key: str
+    tmdb_base_url: str
+    tmdb_image_base_url: str
+    tmdb_cache_ttl: float
+    moviepoilt_url: str
+    moviepoilt_username: str
+    moviepoilt_password: str
+    moviepoilt_concurrency: int
+    moviepoilt_retries: int
+    escalation_sla: float
+    admin_routes: tuple
+    classifier_file: str
+    classifier_threshold: float
+    raw: dict
+
+    def get(self, key, default=None):
+        """按原始配置键读取，兼容旧的 config.get 写法"""
+        return self.raw.get(key, default)
+
+def _id_set(data, key):
+    """读取 ID 列表并转换为 frozenset"""
+    value = data.get(key, [])
+    if not isinstance(value, list) or not all(isinstance(item, int) for item in value):
+        raise ConfigError(f"{key} 必须是整数列表")
+    return frozenset(value)
+
+def _optional_id(data, key):
+    """读取可选的群组 ID"""
+    value = data.get(key)
+    if value is not None and not isinstance(value, int):
+        raise ConfigError(f"{key} 必须是整数")
+    return value
+
+def _seconds(data, key, default):
+    """读取非负数值（秒数、速率等）"""
+    value = data.get(key, default)
+    if not isinstance(value, (int, float)) or value < 0:
+        raise ConfigError(f"{key} 必须是非负数")
+    return value
+
+def _choices(rule, key, choices, label):
+    """读取路由规则中的取值列表"""
+    value = rule.get(key, [])
+    if not isinstance(value, list) or not all(item in choices for item in value):
+        raise ConfigError(f"{label}.{key} 必须是 {', '.join(choices)} 中的值组成的列表")
+    return frozenset(value)
+
+def _admin_routes(data):
+    """读取管理群组路由规则，按顺序匹配，第一条匹配的规则生效"""
+    value = data.get('admin_routes', [])
+    if not isinstance(value, list):
+        raise ConfigError("admin_routes 必须是规则列表")
+
+    routes = []
+    for index, rule in enumerate(value):
+        label = f"admin_routes[{index}]"
+        if not isinstance(rule, dict):
+            raise ConfigError(f"{label} 必须是 JSON 对象")
+        unknown = set(rule) - ROUTE_KEYS
+        if unknown:
+            raise ConfigError(f"{label} 包含未知的键: {', '.join(sorted(unknown))}")
+
+        name = rule.get('name', f"route{index + 1}")
+        if not isinstance(name, str) or not name:
+            raise ConfigError(f"{label}.name 必须是非空字符串")
+        if name in (route.name for route in routes) or name == 'default':
+            raise ConfigError(f"{label}.name 重复: {name}")
+
+        hash_by = rule.get('hash_by', 'user')
+        if hash_by not in ROUTE_HASH_BY:
+            raise ConfigError(f"{label}.hash_by 必须是 {', '.join(ROUTE_HASH_BY)} 之一")
+
+        routes.append(AdminRoute(
+            name=name,
+            source_groups=_id_set(rule, 'source_groups'),
+            types=_choices(rule, 'types', ROUTE_TYPES, label),
+            priorities=_choices(rule, 'priorities', ROUTE_PRIORITIES, label),
+            admin_groups=_id_set(rule, 'admin_groups'),
+            hash_by=hash_by
+        ))
+    return tuple(routes)
+
+def parse_config(data):
+    """校验配置字典并生成 BotConfig"""
+    if not isinstance(data, dict):
+        raise ConfigError("配置文件必须是 JSON 对象")
+
+    bot_token = data.get('bot_token', '')
+    if not isinstance(bot_token, str) or not bot_token:
+        raise ConfigError("bot_token 不能为空")
+
+    pin_mode = data.get('pin_mode', 'message')
+    if pin_mode not in PIN_MODES:
+        raise ConfigError(f"pin_mode 必须是 {', '.join(PIN_MODES)} 之一")
+
+    daily_summary_time = data.get('daily_summary_time', '09:00')
+    try:
+        datetime.strptime(daily_summary_time, '%H:%M')
+    except (TypeError, ValueError):
+        raise ConfigError("daily_summary_time 必须是 HH:MM 格式")
+
+    timezone = data.get('timezone', 'Asia/Shanghai')
+    try:
+        ZoneInfo(timezone)
+    except Exception:
+        raise ConfigError(f"无效的时区: {timezone}")
+
+    metrics_port = data.get('metrics_port', 0)
+    if not isinstance(metrics_port, int) or not 0 <= metrics_port <= 65535:
+        raise ConfigError("metrics_port 必须是 0-65535 之间的整数")
+
+    log_format = data.get('log_format', 'text')
+    if log_format not in LOG_FORMATS:
+        raise ConfigError(f"log_format 必须是 {', '.join(LOG_FORMATS)} 之一")
+
+    log_rotate_when = data.get('log_rotate_when', '')
+    if log_rotate_when not in LOG_ROTATE_WHENS:
+        raise ConfigError(f"log_rotate_when 必须是 {', '.join(repr(when) for when in LOG_ROTATE_WHENS)} 之一")
+
+    record_journal = data.get('record_journal', '')
+    if not isinstance(record_journal, str):
+        raise ConfigError("record_journal 必须是文件路径字符串")
+
+    job_max_attempts = data.get('job_max_attempts', 5)
+    if not isinstance(job_max_attempts, int) or job_max_attempts < 1:
+        raise ConfigError("job_max_attempts 必须是正整数")
+
+    job_poll_interval = _seconds(data, 'job_poll_interval', 1)
+    if not job_poll_interval:
+        raise ConfigError("job_poll_interval 必须大于 0")
+
+    for key in ('tmdb_api_key', 'tmdb_base_url', 'tmdb_image_base_url'):
+        if not isinstance(data.get(key, ''), str):
+            raise ConfigError(f"{key} 必须是字符串")
+
+    for key in ('moviepoilt_url', 'moviepoilt_username', 'moviepoilt_password'):
+        if not isinstance(data.get(key, ''), str):
+            raise ConfigError(f"{key} 必须是字符串")
+
+    moviepoilt_concurrency = data.get('moviepoilt_concurrency', 4)
+    if not isinstance(moviepoilt_concurrency, int) or moviepoilt_concurrency < 1:
+        raise ConfigError("moviepoilt_concurrency 必须是正整数")
+
+    moviepoilt_retries = data.get('moviepoilt_retries', 3)
+    if not isinstance(moviepoilt_retries, int) or moviepoilt_retries < 0:
+        raise ConfigError("moviepoilt_retries 必须是非负整数")
+
+    if not isinstance(data.get('classifier_file', ''), str):
+        raise ConfigError("classifier_file 必须是文件路径字符串")
+
+    classifier_threshold = data.get('classifier_threshold', 0.8)
+    if not isinstance(classifier_threshold, (int, float)) or not 0 <= classifier_threshold <= 1:
+        raise ConfigError("classifier_threshold 必须是 0-1 之间的数值")
+
+    return BotConfig(
+        bot_token=bot_token,
+        admin_ids=_id_set(data, 'admin_ids'),
+        admin_group_id=_optional_id(data, 'admin_group_id'),
+        feedback_groups=_id_set(data, 'feedback_groups'),
+        display_group=_optional_id(data, 'display_group'),
+        feedback_tag=data.get('feedback_tag', '#反馈'),
+        db_file=data.get('db_file', 'feedback.db'),
+        log_file=data.get('log_file', 'bot.log'),
+        log_level=data.get('log_level', 'INFO'),
+        log_format=log_format,
+        log_max_bytes=int(_seconds(data, 'log_max_bytes', 10 * 1024 * 1024)),
+        log_backup_count=int(_seconds(data, 'log_backup_count', 5)),
+        log_rotate_when=log_rotate_when,
+        digest_window=_seconds(data, 'digest_window', 10),
+        pin_mode=pin_mode,
+        dashboard_debounce=_seconds(data, 'dashboard_debounce', 3),
+        dashboard_min_interval=_seconds(data, 'dashboard_min_interval', 10),
+        delete_delay=_seconds(data, 'delete_delay', 0),
+        daily_summary_time=daily_summary_time,
+        timezone=timezone,
+        throttle_user_per_minute=_seconds(data, 'throttle_user_per_minute', 3),
+        throttle_user_burst=_seconds(data, 'throttle_user_burst', 3),
+        throttle_chat_per_minute=_seconds(data, 'throttle_chat_per_minute', 30),
+        throttle_chat_burst=_seconds(data, 'throttle_chat_burst', 20),
+        throttle_notice_window=_seconds(data, 'throttle_notice_window', 60),
+        metrics_host=data.get('metrics_host', '127.0.0.1'),
+        metrics_port=metrics_port,
+        loop_watchdog=bool(data.get('loop_watchdog', False)),
+        loop_block_threshold=_seconds(data, 'loop_block_threshold', 0.1),
+        record_journal=record_journal,
+        job_workers=int(_seconds(data, 'job_workers', 8)),
+        job_max_attempts=job_max_attempts,
+        job_visibility_timeout=_seconds(data, 'job_visibility_timeout', 60),
+        job_retry_base=_seconds(data, 'job_retry_base', 2),
+        job_poll_interval=job_poll_interval,
+        tmdb_api_key=data.get('tmdb_api_key', ''),
+        tmdb_base_url=data.get('tmdb_base_url') or 'https://api.themoviedb.org/3',
+        tmdb_image_base_url=data.get('tmdb_image_base_url') or 'https://image.tmdb.org/t/p/w500',
+        tmdb_cache_ttl=_seconds(data, 'tmdb_cache_ttl', 7 * 24 * 3600),
+        moviepoilt_url=data.get('moviepoilt_url', ''),
+        moviepoilt_username=data.get('moviepoilt_username', ''),
+        moviepoilt_password=data.get('moviepoilt_password', ''),
+        moviepoilt_concurrency=moviepoilt_concurrency,
+        moviepoilt_retries=moviepoilt_retries,
+        escalation_sla=_seconds(data, 'escalation_sla', 3600),
+        admin_routes=_admin_routes(data),
+        classifier_file=data.get('classifier_file', 'classifier.npz'),
+        classifier_threshold=classifier_threshold,
+        raw=data
+    )
+
+def load_config(path=config_path):
+    """读取并校验配置文件"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return parse_config(json.load(f))
+
+# 当前生效的配置
+_current = load_config()
+_listeners = []
+_mtime = os.path.getmtime(config_path)
+
+def get_config():
+    """获取当前生效的配置"""
+    return _current
+
+def add_config_listener(callback):
+    """注册配置变更回调，参数为 (旧配置, 新配置)"""
+    _listeners.append(callback)
+
+def reload_config():
+    """重新加载配置文件，校验通过后整体替换并通知回调"""
+    global _current, _mtime
+    try:
+        _mtime = os.path.getmtime(config_path)
+        new = load_config()
+    except Exception as e:
+        logger.error("重新加载配置失败，继续使用旧配置: %s", e)
+        return False
+
+    old, _current = _current, new
+    for callback in _listeners:
+        try:
+            callback(old, new)
+        except Exception as e:
+            logger.error("配置变更回调执行失败: %s", e)
+    logger.info("配置已重新加载")
+    return True
+
+async def watch_config(interval=CONFIG_WATCH_INTERVAL):
+    """定期检查配置文件修改时间，发生变化时重新加载"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            mtime = os.path.getmtime(config_path)
+        except OSError as e:
+            logger.error("检查配置文件失败: %s", e)
+            continue
+        if mtime != _mtime:
+            reload_config()
+
+def install_reload_signal():
+    """收到 SIGHUP 时重新加载配置（仅限支持该信号的系统）"""
+    if not hasattr(signal, 'SIGHUP'):
+        return
+    asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, reload_config)
+
+# 以下为启动时的配置快照，需要热更新的代码请使用 get_config()
+config = _current.raw
 
 # 数据库文件路径
-DB_FILE = config.get('db_file', 'feedback.db')
+DB_FILE = _current.db_file
 
 # 日志配置
-LOG_FILE = config.get('log_file', 'bot.log')
-LOG_LEVEL = config.get('log_level', 'INFO')
+LOG_FILE = _current.log_file
+LOG_LEVEL = _current.log_level
 
 # 机器人配置
-BOT_TOKEN = config.get('bot_token', '')
-ADMIN_IDS = config.get('admin_ids', [])
+BOT_TOKEN = _current.bot_token
+ADMIN_IDS = _current.admin_ids
 
 # 反馈配置
 FEEDBACK_TYPES = {
@@ -52,7 +392,19 @@ PRIORITY_ICONS = {
 }
 
 # 群组配置
-ADMIN_GROUP_ID = config['admin_group_id']
-FEEDBACK_GROUPS = config['feedback_groups']
-DISPLAY_GROUP = config['display_group']
-FEEDBACK_TAG = config['feedback_tag'] 
\ No newline at end of file
+ADMIN_GROUP_ID = _current.admin_group_id
+FEEDBACK_GROUPS = _current.feedback_groups
+DISPLAY_GROUP = _current.display_group
+FEEDBACK_TAG = _current.feedback_tag
+
+# 通知汇总窗口（秒），窗口内的状态更新合并为一条消息发送
+DIGEST_WINDOW = _current.digest_window
+
+# 置顶模式：message 为逐条置顶反馈，dashboard 为单条自动更新的置顶看板
+PIN_MODE = _current.pin_mode
+DASHBOARD_DEBOUNCE = _current.dashboard_debounce
+DASHBOARD_MIN_INTERVAL = _current.dashboard_min_interval
+
+# 每日汇总发送时间（HH:MM）及时区
+DAILY_SUMMARY_TIME = _current.daily_summary_time
+TIMEZONE = _current.timezone
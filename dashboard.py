@@ -0,0 +1,108 @@
+import asyncio
+import logging
+from telegram.error import BadRequest
+from database import iter_pending_feedback, get_dashboard_message, set_dashboard_message
+from utils import format_dashboard
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 默认防抖时间（秒），期间的多次变更只触发一次编辑
+DASHBOARD_DEBOUNCE = 3
+
+# 默认同一看板两次编辑之间的最小间隔（秒）
+DASHBOARD_MIN_INTERVAL = 10
+
+# 看板最多列出的反馈数（一条消息也放不下更多）
+DASHBOARD_LIMIT = 100
+
+class PendingDashboard:
+    """每个管理群组一条置顶看板消息，原地编辑以反映当前待处理反馈
+
+    设置了 pending（待处理反馈的内存索引）时从索引取最紧急的反馈，刷新时不读数据库。
+    """
+
+    def __init__(self, bot, debounce=DASHBOARD_DEBOUNCE, min_interval=DASHBOARD_MIN_INTERVAL, pending=None):
+        self.bot = bot
+        self.pending = pending
+        self.debounce = debounce
+        self.min_interval = min_interval
+        self._dirty = set()
+        self._last_edit = {}
+        self._last_text = {}
+        self._task = None
+
+    def __len__(self):
+        """等待刷新的看板数"""
+        return len(self._dirty)
+
+    def request_refresh(self, chat_id):
+        """标记看板需要刷新，实际编辑经防抖和限速后执行"""
+        self._dirty.add(chat_id)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        """依次刷新所有待更新的看板"""
+        loop = asyncio.get_running_loop()
+        await asyncio.sleep(self.debounce)
+        while self._dirty:
+            chat_id = next(iter(self._dirty))
+            wait = self._last_edit.get(chat_id, 0) + self.min_interval - loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._dirty.discard(chat_id)
+            self._last_edit[chat_id] = loop.time()
+            await self.refresh(chat_id)
+
+    def _pending_feedback(self):
+        """最多 DASHBOARD_LIMIT 条待处理反馈及待处理总数"""
+        if self.pending is not None:
+            return self.pending.top(DASHBOARD_LIMIT), len(self.pending)
+        # 没有内存索引时分批读取，只保留需要显示的条目
+        feedbacks, total = [], 0
+        for feedback in iter_pending_feedback():
+            if total < DASHBOARD_LIMIT:
+                feedbacks.append(feedback)
+            total += 1
+        return feedbacks, total
+
+    async def refresh(self, chat_id):
+        """根据待处理反馈重建看板"""
+        try:
+            feedbacks, total = self._pending_feedback()
+            text = format_dashboard(feedbacks, total=total)
+            if self._last_text.get(chat_id) == text:
+                return
+
+            message_id = get_dashboard_message(chat_id)
+            if message_id:
+                try:
+                    await self.bot.edit_message_text(
+                        chat_id=chat_id,
+                        message_id=message_id,
+                        text=text
+                    )
+                except BadRequest as e:
+                    # 内容未变化视为成功，其他错误（如消息已被删除）重新发送
+                    if 'not modified' not in str(e).lower():
+                        logger.warning("编辑看板失败，重新发送: %s", e)
+                        message_id = None
+
+            if not message_id:
+                message = await self.bot.send_message(chat_id=chat_id, text=text)
+                # 发送后立即记录，置顶失败（如没有置顶权限或被限流）时之后仍编辑这条消息，不再重复发送
+                set_dashboard_message(chat_id, message.message_id)
+                logger.info("已在群组 %s 创建看板", chat_id)
+                try:
+                    await self.bot.pin_chat_message(
+                        chat_id=chat_id,
+                        message_id=message.message_id,
+                        disable_notification=True
+                    )
+                except Exception as e:
+                    logger.warning("置顶群组 %s 的看板失败: %s", chat_id, e)
+
+            self._last_text[chat_id] = text
+        except Exception as e:
+            logger.error("刷新群组 %s 的看板失败: %s", chat_id, e)
@@ -1,17 +1,28 @@
 import sqlite3
+import json
 import logging
-from datetime import datetime
+import math
+import time
+from datetime import datetime, timezone
+from metrics import timed, DB_LATENCY
 
 # 配置日志
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
 logger = logging.getLogger(__name__)
 
 # 数据库文件
 DB_FILE = 'feedback.db'
 
+# 优先级排序值（0 最紧急），待处理反馈的查询和索引使用同一表达式
+PRIORITY_RANK = '''CASE priority
+                       WHEN '!!!' THEN 0
+                       WHEN '!!' THEN 1
+                       WHEN 'high' THEN 1
+                       WHEN '!' THEN 2
+                       WHEN 'normal' THEN 2
+                       WHEN 'low' THEN 3
+                       ELSE 4
+                   END'''
+
 # 反馈状态
 FEEDBACK_STATUS = {
     'pending': '待处理',
@@ -19,12 +30,44 @@ FEEDBACK_STATUS = {
     'rejected': '已驳回'
 }
 
+# 状态变为 (键) 时记录的事件
+STATUS_EVENTS = {
+    'pending': 'reopened',
+    'resolved': 'resolved',
+    'rejected': 'rejected'
+}
+
+# 汇总粒度及其秒数
+ROLLUP_PERIODS = {
+    'hour': 3600,
+    'day': 86400
+}
+
+# 处理耗时分桶：第 0 桶为 1 分钟以内，之后每桶上限为前一桶的 1.25 倍
+DURATION_BUCKET_BASE = 60
+DURATION_BUCKET_GROWTH = 1.25
+
+def duration_bucket(seconds):
+    """处理耗时所在的分桶"""
+    if seconds <= DURATION_BUCKET_BASE:
+        return 0
+    return math.ceil(math.log(seconds / DURATION_BUCKET_BASE, DURATION_BUCKET_GROWTH))
+
+def bucket_upper_bound(bucket):
+    """分桶的耗时上限（秒）"""
+    return DURATION_BUCKET_BASE * DURATION_BUCKET_GROWTH ** bucket
+
+@timed(DB_LATENCY)
 def init_db():
     """初始化数据库"""
     try:
         conn = sqlite3.connect(DB_FILE)
         c = conn.cursor()
         
+        # WAL 模式下读写互不阻塞，机器人和独立的投递进程可以同时访问数据库；
+        # 必须在任何写操作之前执行，否则会处于隐式事务中而无法切换
+        c.execute('PRAGMA journal_mode = WAL')
+        
         # 创建反馈表
         c.execute('''CREATE TABLE IF NOT EXISTS feedback
                      (id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -39,6 +82,145 @@ def init_db():
                       created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                       updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
         
+        # 创建反馈表索引：按消息 ID 查找、按状态统计和列出、按优先级分页读取待处理反馈
+        c.execute('''CREATE INDEX IF NOT EXISTS idx_feedback_message_id
+                     ON feedback (message_id)''')
+        c.execute('''CREATE INDEX IF NOT EXISTS idx_feedback_status_created_at
+                     ON feedback (status, created_at)''')
+        c.execute(f'''CREATE INDEX IF NOT EXISTS idx_feedback_status_priority
+                      ON feedback (status, ({PRIORITY_RANK}), created_at)''')
+        
+        # 创建反馈事件表：只追加，记录创建和每次状态变更的操作人和时间
+        c.execute('''CREATE TABLE IF NOT EXISTS feedback_events
+                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                      feedback_id INTEGER NOT NULL,
+                      event TEXT NOT NULL,
+                      actor_id INTEGER,
+                      actor_name TEXT,
+                      created_at REAL NOT NULL)''')
+        c.execute('''CREATE INDEX IF NOT EXISTS idx_feedback_events_feedback_id
+                     ON feedback_events (feedback_id, id)''')
+        
+        # 创建反馈汇总表：按小时和天、类型/优先级/处理人累计事件数和处理耗时分桶，写入事件时同步更新
+        c.execute('''CREATE TABLE IF NOT EXISTS feedback_rollups
+                     (period TEXT NOT NULL,
+                      period_start INTEGER NOT NULL,
+                      dimension TEXT NOT NULL,
+                      value TEXT NOT NULL,
+                      outcome TEXT NOT NULL,
+                      bucket INTEGER NOT NULL,
+                      count INTEGER DEFAULT 0,
+                      total_seconds REAL DEFAULT 0,
+                      PRIMARY KEY (period, period_start, dimension, value, outcome, bucket))''')
+        
+        # 已有反馈尚无事件时按现有记录补齐
+        c.execute('SELECT 1 FROM feedback_events LIMIT 1')
+        if c.fetchone() is None:
+            _backfill_feedback_events(c)
+        
+        # 创建自动分类记录表：未加类型标签、由本地模型判断类型的反馈，训练时排除这些反馈
+        c.execute('''CREATE TABLE IF NOT EXISTS feedback_predictions
+                     (feedback_id INTEGER PRIMARY KEY,
+                      feedback_type TEXT NOT NULL,
+                      confidence REAL,
+                      model TEXT,
+                      created_at REAL)''')
+        
+        # 按用户查看反馈记录：按创建时间倒序分页
+        c.execute('''CREATE INDEX IF NOT EXISTS idx_feedback_user_id_created_at
+                     ON feedback (user_id, created_at)''')
+        
+        # 创建用户反馈统计表：各状态的反馈数，由触发器随反馈的新增、状态变更和删除同步更新
+        c.execute('''CREATE TABLE IF NOT EXISTS user_stats
+                     (user_id INTEGER PRIMARY KEY,
+                      username TEXT,
+                      total INTEGER DEFAULT 0,
+                      pending INTEGER DEFAULT 0,
+                      resolved INTEGER DEFAULT 0,
+                      rejected INTEGER DEFAULT 0,
+                      first_at TIMESTAMP,
+                      last_at TIMESTAMP)''')
+        c.execute('''CREATE INDEX IF NOT EXISTS idx_user_stats_username
+                     ON user_stats (username COLLATE NOCASE)''')
+        
+        # 升级前的反馈一次性汇总，之后只由触发器增量更新
+        c.execute('SELECT 1 FROM user_stats LIMIT 1')
+        if c.fetchone() is None:
+            c.execute('''INSERT INTO user_stats
+                         (user_id, username, total, pending, resolved, rejected, first_at, last_at)
+                         SELECT user_id, username, COUNT(*), SUM(status = 'pending'),
+                                SUM(status = 'resolved'), SUM(status = 'rejected'),
+                                MIN(created_at), MAX(created_at)
+                         FROM feedback
+                         WHERE user_id IS NOT NULL
+                         GROUP BY user_id''')
+            # 汇总单独提交，不与之后的建表语句处在同一个隐式事务中
+            conn.commit()
+        
+        c.execute('''CREATE TRIGGER IF NOT EXISTS user_stats_insert
+                     AFTER INSERT ON feedback
+                     BEGIN
+                         INSERT INTO user_stats
+                         (user_id, username, total, pending, resolved, rejected, first_at, last_at)
+                         VALUES (NEW.user_id, NEW.username, 1, NEW.status = 'pending',
+                                 NEW.status = 'resolved', NEW.status = 'rejected', NEW.created_at, NEW.created_at)
+                         ON CONFLICT (user_id) DO UPDATE SET
+                             username = excluded.username,
+                             total = total + 1,
+                             pending = pending + excluded.pending,
+                             resolved = resolved + excluded.resolved,
+                             rejected = rejected + excluded.rejected,
+                             last_at = excluded.last_at;
+                     END;''')
+        c.execute('''CREATE TRIGGER IF NOT EXISTS user_stats_status
+                     AFTER UPDATE OF status ON feedback
+                     WHEN OLD.status IS NOT NEW.status
+                     BEGIN
+                         UPDATE user_stats SET
+                             pending = pending + (NEW.status = 'pending') - (OLD.status = 'pending'),
+                             resolved = resolved + (NEW.status = 'resolved') - (OLD.status = 'resolved'),
+                             rejected = rejected + (NEW.status = 'rejected') - (OLD.status = 'rejected')
+                         WHERE user_id = NEW.user_id;
+                     END;''')
+        c.execute('''CREATE TRIGGER IF NOT EXISTS user_stats_delete
+                     AFTER DELETE ON feedback
+                     BEGIN
+                         UPDATE user_stats SET
+                             total = total - 1,
+                             pending = pending - (OLD.status = 'pending'),
+                             resolved = resolved - (OLD.status = 'resolved'),
+                             rejected = rejected - (OLD.status = 'rejected')
+                         WHERE user_id = OLD.user_id;
+                     END;''')
+        
+        # 反馈内容的全文索引（三元组分词，支持任意位置的子串查找），内容仍只存在 feedback 表中
+        c.execute("SELECT 1 FROM sqlite_master WHERE name = 'feedback_search'")
+        search_exists = c.fetchone() is not None
+        c.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS feedback_search
+                     USING fts5(content, content = 'feedback', content_rowid = 'id', tokenize = 'trigram')''')
+        if not search_exists:
+            # 升级前的反馈一次性建立索引，之后由触发器增量更新
+            c.execute("INSERT INTO feedback_search (feedback_search) VALUES ('rebuild')")
+            conn.commit()
+        c.execute('''CREATE TRIGGER IF NOT EXISTS feedback_search_insert
+                     AFTER INSERT ON feedback
+                     BEGIN
+                         INSERT INTO feedback_search (rowid, content) VALUES (NEW.id, NEW.content);
+                     END;''')
+        c.execute('''CREATE TRIGGER IF NOT EXISTS feedback_search_delete
+                     AFTER DELETE ON feedback
+                     BEGIN
+                         INSERT INTO feedback_search (feedback_search, rowid, content)
+                         VALUES ('delete', OLD.id, OLD.content);
+                     END;''')
+        c.execute('''CREATE TRIGGER IF NOT EXISTS feedback_search_update
+                     AFTER UPDATE OF content ON feedback
+                     BEGIN
+                         INSERT INTO feedback_search (feedback_search, rowid, content)
+                         VALUES ('delete', OLD.id, OLD.content);
+                         INSERT INTO feedback_search (rowid, content) VALUES (NEW.id, NEW.content);
+                     END;''')
+        
         # 创建群组表
         c.execute('''CREATE TABLE IF NOT EXISTS groups
                      (id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -47,6 +229,135 @@ def init_db():
                       is_admin_group INTEGER DEFAULT 0,
                       created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
         
+        # 创建置顶看板表
+        c.execute('''CREATE TABLE IF NOT EXISTS dashboards
+                     (chat_id INTEGER PRIMARY KEY,
+                      message_id INTEGER,
+                      updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+        
+        # 创建定时任务表（如延迟删除消息）
+        c.execute('''CREATE TABLE IF NOT EXISTS scheduled_actions
+                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                      action TEXT,
+                      chat_id INTEGER,
+                      message_id INTEGER,
+                      due_at REAL,
+                      created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+        c.execute('''CREATE INDEX IF NOT EXISTS idx_scheduled_actions_due_at
+                     ON scheduled_actions (due_at)''')
+        
+        # 创建运行状态表（如已注册命令的哈希）
+        c.execute('''CREATE TABLE IF NOT EXISTS bot_state
+                     (key TEXT PRIMARY KEY,
+                      value TEXT,
+                      updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+        
+        # 创建租约表（保证只有一个实例在轮询）
+        c.execute('''CREATE TABLE IF NOT EXISTS leases
+                     (name TEXT PRIMARY KEY,
+                      owner TEXT,
+                      expires_at REAL,
+                      handover_to TEXT,
+                      handover_at REAL)''')
+        # 旧版租约表没有交接请求时间
+        c.execute('PRAGMA table_info(leases)')
+        if 'handover_at' not in [column[1] for column in c.fetchall()]:
+            c.execute('ALTER TABLE leases ADD COLUMN handover_at REAL')
+        
+        # 创建投递任务表：available_at 为可领取时间，领取后顺延为租约到期时间，死信任务为 NULL
+        c.execute('''CREATE TABLE IF NOT EXISTS jobs
+                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                      kind TEXT,
+                      payload TEXT,
+                      status TEXT DEFAULT 'queued',
+                      attempts INTEGER DEFAULT 0,
+                      max_attempts INTEGER,
+                      available_at REAL,
+                      owner TEXT,
+                      last_error TEXT,
+                      created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                      updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+        c.execute('''CREATE INDEX IF NOT EXISTS idx_jobs_available_at
+                     ON jobs (available_at)''')
+        
+        # 创建汇总通知表：等待合并发送的状态更新，由每个群组的 digest 任务发送后删除
+        c.execute('''CREATE TABLE IF NOT EXISTS digest_entries
+                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                      chat_id INTEGER NOT NULL,
+                      entry TEXT NOT NULL,
+                      created_at REAL)''')
+        c.execute('''CREATE INDEX IF NOT EXISTS idx_digest_entries_chat_id
+                     ON digest_entries (chat_id, id)''')
+        
+        # 创建求片订阅表：同一影片只有一条记录，对应管理群组中的一张卡片
+        c.execute('''CREATE TABLE IF NOT EXISTS subscriptions
+                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                      tmdb_id INTEGER NOT NULL,
+                      media_type TEXT NOT NULL,
+                      status TEXT DEFAULT 'pending',
+                      request_count INTEGER DEFAULT 0,
+                      admin_chat_id INTEGER,
+                      admin_message_id INTEGER,
+                      card_request_count INTEGER DEFAULT 0,
+                      card_is_photo INTEGER DEFAULT 0,
+                      created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                      updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                      UNIQUE (tmdb_id, media_type))''')
+        c.execute('''CREATE INDEX IF NOT EXISTS idx_subscriptions_status
+                     ON subscriptions (status)''')
+        
+        # 创建求片用户表：每个用户对同一影片只记一次
+        c.execute('''CREATE TABLE IF NOT EXISTS subscription_requesters
+                     (subscription_id INTEGER NOT NULL,
+                      user_id INTEGER NOT NULL,
+                      username TEXT,
+                      group_id INTEGER,
+                      original_message TEXT,
+                      created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                      PRIMARY KEY (subscription_id, user_id))''')
+        
+        # 创建 TMDB 元数据缓存表，poster_file_id 为海报上传到 Telegram 后的 file_id
+        c.execute('''CREATE TABLE IF NOT EXISTS tmdb_cache
+                     (tmdb_id INTEGER NOT NULL,
+                      media_type TEXT NOT NULL,
+                      title TEXT,
+                      year TEXT,
+                      poster_path TEXT,
+                      poster_file_id TEXT,
+                      fetched_at REAL,
+                      PRIMARY KEY (tmdb_id, media_type))''')
+        
+        # 创建附件表：只保存 Telegram 的 file_id 和元数据，转发到管理群组时按消息复制，不下载文件；
+        # relay_chat_id / relay_message_id 为已转发到的管理群组及其中的反馈消息
+        c.execute('''CREATE TABLE IF NOT EXISTS attachments
+                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                      feedback_id INTEGER,
+                      chat_id INTEGER NOT NULL,
+                      message_id INTEGER NOT NULL,
+                      media_group_id TEXT,
+                      kind TEXT NOT NULL,
+                      file_id TEXT NOT NULL,
+                      file_unique_id TEXT,
+                      file_name TEXT,
+                      mime_type TEXT,
+                      file_size INTEGER,
+                      width INTEGER,
+                      height INTEGER,
+                      duration INTEGER,
+                      relay_chat_id INTEGER,
+                      relay_message_id INTEGER,
+                      created_at REAL)''')
+        c.execute('''CREATE INDEX IF NOT EXISTS idx_attachments_feedback_id
+                     ON attachments (feedback_id, message_id)''')
+        c.execute('''CREATE INDEX IF NOT EXISTS idx_attachments_media_group_id
+                     ON attachments (media_group_id) WHERE media_group_id IS NOT NULL''')
+        
+        # 创建反馈管理消息表：反馈实际发送到的管理群组及其中的消息，超时提醒发送到同一群组
+        c.execute('''CREATE TABLE IF NOT EXISTS feedback_admin_messages
+                     (feedback_id INTEGER PRIMARY KEY,
+                      chat_id INTEGER NOT NULL,
+                      message_id INTEGER NOT NULL)''')
+        
         # 创建触发器，自动更新 updated_at
         c.execute('''CREATE TRIGGER IF NOT EXISTS update_feedback_timestamp
                      AFTER UPDATE ON feedback
@@ -59,11 +370,115 @@ def init_db():
         conn.close()
         logger.info("数据库初始化成功")
     except Exception as e:
-        logger.error(f"数据库初始化失败: {str(e)}")
+        logger.error("数据库初始化失败: %s", str(e))
         raise
 
-def add_feedback(user_id, username, content, message_id, feedback_type, group_id, priority='!'):
-    """添加反馈"""
+# 汇总行累加，同一周期和分桶的事件合并到一行
+ROLLUP_UPSERT = '''INSERT INTO feedback_rollups
+                    (period, period_start, dimension, value, outcome, bucket, count, total_seconds)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (period, period_start, dimension, value, outcome, bucket)
+                    DO UPDATE SET count = count + excluded.count,
+                                  total_seconds = total_seconds + excluded.total_seconds'''
+
+def _rollup_keys(event, feedback_type, priority, actor, now):
+    """事件计入的各汇总行 (粒度, 周期起点, 维度, 值, 事件)，处理事件另按处理人统计"""
+    dimensions = [('all', ''), ('type', feedback_type or ''), ('priority', priority or '')]
+    if event in ('resolved', 'rejected'):
+        dimensions.append(('admin', actor or ''))
+    return [
+        (period, int(now // length * length), dimension, value, event)
+        for period, length in ROLLUP_PERIODS.items()
+        for dimension, value in dimensions
+    ]
+
+def _record_feedback_event(c, feedback_id, event, feedback_type, priority, actor_id, actor_name, now):
+    """追加反馈事件并更新各粒度的汇总，与状态变更在同一事务中执行"""
+    c.execute('''INSERT INTO feedback_events (feedback_id, event, actor_id, actor_name, created_at)
+                 VALUES (?, ?, ?, ?, ?)''',
+              (feedback_id, event, actor_id, actor_name, now))
+
+    bucket, seconds = -1, 0
+    if event in ('resolved', 'rejected'):
+        # 处理耗时从最近一次创建或重新打开算起
+        c.execute('''SELECT created_at FROM feedback_events
+                     WHERE feedback_id = ? AND event IN ('created', 'reopened')
+                     ORDER BY id DESC LIMIT 1''', (feedback_id,))
+        opened = c.fetchone()
+        seconds = max(0, now - opened[0]) if opened else 0
+        bucket = duration_bucket(seconds)
+
+    actor = actor_name or (str(actor_id) if actor_id else '')
+    c.executemany(ROLLUP_UPSERT, [
+        key + (bucket, 1, seconds) for key in _rollup_keys(event, feedback_type, priority, actor, now)
+    ])
+
+def _move_type_rollups(c, feedback_id, old_type, new_type):
+    """反馈类型变更后，把其已计入的事件从原类型的汇总移到新类型，与类型变更在同一事务中执行"""
+    c.execute('''SELECT event, created_at FROM feedback_events
+                 WHERE feedback_id = ? ORDER BY id''', (feedback_id,))
+    rows = []
+    opened = None
+    for event, now in c.fetchall():
+        # 处理耗时的分桶与记录事件时相同：从最近一次创建或重新打开算起
+        bucket, seconds = -1, 0
+        if event in ('created', 'reopened'):
+            opened = now
+        elif event in ('resolved', 'rejected'):
+            seconds = max(0, now - opened) if opened is not None else 0
+            bucket = duration_bucket(seconds)
+        for period, length in ROLLUP_PERIODS.items():
+            period_start = int(now // length * length)
+            rows.append((period, period_start, 'type', old_type or '', event, bucket, -1, -seconds))
+            rows.append((period, period_start, 'type', new_type or '', event, bucket, 1, seconds))
+    c.executemany(ROLLUP_UPSERT, rows)
+
+def _backfill_feedback_events(c):
+    """为升级前的反馈补记事件：创建时间取 created_at，已处理的反馈以 updated_at 作为处理时间，处理人未知"""
+    def timestamp(value):
+        return datetime.strptime(value, '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc).timestamp()
+
+    c.execute('SELECT id, feedback_type, priority, status, created_at, updated_at FROM feedback ORDER BY id')
+    events = []
+    rollups = {}
+    for feedback_id, feedback_type, priority, status, created_at, updated_at in c.fetchall():
+        try:
+            created, updated = timestamp(created_at), timestamp(updated_at or created_at)
+        except (TypeError, ValueError):
+            continue
+        entries = [('created', created, -1, 0)]
+        if status in ('resolved', 'rejected'):
+            seconds = max(0, updated - created)
+            entries.append((status, updated, duration_bucket(seconds), seconds))
+        for event, now, bucket, seconds in entries:
+            events.append((feedback_id, event, now))
+            for key in _rollup_keys(event, feedback_type, priority, '', now):
+                total = rollups.setdefault(key + (bucket,), [0, 0])
+                total[0] += 1
+                total[1] += seconds
+
+    # 在内存中合并后批量写入
+    c.executemany('INSERT INTO feedback_events (feedback_id, event, created_at) VALUES (?, ?, ?)', events)
+    c.executemany(ROLLUP_UPSERT, [key + tuple(total) for key, total in rollups.items()])
+    if events:
+        logger.info("已为历史反馈补记 %s 条事件", len(events))
+
+# 附件元数据字段，与 attachments 表中的列同名
+ATTACHMENT_FIELDS = (
+    'chat_id', 'message_id', 'media_group_id', 'kind', 'file_id', 'file_unique_id',
+    'file_name', 'mime_type', 'file_size', 'width', 'height', 'duration'
+)
+
+def _insert_attachment(c, feedback_id, attachment, now):
+    """写入一条附件记录"""
+    c.execute(f'''INSERT INTO attachments (feedback_id, {', '.join(ATTACHMENT_FIELDS)}, created_at)
+                   VALUES ({', '.join('?' * (len(ATTACHMENT_FIELDS) + 2))})''',
+              (feedback_id, *(attachment.get(field) for field in ATTACHMENT_FIELDS), now))
+
+@timed(DB_LATENCY)
+def add_feedback(user_id, username, content, message_id, feedback_type, group_id, priority='!', attachments=(),
+                 prediction=None):
+    """添加反馈，attachments 为附件元数据字典列表，prediction 为自动分类的 (置信度, 模型)，与反馈在同一事务中写入"""
     try:
         conn = sqlite3.connect(DB_FILE)
         c = conn.cursor()
@@ -72,31 +487,53 @@ def add_feedback(user_id, username, content, message_id, feedback_type, group_id
                      VALUES (?, ?, ?, ?, ?, ?, ?)''',
                   (user_id, username, content, message_id, feedback_type, group_id, priority))
         feedback_id = c.lastrowid
+        now = time.time()
+        for attachment in attachments:
+            _insert_attachment(c, feedback_id, attachment, now)
+        if prediction is not None:
+            c.execute('''INSERT INTO feedback_predictions (feedback_id, feedback_type, confidence, model, created_at)
+                         VALUES (?, ?, ?, ?, ?)''',
+                      (feedback_id, feedback_type, *prediction, now))
+        _record_feedback_event(c, feedback_id, 'created', feedback_type, priority, user_id, username, now)
         conn.commit()
         conn.close()
-        logger.info(f"添加反馈成功: {feedback_id}")
+        logger.info("添加反馈成功: %s", feedback_id)
         return feedback_id
     except Exception as e:
-        logger.error(f"添加反馈失败: {str(e)}")
+        logger.error("添加反馈失败: %s", str(e))
         return None
 
-def update_feedback_status(message_id, status):
-    """更新反馈状态"""
+@timed(DB_LATENCY)
+def update_feedback_status(message_id, status, actor_id=None, actor_name=None):
+    """更新反馈状态，状态有变化时记录事件（操作人为 actor）
+
+    返回 True 表示状态已修改，False 表示反馈已是该状态（重复点击或其他管理员已处理），失败时返回 None
+    """
     try:
         conn = sqlite3.connect(DB_FILE)
         c = conn.cursor()
         c.execute('''UPDATE feedback 
                      SET status = ?
-                     WHERE message_id = ?''',
-                  (status, message_id))
+                     WHERE message_id = ? AND status != ?
+                     RETURNING id, feedback_type, priority''',
+                  (status, message_id, status))
+        now = time.time()
+        rows = c.fetchall()
+        for feedback_id, feedback_type, priority in rows:
+            _record_feedback_event(c, feedback_id, STATUS_EVENTS[status], feedback_type, priority,
+                                   actor_id, actor_name, now)
         conn.commit()
         conn.close()
-        logger.info(f"更新反馈状态成功: {message_id} -> {status}")
-        return True
+        if rows:
+            logger.info("更新反馈状态成功: %s -> %s", message_id, status)
+        else:
+            logger.info("反馈状态未变化，可能已被处理: %s -> %s", message_id, status)
+        return bool(rows)
     except Exception as e:
-        logger.error(f"更新反馈状态失败: {str(e)}")
-        return False
+        logger.error("更新反馈状态失败: %s", str(e))
+        return None
 
+@timed(DB_LATENCY)
 def get_pending_feedback():
     """获取待处理的反馈"""
     try:
@@ -109,9 +546,275 @@ def get_pending_feedback():
         conn.close()
         return feedbacks
     except Exception as e:
-        logger.error(f"获取待处理反馈失败: {str(e)}")
+        logger.error("获取待处理反馈失败: %s", str(e))
         return []
 
+def iter_pending_feedback(batch_size=200, after=None):
+    """按优先级和创建时间逐行读取待处理反馈，分页查询避免一次性加载全部记录；
+    after 为 (优先级排序值, created_at, id)，从其后开始读取
+
+    每页分两段沿 (status, 优先级, created_at) 索引定位：同一优先级中上一页之后的部分，
+    以及更低的优先级，合并后取前 batch_size 条，每页读取的行数与积压量无关
+    """
+    last_key = after or (-1, '', 0)
+    while True:
+        try:
+            conn = sqlite3.connect(DB_FILE)
+            c = conn.cursor()
+            c.execute(f'''SELECT * FROM (SELECT *, {PRIORITY_RANK} AS priority_rank FROM feedback
+                                        WHERE status = 'pending' AND {PRIORITY_RANK} = ?
+                                          AND (created_at, id) > (?, ?)
+                                        ORDER BY created_at, id
+                                        LIMIT ?)
+                          UNION ALL
+                          SELECT * FROM (SELECT *, {PRIORITY_RANK} AS priority_rank FROM feedback
+                                        WHERE status = 'pending' AND {PRIORITY_RANK} > ?
+                                        ORDER BY priority_rank, created_at, id
+                                        LIMIT ?)
+                          ORDER BY priority_rank, created_at, id
+                          LIMIT ?''',
+                      last_key + (batch_size, last_key[0], batch_size, batch_size))
+            rows = c.fetchall()
+            conn.close()
+        except Exception as e:
+            logger.error("读取待处理反馈失败: %s", str(e))
+            return
+
+        yield from rows
+        if len(rows) < batch_size:
+            return
+        last_key = (rows[-1][-1], rows[-1][9], rows[-1][0])
+
+@timed(DB_LATENCY)
+def get_user_feedback_page(user_id, before=None, limit=10):
+    """按创建时间倒序读取用户的一页反馈，before 为上一页最后一条的 (created_at, id)"""
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        c = conn.cursor()
+        if before is None:
+            c.execute('''SELECT id, content, feedback_type, priority, status, created_at
+                         FROM feedback
+                         WHERE user_id = ?
+                         ORDER BY created_at DESC, id DESC
+                         LIMIT ?''',
+                      (user_id, limit))
+        else:
+            c.execute('''SELECT id, content, feedback_type, priority, status, created_at
+                         FROM feedback
+                         WHERE user_id = ? AND (created_at, id) < (?, ?)
+                         ORDER BY created_at DESC, id DESC
+                         LIMIT ?''',
+                      (user_id, *before, limit))
+        rows = c.fetchall()
+        conn.close()
+        return rows
+    except Exception as e:
+        logger.error("获取用户反馈记录失败: %s", str(e))
+        return None
+
+@timed(DB_LATENCY)
+def get_user_stats(user_id):
+    """获取用户的反馈统计 (user_id, username, total, pending, resolved, rejected, first_at, last_at)"""
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        c = conn.cursor()
+        c.execute('SELECT * FROM user_stats WHERE user_id = ?', (user_id,))
+        stats = c.fetchone()
+        conn.close()
+        return stats
+    except Exception as e:
+        logger.error("获取用户反馈统计失败: %s", str(e))
+        return None
+
+@timed(DB_LATENCY)
+def find_user_by_name(username):
+    """按用户名（不区分大小写）查找提交过反馈的用户 ID"""
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        c = conn.cursor()
+        c.execute('''SELECT user_id FROM user_stats
+                     WHERE username = ? COLLATE NOCASE
+                     ORDER BY last_at DESC
+                     LIMIT 1''',
+                  (username,))
+        row = c.fetchone()
+        conn.close()
+        return row[0] if row else None
+    except Exception as e:
+        logger.error("查找用户失败: %s", str(e))
+        return None
+
+# 搜索结果的列
+SEARCH_COLUMNS = 'id, user_id, username, content, feedback_type, priority, status, created_at'
+
+# 三元组索引只能查找至少 3 个字符的子串
+SEARCH_MIN_LENGTH = 3
+
+@timed(DB_LATENCY)
+def get_feedback_by_id(feedback_id):
+    """根据反馈 ID 获取反馈，返回搜索结果的列"""
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        c = conn.cursor()
+        c.execute(f'SELECT {SEARCH_COLUMNS} FROM feedback WHERE id = ?', (feedback_id,))
+        feedback = c.fetchone()
+        conn.close()
+        return feedback
+    except Exception as e:
+        logger.error("获取反馈失败: %s", str(e))
+        return None
+
+@timed(DB_LATENCY)
+def find_users_by_prefix(prefix, limit=5):
+    """按用户名前缀（不区分大小写）查找提交过反馈的用户 ID
+
+    用范围条件代替 LIKE，并按用户名排序，使查询沿 user_stats 的用户名索引读到 limit 条即停止
+    """
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        c = conn.cursor()
+        c.execute('''SELECT user_id FROM user_stats
+                     WHERE username >= ? COLLATE NOCASE AND username < ? COLLATE NOCASE
+                     ORDER BY username COLLATE NOCASE
+                     LIMIT ?''',
+                  (prefix, prefix + '\U0010ffff', limit))
+        user_ids = [row[0] for row in c.fetchall()]
+        conn.close()
+        return user_ids
+    except Exception as e:
+        logger.error("查找用户失败: %s", str(e))
+        return None
+
+@timed(DB_LATENCY)
+def get_users_feedback_page(user_ids, before=None, limit=20):
+    """按 ID 倒序读取若干用户的一页反馈，before 为上一页最后一条的 ID"""
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        c = conn.cursor()
+        placeholders = ', '.join('?' * len(user_ids))
+        c.execute(f'''SELECT {SEARCH_COLUMNS} FROM feedback
+                      WHERE user_id IN ({placeholders}) AND id < ?
+                      ORDER BY id DESC
+                      LIMIT ?''',
+                  (*user_ids, before or 2 ** 63 - 1, limit))
+        rows = c.fetchall()
+        conn.close()
+        return rows
+    except Exception as e:
+        logger.error("获取用户反馈失败: %s", str(e))
+        return None
+
+@timed(DB_LATENCY)
+def search_feedback_content(text, before=None, limit=20, window=5000):
+    """按 ID 倒序查找内容包含 text 的反馈，before 为上一页最后一条的 ID
+
+    至少 SEARCH_MIN_LENGTH 个字符时使用全文索引，更短的查询只在最近 window 条反馈中逐条匹配
+    """
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        c = conn.cursor()
+        before = before or 2 ** 63 - 1
+        if len(text) >= SEARCH_MIN_LENGTH:
+            # 作为短语查询，双引号需要转义
+            phrase = '"' + text.replace('"', '""') + '"'
+            c.execute(f'''SELECT {SEARCH_COLUMNS} FROM feedback
+                          WHERE id IN (SELECT rowid FROM feedback_search
+                                       WHERE feedback_search MATCH ? AND rowid < ?
+                                       ORDER BY rowid DESC
+                                       LIMIT ?)
+                          ORDER BY id DESC''',
+                      (phrase, before, limit))
+        else:
+            pattern = '%' + text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            c.execute(f'''SELECT {SEARCH_COLUMNS} FROM feedback
+                          WHERE id > (SELECT MAX(id) FROM feedback) - ? AND id < ?
+                            AND content LIKE ? ESCAPE '\\'
+                          ORDER BY id DESC
+                          LIMIT ?''',
+                      (window, before, pattern, limit))
+        rows = c.fetchall()
+        conn.close()
+        return rows
+    except Exception as e:
+        logger.error("搜索反馈失败: %s", str(e))
+        return None
+
+def iter_labeled_feedback(batch_size=5000):
+    """按 ID 顺序读取用户加了类型标签的反馈 (id, content, feedback_type)，用于离线训练分类模型；
+    一般反馈（默认类型）和由模型判断类型的反馈不参与训练"""
+    last_id = 0
+    while True:
+        try:
+            conn = sqlite3.connect(DB_FILE)
+            c = conn.cursor()
+            c.execute('''SELECT id, content, feedback_type FROM feedback
+                         WHERE id > ? AND feedback_type != 'general'
+                           AND id NOT IN (SELECT feedback_id FROM feedback_predictions)
+                         ORDER BY id
+                         LIMIT ?''',
+                      (last_id, batch_size))
+            rows = c.fetchall()
+            conn.close()
+        except Exception as e:
+            logger.error("读取训练数据失败: %s", str(e))
+            return
+
+        yield from rows
+        if len(rows) < batch_size:
+            return
+        last_id = rows[-1][0]
+
+def iter_unclassified_pending(batch_size=5000):
+    """按创建时间读取类型为一般反馈的待处理反馈 (id, content, created_at)，用于批量重新分类"""
+    last_key = ('', 0)
+    while True:
+        try:
+            conn = sqlite3.connect(DB_FILE)
+            c = conn.cursor()
+            c.execute('''SELECT id, content, created_at FROM feedback
+                         WHERE status = 'pending' AND feedback_type = 'general'
+                           AND (created_at, id) > (?, ?)
+                         ORDER BY created_at, id
+                         LIMIT ?''',
+                      last_key + (batch_size,))
+            rows = c.fetchall()
+            conn.close()
+        except Exception as e:
+            logger.error("读取待分类反馈失败: %s", str(e))
+            return
+
+        yield from rows
+        if len(rows) < batch_size:
+            return
+        last_key = (rows[-1][2], rows[-1][0])
+
+@timed(DB_LATENCY)
+def set_predicted_types(predictions, model):
+    """批量写入自动分类结果，predictions 为 (反馈 ID, 类型, 置信度) 列表；只修改仍为一般反馈的记录，并同步按类型的汇总"""
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        c = conn.cursor()
+        now = time.time()
+        updated = 0
+        for feedback_id, feedback_type, confidence in predictions:
+            c.execute('''UPDATE feedback SET feedback_type = ?
+                         WHERE id = ? AND feedback_type = ?''',
+                      (feedback_type, feedback_id, 'general'))
+            if c.rowcount:
+                updated += 1
+                _move_type_rollups(c, feedback_id, 'general', feedback_type)
+                c.execute('''INSERT OR REPLACE INTO feedback_predictions
+                             (feedback_id, feedback_type, confidence, model, created_at)
+                             VALUES (?, ?, ?, ?, ?)''',
+                          (feedback_id, feedback_type, confidence, model, now))
+        conn.commit()
+        conn.close()
+        return updated
+    except Exception as e:
+        logger.error("写入自动分类结果失败: %s", str(e))
+        return None
+
+@timed(DB_LATENCY)
 def get_feedback_by_message_id(message_id):
     """根据消息ID获取反馈"""
     try:
@@ -124,9 +827,10 @@ def get_feedback_by_message_id(message_id):
         conn.close()
         return feedback
     except Exception as e:
-        logger.error(f"获取反馈失败: {str(e)}")
+        logger.error("获取反馈失败: %s", str(e))
         return None
 
+@timed(DB_LATENCY)
 def get_feedback_stats():
     """获取反馈统计"""
     try:
@@ -152,24 +856,138 @@ def get_feedback_stats():
             'pending': pending
         }
     except Exception as e:
-        logger.error(f"获取反馈统计失败: {str(e)}")
+        logger.error("获取反馈统计失败: %s", str(e))
+        return None
+
+@timed(DB_LATENCY)
+def get_feedback_rollups(period, since):
+    """读取 since 之后各汇总的合计 (维度, 值, 事件, 分桶, 数量, 总耗时)，行数与反馈量无关"""
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        c = conn.cursor()
+        c.execute('''SELECT dimension, value, outcome, bucket, SUM(count), SUM(total_seconds)
+                     FROM feedback_rollups
+                     WHERE period = ? AND period_start >= ?
+                     GROUP BY dimension, value, outcome, bucket''',
+                  (period, since))
+        rows = c.fetchall()
+        conn.close()
+        return rows
+    except Exception as e:
+        logger.error("获取反馈汇总失败: %s", str(e))
+        return None
+
+@timed(DB_LATENCY)
+def add_media_group_attachment(attachment):
+    """相册中的其他附件：同一相册已有反馈时写入，返回 (反馈 ID, 已转发到的管理群组, 管理群组中的反馈消息)，
+    相册还没有反馈时返回 (None, None, None)，出错时返回 None"""
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        c = conn.cursor()
+        c.execute('''SELECT MAX(feedback_id), MAX(relay_chat_id), MAX(relay_message_id)
+                     FROM attachments WHERE media_group_id = ?''',
+                  (attachment['media_group_id'],))
+        result = c.fetchone()
+        if result[0] is not None:
+            _insert_attachment(c, result[0], attachment, time.time())
+            conn.commit()
+        conn.close()
+        return result
+    except Exception as e:
+        logger.error("添加附件失败: %s", str(e))
+        return None
+
+@timed(DB_LATENCY)
+def claim_unrelayed_attachments(feedback_id, chat_id, message_id):
+    """认领反馈中尚未转发到管理群组的附件 (id, chat_id, message_id, kind)，按消息顺序；
+    认领时即记录转发到的管理群组，之后到达的相册附件会另行补充复制，不会漏掉"""
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        c = conn.cursor()
+        c.execute('''UPDATE attachments SET relay_chat_id = ?, relay_message_id = ?
+                     WHERE feedback_id = ? AND relay_chat_id IS NULL
+                     RETURNING id, chat_id, message_id, kind''',
+                  (chat_id, message_id, feedback_id))
+        attachments = sorted(c.fetchall(), key=lambda attachment: attachment[2])
+        conn.commit()
+        conn.close()
+        return attachments
+    except Exception as e:
+        logger.error("认领附件失败: %s", str(e))
+        return None
+
+@timed(DB_LATENCY)
+def release_attachments(attachment_ids):
+    """复制失败时释放认领的附件，重试时重新认领"""
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        c = conn.cursor()
+        c.executemany('''UPDATE attachments SET relay_chat_id = NULL, relay_message_id = NULL
+                         WHERE id = ?''',
+                      [(attachment_id,) for attachment_id in attachment_ids])
+        conn.commit()
+        conn.close()
+        return True
+    except Exception as e:
+        logger.error("更新附件转发状态失败: %s", str(e))
+        return False
+
+@timed(DB_LATENCY)
+def set_feedback_admin_message(feedback_id, chat_id, message_id):
+    """记录反馈发送到的管理群组及其中的消息"""
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        c = conn.cursor()
+        c.execute('''INSERT OR REPLACE INTO feedback_admin_messages (feedback_id, chat_id, message_id)
+                     VALUES (?, ?, ?)''',
+                  (feedback_id, chat_id, message_id))
+        conn.commit()
+        conn.close()
+        return True
+    except Exception as e:
+        logger.error("保存反馈管理消息失败: %s", str(e))
+        return False
+
+@timed(DB_LATENCY)
+def get_feedback_admin_chats(feedback_ids):
+    """反馈发送到的管理群组 {反馈 ID: 群组 ID}，没有记录的反馈不在结果中"""
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        c = conn.cursor()
+        placeholders = ', '.join('?' * len(feedback_ids))
+        c.execute(f'''SELECT feedback_id, chat_id FROM feedback_admin_messages
+                      WHERE feedback_id IN ({placeholders})''',
+                  tuple(feedback_ids))
+        chats = dict(c.fetchall())
+        conn.close()
+        return chats
+    except Exception as e:
+        logger.error("获取反馈管理消息失败: %s", str(e))
         return None
 
+@timed(DB_LATENCY)
 def clear_database():
     """清除数据库"""
     try:
         conn = sqlite3.connect(DB_FILE)
         c = conn.cursor()
+        c.execute('DELETE FROM user_stats')
         c.execute('DELETE FROM feedback')
+        c.execute('DELETE FROM feedback_events')
+        c.execute('DELETE FROM feedback_rollups')
+        c.execute('DELETE FROM feedback_predictions')
+        c.execute('DELETE FROM attachments')
+        c.execute('DELETE FROM feedback_admin_messages')
         c.execute('DELETE FROM groups')
         conn.commit()
         conn.close()
         logger.info("数据库已清除")
         return True
     except Exception as e:
-        logger.error(f"清除数据库失败: {str(e)}")
+        logger.error("清除数据库失败: %s", str(e))
         return False
 
+@timed(DB_LATENCY)
 def add_group(group_id, group_name, is_admin_group=False):
     """添加群组"""
     try:
@@ -195,12 +1013,13 @@ def add_group(group_id, group_name, is_admin_group=False):
         
         conn.commit()
         conn.close()
-        logger.info(f"添加群组成功: {group_id}")
+        logger.info("添加群组成功: %s", group_id)
         return True
     except Exception as e:
-        logger.error(f"添加群组失败: {str(e)}")
+        logger.error("添加群组失败: %s", str(e))
         return False
 
+@timed(DB_LATENCY)
 def get_admin_group():
     """获取管理群组"""
     try:
@@ -213,15 +1032,32 @@ def get_admin_group():
         conn.close()
         
         if admin_group:
-            logger.info(f"找到管理群组: {admin_group[0]} - {admin_group[1]}")
+            logger.info("找到管理群组: %s - %s", admin_group[0], admin_group[1])
         else:
             logger.warning("未找到管理群组")
             
         return admin_group
     except Exception as e:
-        logger.error(f"获取管理群组失败: {str(e)}")
+        logger.error("获取管理群组失败: %s", str(e))
         return None
 
+@timed(DB_LATENCY)
+def get_admin_groups():
+    """获取所有管理群组"""
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        c = conn.cursor()
+        c.execute('''SELECT group_id, group_name FROM groups 
+                     WHERE is_admin_group = 1
+                     ORDER BY group_id''')
+        groups = c.fetchall()
+        conn.close()
+        return groups
+    except Exception as e:
+        logger.error("获取管理群组失败: %s", str(e))
+        return []
+
+@timed(DB_LATENCY)
 def get_user_groups():
     """获取用户群组"""
     try:
@@ -233,9 +1069,10 @@ def get_user_groups():
         conn.close()
         return groups
     except Exception as e:
-        logger.error(f"获取用户群组失败: {str(e)}")
+        logger.error("获取用户群组失败: %s", str(e))
         return []
 
+@timed(DB_LATENCY)
 def is_admin_group(group_id):
     """检查是否是管理群组"""
     try:
@@ -248,9 +1085,10 @@ def is_admin_group(group_id):
         conn.close()
         return result and result[0] == 1
     except Exception as e:
-        logger.error(f"检查管理群组失败: {str(e)}")
+        logger.error("检查管理群组失败: %s", str(e))
         return False
 
+@timed(DB_LATENCY)
 def is_user_group(group_id):
     """检查是否是用户群组"""
     try:
@@ -263,9 +1101,10 @@ def is_user_group(group_id):
         conn.close()
         return result and result[0] == 0
     except Exception as e:
-        logger.error(f"检查用户群组失败: {str(e)}")
+        logger.error("检查用户群组失败: %s", str(e))
         return False
 
+@timed(DB_LATENCY)
 def remove_group(group_id):
     """移除群组"""
     try:
@@ -274,8 +1113,599 @@ def remove_group(group_id):
         c.execute('DELETE FROM groups WHERE group_id = ?', (group_id,))
         conn.commit()
         conn.close()
-        logger.info(f"移除群组成功: {group_id}")
+        logger.info("移除群组成功: %s", group_id)
         return True
     except Exception as e:
-        logger.error(f"移除群组失败: {str(e)}")
-        return False 
\ No newline at end of file
+        logger.error("移除群组失败: %s", str(e))
+        return False 
+
+@timed(DB_LATENCY)
+def get_dashboard_message(chat_id):
+    """获取群组置顶看板的消息ID"""
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        c = conn.cursor()
+        c.execute('''SELECT message_id FROM dashboards 
+                     WHERE chat_id = ?''',
+                  (chat_id,))
+        result = c.fetchone()
+        conn.close()
+        return result[0] if result else None
+    except Exception as e:
+        logger.error("获取置顶看板失败: %s", str(e))
+        return None
+
+@timed(DB_LATENCY)
+def set_dashboard_message(chat_id, message_id):
+    """保存群组置顶看板的消息ID"""
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        c = conn.cursor()
+        c.execute('''INSERT OR REPLACE INTO dashboards 
+                     (chat_id, message_id, updated_at)
+                     VALUES (?, ?, CURRENT_TIMESTAMP)''',
+                  (chat_id, message_id))
+        conn.commit()
+        conn.close()
+        logger.info("保存置顶看板成功: %s -> %s", chat_id, message_id)
+        return True
+    except Exception as e:
+        logger.error("保存置顶看板失败: %s", str(e))
+        return False
+
+@timed(DB_LATENCY)
+def add_scheduled_action(action, chat_id, message_id, due_at):
+    """添加定时任务，due_at 为 Unix 时间戳"""
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        c = conn.cursor()
+        c.execute('''INSERT INTO scheduled_actions 
+                     (action, chat_id, message_id, due_at)
+                     VALUES (?, ?, ?, ?)''',
+                  (action, chat_id, message_id, due_at))
+        action_id = c.lastrowid
+        conn.commit()
+        conn.close()
+        return action_id
+    except Exception as e:
+        logger.error("添加定时任务失败: %s", str(e))
+        return None
+
+@timed(DB_LATENCY)
+def get_scheduled_actions():
+    """获取所有未执行的定时任务"""
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        c = conn.cursor()
+        c.execute('''SELECT id, action, chat_id, message_id, due_at FROM scheduled_actions 
+                     ORDER BY due_at''')
+        actions = c.fetchall()
+        conn.close()
+        return actions
+    except Exception as e:
+        logger.error("获取定时任务失败: %s", str(e))
+        return []
+
+@timed(DB_LATENCY)
+def remove_scheduled_actions(action_ids):
+    """批量移除已执行的定时任务"""
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        c = conn.cursor()
+        c.executemany('DELETE FROM scheduled_actions WHERE id = ?',
+                      [(action_id,) for action_id in action_ids])
+        conn.commit()
+        conn.close()
+        return True
+    except Exception as e:
+        logger.error("移除定时任务失败: %s", str(e))
+        return False
+
+@timed(DB_LATENCY)
+def get_bot_state(key):
+    """获取运行状态值"""
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        c = conn.cursor()
+        c.execute('SELECT value FROM bot_state WHERE key = ?', (key,))
+        result = c.fetchone()
+        conn.close()
+        return result[0] if result else None
+    except Exception as e:
+        logger.error("获取运行状态失败: %s", str(e))
+        return None
+
+@timed(DB_LATENCY)
+def set_bot_state(key, value):
+    """保存运行状态值"""
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        c = conn.cursor()
+        c.execute('''INSERT OR REPLACE INTO bot_state 
+                     (key, value, updated_at)
+                     VALUES (?, ?, CURRENT_TIMESTAMP)''',
+                  (key, value))
+        conn.commit()
+        conn.close()
+        return True
+    except Exception as e:
+        logger.error("保存运行状态失败: %s", str(e))
+        return False
+
+@timed(DB_LATENCY)
+def acquire_lease(name, owner, ttl):
+    """租约空闲或已过期时获取租约"""
+    try:
+        now = time.time()
+        conn = sqlite3.connect(DB_FILE)
+        c = conn.cursor()
+        c.execute('''INSERT INTO leases (name, owner, expires_at, handover_to)
+                     VALUES (?, ?, ?, NULL)
+                     ON CONFLICT(name) DO UPDATE
+                     SET owner = excluded.owner,
+                         expires_at = excluded.expires_at,
+                         handover_to = NULL,
+                         handover_at = NULL
+                     WHERE leases.owner IS NULL OR leases.owner = excluded.owner
+                        OR leases.expires_at < ?''',
+                  (name, owner, now + ttl, now))
+        acquired = c.rowcount == 1
+        conn.commit()
+        conn.close()
+        return acquired
+    except Exception as e:
+        logger.error("获取租约失败: %s", str(e))
+        return False
+
+@timed(DB_LATENCY)
+def renew_lease(name, owner, ttl):
+    """续约，返回 (是否仍持有租约, 请求接管的实例)，出错（如数据库被锁）时返回 None；
+    超过一个有效期未刷新的接管请求视为已放弃"""
+    try:
+        now = time.time()
+        conn = sqlite3.connect(DB_FILE)
+        c = conn.cursor()
+        c.execute('''UPDATE leases SET expires_at = ?
+                     WHERE name = ? AND owner = ?''',
+                  (now + ttl, name, owner))
+        renewed = c.rowcount == 1
+        c.execute('''SELECT CASE WHEN handover_at >= ? THEN handover_to END
+                     FROM leases WHERE name = ?''',
+                  (now - ttl, name))
+        result = c.fetchone()
+        conn.commit()
+        conn.close()
+        return renewed, result[0] if result else None
+    except Exception as e:
+        logger.error("续约失败: %s", str(e))
+        return None
+
+@timed(DB_LATENCY)
+def request_lease_handover(name, owner):
+    """请求当前持有者交出租约，等待期间需要定期重新请求以保持请求有效"""
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        c = conn.cursor()
+        c.execute('UPDATE leases SET handover_to = ?, handover_at = ? WHERE name = ?', (owner, time.time(), name))
+        conn.commit()
+        conn.close()
+        return True
+    except Exception as e:
+        logger.error("请求接管租约失败: %s", str(e))
+        return False
+
+@timed(DB_LATENCY)
+def withdraw_lease_handover(name, owner):
+    """撤回本实例的接管请求"""
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        c = conn.cursor()
+        c.execute('''UPDATE leases SET handover_to = NULL, handover_at = NULL
+                     WHERE name = ? AND handover_to = ?''',
+                  (name, owner))
+        conn.commit()
+        conn.close()
+        return True
+    except Exception as e:
+        logger.error("撤回接管请求失败: %s", str(e))
+        return False
+
+@timed(DB_LATENCY)
+def release_lease(name, owner):
+    """释放租约"""
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        c = conn.cursor()
+        c.execute('''UPDATE leases SET owner = NULL, expires_at = 0
+                     WHERE name = ? AND owner = ?''',
+                  (name, owner))
+        conn.commit()
+        conn.close()
+        return True
+    except Exception as e:
+        logger.error("释放租约失败: %s", str(e))
+        return False
+
+def _insert_job(c, kind, payload, max_attempts, available_at):
+    """写入一个投递任务，返回任务 ID"""
+    c.execute('''INSERT INTO jobs (kind, payload, max_attempts, available_at)
+                 VALUES (?, ?, ?, ?)''',
+              (kind, json.dumps(payload, ensure_ascii=False), max_attempts, available_at))
+    return c.lastrowid
+
+@timed(DB_LATENCY)
+def enqueue_jobs(jobs, max_attempts, delay=0):
+    """批量添加投递任务，jobs 为 (类型, 参数) 列表，返回任务 ID 列表"""
+    try:
+        available_at = time.time() + delay
+        conn = sqlite3.connect(DB_FILE)
+        c = conn.cursor()
+        job_ids = [_insert_job(c, kind, payload, max_attempts, available_at) for kind, payload in jobs]
+        conn.commit()
+        conn.close()
+        return job_ids
+    except Exception as e:
+        logger.error("添加投递任务失败: %s", str(e))
+        return []
+
+@timed(DB_LATENCY)
+def claim_jobs(owner, limit, visibility_timeout):
+    """领取最多 limit 个到期任务（包括租约已过期的任务），返回 (ID, 类型, 参数, 已尝试次数, 最大尝试次数) 列表"""
+    try:
+        now = time.time()
+        conn = sqlite3.connect(DB_FILE)
+        c = conn.cursor()
+        c.execute('''UPDATE jobs
+                     SET status = 'running', owner = ?, attempts = attempts + 1,
+                         available_at = ?, updated_at = CURRENT_TIMESTAMP
+                     WHERE id IN (SELECT id FROM jobs WHERE available_at <= ?
+                                  ORDER BY available_at LIMIT ?)
+                     RETURNING id, kind, payload, attempts, max_attempts''',
+                  (owner, now + visibility_timeout, now, limit))
+        jobs = [(job_id, kind, json.loads(payload), attempts, max_attempts)
+                for job_id, kind, payload, attempts, max_attempts in c.fetchall()]
+        conn.commit()
+        conn.close()
+        return jobs
+    except Exception as e:
+        logger.error("领取投递任务失败: %s", str(e))
+        return []
+
+@timed(DB_LATENCY)
+def complete_job(job_id, owner, attempts):
+    """删除已完成的任务，租约已被其他进程接管时返回 False"""
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        c = conn.cursor()
+        c.execute('DELETE FROM jobs WHERE id = ? AND owner = ? AND attempts = ?',
+                  (job_id, owner, attempts))
+        completed = c.rowcount == 1
+        conn.commit()
+        conn.close()
+        return completed
+    except Exception as e:
+        logger.error("完成投递任务失败: %s", str(e))
+        return False
+
+@timed(DB_LATENCY)
+def retry_job(job_id, owner, attempts, delay, error, count_attempt=True):
+    """释放租约，任务在 delay 秒后可再次领取；count_attempt 为 False 时本次不计入尝试次数"""
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        c = conn.cursor()
+        c.execute('''UPDATE jobs
+                     SET status = 'queued', owner = NULL, available_at = ?,
+                         attempts = attempts - ?, last_error = ?, updated_at = CURRENT_TIMESTAMP
+                     WHERE id = ? AND owner = ? AND attempts = ?''',
+                  (time.time() + delay, 0 if count_attempt else 1, error, job_id, owner, attempts))
+        retried = c.rowcount == 1
+        conn.commit()
+        conn.close()
+        return retried
+    except Exception as e:
+        logger.error("重试投递任务失败: %s", str(e))
+        return False
+
+@timed(DB_LATENCY)
+def dead_letter_job(job_id, owner, attempts, error):
+    """将任务移入死信，不再领取"""
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        c = conn.cursor()
+        c.execute('''UPDATE jobs
+                     SET status = 'dead', owner = NULL, available_at = NULL,
+                         last_error = ?, updated_at = CURRENT_TIMESTAMP
+                     WHERE id = ? AND owner = ? AND attempts = ?''',
+                  (error, job_id, owner, attempts))
+        moved = c.rowcount == 1
+        conn.commit()
+        conn.close()
+        return moved
+    except Exception as e:
+        logger.error("移入死信失败: %s", str(e))
+        return False
+
+@timed(DB_LATENCY)
+def requeue_dead_jobs():
+    """重新排队所有死信任务，尝试次数清零，返回任务数"""
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        c = conn.cursor()
+        c.execute('''UPDATE jobs
+                     SET status = 'queued', attempts = 0, available_at = ?,
+                         updated_at = CURRENT_TIMESTAMP
+                     WHERE status = 'dead' ''',
+                  (time.time(),))
+        count = c.rowcount
+        conn.commit()
+        conn.close()
+        return count
+    except Exception as e:
+        logger.error("重新排队死信任务失败: %s", str(e))
+        return 0
+
+@timed(DB_LATENCY)
+def get_job_counts():
+    """按状态统计投递任务数"""
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        c = conn.cursor()
+        c.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status')
+        counts = dict(c.fetchall())
+        conn.close()
+        return counts
+    except Exception as e:
+        logger.error("统计投递任务失败: %s", str(e))
+        return None
+
+@timed(DB_LATENCY)
+def add_digest_entry(chat_id, entry, delay, max_attempts):
+    """加入一条待汇总的通知；群组中没有其他待发送的通知时，在同一事务中添加 delay 秒后发送的 digest 任务"""
+    try:
+        now = time.time()
+        conn = sqlite3.connect(DB_FILE)
+        c = conn.cursor()
+        c.execute('''INSERT INTO digest_entries (chat_id, entry, created_at)
+                     VALUES (?, ?, ?)''',
+                  (chat_id, entry, now))
+        c.execute('''SELECT 1 FROM digest_entries
+                     WHERE chat_id = ? AND id < ? LIMIT 1''',
+                  (chat_id, c.lastrowid))
+        if c.fetchone() is None:
+            _insert_job(c, 'digest', {'chat_id': chat_id}, max_attempts, now + delay)
+        conn.commit()
+        conn.close()
+        return True
+    except Exception as e:
+        logger.error("添加汇总通知失败: %s", str(e))
+        return False
+
+@timed(DB_LATENCY)
+def get_digest_entries(chat_id):
+    """获取群组中待发送的通知 (ID, 内容)，按加入顺序"""
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        c = conn.cursor()
+        c.execute('''SELECT id, entry FROM digest_entries
+                     WHERE chat_id = ? ORDER BY id''',
+                  (chat_id,))
+        entries = c.fetchall()
+        conn.close()
+        return entries
+    except Exception as e:
+        logger.error("获取汇总通知失败: %s", str(e))
+        return None
+
+@timed(DB_LATENCY)
+def remove_digest_entries(chat_id, last_id, delay=None, max_attempts=None):
+    """删除已发送的通知（ID 不超过 last_id）；给出 delay 时，若期间又有新通知，在同一事务中添加 delay 秒后发送的 digest 任务"""
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        c = conn.cursor()
+        c.execute('''DELETE FROM digest_entries
+                     WHERE chat_id = ? AND id <= ?''',
+                  (chat_id, last_id))
+        c.execute('''SELECT 1 FROM digest_entries
+                     WHERE chat_id = ? LIMIT 1''',
+                  (chat_id,))
+        if c.fetchone() is not None and delay is not None:
+            _insert_job(c, 'digest', {'chat_id': chat_id}, max_attempts, time.time() + delay)
+        conn.commit()
+        conn.close()
+        return True
+    except Exception as e:
+        logger.error("删除汇总通知失败: %s", str(e))
+        return False
+
+@timed(DB_LATENCY)
+def count_digest_entries():
+    """待发送的汇总通知数"""
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        c = conn.cursor()
+        c.execute('SELECT COUNT(*) FROM digest_entries')
+        count = c.fetchone()[0]
+        conn.close()
+        return count
+    except Exception as e:
+        logger.error("统计汇总通知失败: %s", str(e))
+        return None
+
+@timed(DB_LATENCY)
+def add_subscription_request(tmdb_id, media_type, user_id, username, group_id, original_message):
+    """记录一次求片请求，同一影片合并为一条订阅
+
+    返回 (订阅 ID, 状态, 请求人数, 是否首次请求该影片, 该用户是否首次请求)，失败时返回 None。
+    已拒绝的订阅再次被请求时重新打开，并在管理群组发送新卡片
+    """
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        c = conn.cursor()
+        c.execute('''INSERT INTO subscriptions (tmdb_id, media_type)
+                     VALUES (?, ?)
+                     ON CONFLICT(tmdb_id, media_type) DO UPDATE
+                     SET status = CASE WHEN status = 'rejected' THEN 'pending' ELSE status END,
+                         admin_message_id = CASE WHEN status = 'rejected' THEN NULL ELSE admin_message_id END,
+                         request_count = CASE WHEN status = 'rejected' THEN 0 ELSE request_count END,
+                         card_request_count = CASE WHEN status = 'rejected' THEN 0 ELSE card_request_count END,
+                         updated_at = CURRENT_TIMESTAMP
+                     RETURNING id, status, admin_message_id IS NULL AND request_count = 0''',
+                  (tmdb_id, media_type))
+        subscription_id, status, first = c.fetchone()
+        if first:
+            # 重新打开时清空上一轮的请求用户
+            c.execute('DELETE FROM subscription_requesters WHERE subscription_id = ?', (subscription_id,))
+        c.execute('''INSERT OR IGNORE INTO subscription_requesters
+                     (subscription_id, user_id, username, group_id, original_message)
+                     VALUES (?, ?, ?, ?, ?)''',
+                  (subscription_id, user_id, username, group_id, original_message))
+        new_requester = c.rowcount == 1
+        c.execute('''UPDATE subscriptions SET request_count = request_count + ?
+                     WHERE id = ?
+                     RETURNING request_count''',
+                  (1 if new_requester else 0, subscription_id))
+        request_count = c.fetchone()[0]
+        conn.commit()
+        conn.close()
+        logger.info("记录求片请求成功: %s/%s，共 %s 人", media_type, tmdb_id, request_count)
+        return subscription_id, status, request_count, bool(first), new_requester
+    except Exception as e:
+        logger.error("记录求片请求失败: %s", str(e))
+        return None
+
+@timed(DB_LATENCY)
+def get_subscription(subscription_id):
+    """获取订阅，返回 (ID, TMDB ID, 类型, 状态, 请求人数, 管理群组 ID, 卡片消息 ID, 卡片显示的人数, 卡片是否带海报)"""
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        c = conn.cursor()
+        c.execute('''SELECT id, tmdb_id, media_type, status, request_count,
+                            admin_chat_id, admin_message_id, card_request_count, card_is_photo
+                     FROM subscriptions WHERE id = ?''', (subscription_id,))
+        subscription = c.fetchone()
+        conn.close()
+        return subscription
+    except Exception as e:
+        logger.error("获取订阅失败: %s", str(e))
+        return None
+
+@timed(DB_LATENCY)
+def get_subscription_requesters(subscription_id, limit=None):
+    """获取订阅的请求用户 (user_id, username, group_id)，按请求时间排序"""
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        c = conn.cursor()
+        c.execute('''SELECT user_id, username, group_id FROM subscription_requesters
+                     WHERE subscription_id = ?
+                     ORDER BY created_at, rowid
+                     LIMIT ?''', (subscription_id, -1 if limit is None else limit))
+        requesters = c.fetchall()
+        conn.close()
+        return requesters
+    except Exception as e:
+        logger.error("获取求片用户失败: %s", str(e))
+        return []
+
+@timed(DB_LATENCY)
+def set_subscription_card(subscription_id, chat_id, message_id, request_count, is_photo):
+    """记录订阅卡片的消息、显示的请求人数及是否带海报"""
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        c = conn.cursor()
+        c.execute('''UPDATE subscriptions
+                     SET admin_chat_id = ?, admin_message_id = ?, card_request_count = ?, card_is_photo = ?
+                     WHERE id = ?''',
+                  (chat_id, message_id, request_count, int(is_photo), subscription_id))
+        conn.commit()
+        conn.close()
+        return True
+    except Exception as e:
+        logger.error("保存订阅卡片失败: %s", str(e))
+        return False
+
+@timed(DB_LATENCY)
+def update_subscription_status(subscription_id, status):
+    """处理待定的订阅，已被处理过时返回 False"""
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        c = conn.cursor()
+        c.execute('''UPDATE subscriptions SET status = ?, updated_at = CURRENT_TIMESTAMP
+                     WHERE id = ? AND status = 'pending' ''',
+                  (status, subscription_id))
+        updated = c.rowcount == 1
+        conn.commit()
+        conn.close()
+        return updated
+    except Exception as e:
+        logger.error("更新订阅状态失败: %s", str(e))
+        return False
+
+@timed(DB_LATENCY)
+def approve_pending_subscriptions():
+    """同意全部待定的订阅，返回被同意的订阅 ID 列表"""
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        c = conn.cursor()
+        c.execute('''UPDATE subscriptions SET status = 'approved', updated_at = CURRENT_TIMESTAMP
+                     WHERE status = 'pending' RETURNING id''')
+        subscription_ids = sorted(row[0] for row in c.fetchall())
+        conn.commit()
+        conn.close()
+        return subscription_ids
+    except Exception as e:
+        logger.error("批量同意订阅失败: %s", str(e))
+        return []
+
+@timed(DB_LATENCY)
+def get_tmdb_metadata(tmdb_id, media_type):
+    """获取缓存的 TMDB 元数据 (标题, 年份, 海报路径, 海报 file_id, 获取时间)"""
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        c = conn.cursor()
+        c.execute('''SELECT title, year, poster_path, poster_file_id, fetched_at FROM tmdb_cache
+                     WHERE tmdb_id = ? AND media_type = ?''', (tmdb_id, media_type))
+        metadata = c.fetchone()
+        conn.close()
+        return metadata
+    except Exception as e:
+        logger.error("获取 TMDB 缓存失败: %s", str(e))
+        return None
+
+@timed(DB_LATENCY)
+def save_tmdb_metadata(tmdb_id, media_type, title, year, poster_path):
+    """保存 TMDB 元数据，海报未变化时保留已上传的 file_id"""
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        c = conn.cursor()
+        c.execute('''INSERT INTO tmdb_cache (tmdb_id, media_type, title, year, poster_path, fetched_at)
+                     VALUES (?, ?, ?, ?, ?, ?)
+                     ON CONFLICT(tmdb_id, media_type) DO UPDATE
+                     SET title = excluded.title,
+                         year = excluded.year,
+                         poster_file_id = CASE WHEN poster_path IS excluded.poster_path
+                                               THEN poster_file_id END,
+                         poster_path = excluded.poster_path,
+                         fetched_at = excluded.fetched_at''',
+                  (tmdb_id, media_type, title, year, poster_path, time.time()))
+        conn.commit()
+        conn.close()
+        return True
+    except Exception as e:
+        logger.error("保存 TMDB 缓存失败: %s", str(e))
+        return False
+
+@timed(DB_LATENCY)
+def set_tmdb_poster_file_id(tmdb_id, media_type, file_id):
+    """保存海报上传后的 file_id，之后发送时不再重新下载"""
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        c = conn.cursor()
+        c.execute('''UPDATE tmdb_cache SET poster_file_id = ?
+                     WHERE tmdb_id = ? AND media_type = ?''',
+                  (file_id, tmdb_id, media_type))
+        conn.commit()
+        conn.close()
+        return True
+    except Exception as e:
+        logger.error("保存海报 file_id 失败: %s", str(e))
+        return False
@@ -0,0 +1,79 @@
+import logging
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from database import set_feedback_admin_message
+from jobqueue import job_handler
+from digest import queue_digest_entry
+from utils import format_digest_entry
+from config import get_config
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+@job_handler('reply')
+async def deliver_reply(pool, payload):
+    """回复用户消息（如提交确认、错误提示）"""
+    await pool.bot.send_message(
+        chat_id=payload['chat_id'],
+        text=payload['text'],
+        reply_to_message_id=payload.get('reply_to'),
+        allow_sending_without_reply=True
+    )
+
+async def admin_post_failed(pool, payload, error):
+    """反馈未能发送到管理群组时通知用户"""
+    pool.submit([('reply', {
+        'chat_id': payload['reply_chat_id'],
+        'reply_to': payload['reply_to'],
+        'text': "抱歉，发送反馈到管理群组时出现错误，请联系管理员。"
+    })])
+
+@job_handler('admin_post', on_dead=admin_post_failed)
+async def deliver_admin_post(pool, payload):
+    """发送反馈到管理群组，之后置顶（看板模式下刷新看板）并复制附件"""
+    chat_id = payload['chat_id']
+    reply_markup = InlineKeyboardMarkup([
+        [InlineKeyboardButton(label, callback_data=data) for label, data in row]
+        for row in payload['buttons']
+    ])
+    logger.info("尝试发送消息到管理群组: %s", chat_id)
+    admin_msg = await pool.bot.send_message(
+        chat_id=chat_id,
+        text=payload['text'],
+        reply_markup=reply_markup,
+        parse_mode='Markdown'
+    )
+    logger.info("成功发送消息到管理群组")
+    set_feedback_admin_message(payload['feedback_id'], chat_id, admin_msg.message_id)
+
+    if get_config().pin_mode == 'dashboard':
+        pool.services['dashboard'].request_refresh(chat_id)
+    else:
+        pool.submit([('pin', {'chat_id': chat_id, 'message_id': admin_msg.message_id})])
+
+    # 附件复制在反馈消息之后，相册等待其余附件到达后一起复制
+    if payload.get('attachments_delay') is not None:
+        pool.submit([('attachments', {
+            'feedback_id': payload['feedback_id'],
+            'chat_id': chat_id,
+            'reply_to': admin_msg.message_id
+        })], payload['attachments_delay'])
+
+@job_handler('pin')
+async def deliver_pin(pool, payload):
+    """置顶消息"""
+    await pool.bot.pin_chat_message(chat_id=payload['chat_id'], message_id=payload['message_id'])
+    logger.info("成功置顶消息")
+
+@job_handler('unpin')
+async def deliver_unpin(pool, payload):
+    """取消置顶消息"""
+    await pool.bot.unpin_chat_message(chat_id=payload['chat_id'], message_id=payload['message_id'])
+    logger.info("成功取消置顶消息")
+
+@job_handler('notify')
+async def deliver_notify(pool, payload):
+    """将反馈状态更新加入原始群组的汇总通知，窗口结束后合并发送"""
+    queue_digest_entry(
+        payload['chat_id'],
+        format_digest_entry(payload['user_id'], payload['username'], payload['content'], payload['status'])
+    )
@@ -0,0 +1,61 @@
+import logging
+from datetime import datetime
+from telegram.error import BadRequest, Forbidden
+from database import add_digest_entry, get_digest_entries, remove_digest_entries
+from jobqueue import job_handler
+from utils import iter_message_batches
+from config import get_config
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+def queue_digest_entry(chat_id, entry):
+    """加入一条待汇总的通知，窗口结束后由该群组的 digest 任务合并发送"""
+    settings = get_config()
+    if not add_digest_entry(chat_id, entry, settings.digest_window, settings.job_max_attempts):
+        raise RuntimeError("保存汇总通知失败")
+
+async def drop_digest(pool, payload, error):
+    """digest 任务进入死信时丢弃该群组未发送的通知，之后的通知重新开始汇总"""
+    chat_id = payload['chat_id']
+    entries = get_digest_entries(chat_id)
+    if entries:
+        logger.error("未能发送群组 %s 的 %s 条汇总通知，已丢弃: %s", chat_id, len(entries), error)
+        settings = get_config()
+        remove_digest_entries(chat_id, entries[-1][0], settings.digest_window, settings.job_max_attempts)
+
+@job_handler('digest', on_dead=drop_digest)
+async def deliver_digest(pool, payload):
+    """合并发送群组的汇总通知
+
+    通知保存在数据库中，每发出一个消息块即删除其中的通知；被限流或网络错误时由任务重试，
+    只重发尚未发出的部分。发送期间新加入的通知在删除最后一块时另行安排下一次发送。
+    """
+    chat_id = payload['chat_id']
+    entries = get_digest_entries(chat_id)
+    if entries is None:
+        raise RuntimeError("读取汇总通知失败")
+    if not entries:
+        return
+
+    settings = get_config()
+    header = (
+        "📢 反馈处理通知\n"
+        f"⏰ 处理时间：{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
+    )
+    sent = chunks = 0
+    batches = list(iter_message_batches([entry for _, entry in entries], header=header))
+    for index, (text, count) in enumerate(batches):
+        try:
+            await pool.bot.send_message(chat_id=chat_id, text=text, parse_mode='HTML')
+            chunks += 1
+        except (BadRequest, Forbidden) as e:
+            # 消息本身有误或无权发送，重试也不会成功
+            logger.error("在群组 %s 发送汇总通知失败: %s", chat_id, e)
+        sent += count
+        last = index == len(batches) - 1
+        remove_digest_entries(
+            chat_id, entries[sent - 1][0],
+            settings.digest_window if last else None, settings.job_max_attempts
+        )
+    logger.info("已向群组 %s 发送汇总通知，共 %s 条消息", chat_id, chunks)
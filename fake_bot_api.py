@@ -0,0 +1,257 @@
+import asyncio
+import json
+import logging
+import random
+import time
+from collections import Counter
+from urllib.parse import parse_qsl
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 模拟的机器人账号
+BOT_USER = {
+    'id': 123456,
+    'is_bot': True,
+    'first_name': 'Feedback Bot',
+    'username': 'feedback_bench_bot'
+}
+
+# 不计入延迟和限流注入的方法
+UNTHROTTLED_METHODS = ('getUpdates', 'getMe')
+
+class FakeBotAPI:
+    """本地模拟的 Bot API 服务，用于性能测试和回放
+
+    支持 getUpdates 长轮询、发送/编辑/置顶消息、getChatMember 等常用方法，
+    可配置每次调用的延迟和返回 429 的概率，并记录所有调用
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, rate_limit=0.0, retry_after=1, record_calls=False):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.record_calls = record_calls
+        self.calls = []
+        self.call_counts = Counter()
+        self.rate_limited = Counter()
+        self.sent_messages = []
+        self.copied_messages = 0
+        self._updates = []
+        self._next_update_id = 1
+        self._next_message_id = 1
+        self._new_updates = asyncio.Event()
+        self._server = None
+        self._writers = set()
+        self.port = None
+
+    @property
+    def base_url(self):
+        """供 ApplicationBuilder.base_url 使用的地址"""
+        return f"http://127.0.0.1:{self.port}/bot"
+
+    async def start(self, host='127.0.0.1', port=0):
+        """启动 HTTP 服务，port 为 0 时自动分配"""
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info("模拟 Bot API 已启动: %s", self.base_url)
+
+    async def stop(self):
+        """停止 HTTP 服务"""
+        if self._server is not None:
+            # 唤醒挂起的长轮询并关闭客户端连接
+            self._server.close()
+            self._new_updates.set()
+            for writer in list(self._writers):
+                writer.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def add_update(self, update):
+        """加入一条待 getUpdates 拉取的更新，没有 update_id 时自动分配"""
+        if 'update_id' not in update:
+            update = dict(update, update_id=self._next_update_id)
+        self._next_update_id = max(self._next_update_id, update['update_id']) + 1
+        self._updates.append(update)
+        self._new_updates.set()
+        return update['update_id']
+
+    def pending_updates(self):
+        """尚未被确认的更新数"""
+        return len(self._updates)
+
+    def reset_counts(self):
+        """清空调用计数（不影响已发送的消息）"""
+        self.calls.clear()
+        self.call_counts.clear()
+        self.rate_limited.clear()
+        self.copied_messages = 0
+
+    def next_message_id(self):
+        """分配消息 ID"""
+        message_id = self._next_message_id
+        self._next_message_id += 1
+        return message_id
+
+    def make_message(self, chat_id, text, from_user=None, message_id=None, reply_markup=None):
+        """生成 Message 字典"""
+        message = {
+            'message_id': message_id or self.next_message_id(),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'supergroup' if chat_id < 0 else 'private', 'title': str(chat_id)},
+            'from': from_user or BOT_USER,
+            'text': text
+        }
+        if reply_markup:
+            message['reply_markup'] = reply_markup
+        return message
+
+    async def _handle_connection(self, reader, writer):
+        """处理一个 HTTP 连接，支持 keep-alive"""
+        self._writers.add(writer)
+        try:
+            while self._server is not None:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get('content-length', 0))
+                body = await reader.readexactly(length) if length else b''
+
+                parts = request_line.decode('latin-1').split()
+                api_method = parts[1].rsplit('/', 1)[-1] if len(parts) >= 2 else ''
+                status, payload = await self._dispatch(api_method, self._parse_params(headers, body))
+
+                data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                writer.write(
+                    f"HTTP/1.1 {status}\r\n"
+                    "Content-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    "Connection: keep-alive\r\n\r\n".encode('latin-1') + data
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            logger.error("处理模拟 API 请求失败: %s", e)
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    def _parse_params(self, headers, body):
+        """解析请求参数，表单中的值按 JSON 解码"""
+        if not body:
+            return {}
+        if headers.get('content-type', '').startswith('application/json'):
+            return json.loads(body)
+
+        params = {}
+        for key, value in parse_qsl(body.decode('utf-8'), keep_blank_values=True):
+            try:
+                params[key] = json.loads(value)
+            except ValueError:
+                params[key] = value
+        return params
+
+    async def _dispatch(self, api_method, params):
+        """记录调用，注入延迟和限流后返回结果"""
+        self.call_counts[api_method] += 1
+        if self.record_calls and api_method not in UNTHROTTLED_METHODS:
+            self.calls.append((time.monotonic(), api_method, params))
+
+        if api_method not in UNTHROTTLED_METHODS:
+            delay = self.latency + random.uniform(0, self.jitter)
+            if delay:
+                await asyncio.sleep(delay)
+            if self.rate_limit and random.random() < self.rate_limit:
+                self.rate_limited[api_method] += 1
+                return '429 Too Many Requests', {
+                    'ok': False,
+                    'error_code': 429,
+                    'description': f"Too Many Requests: retry after {self.retry_after}",
+                    'parameters': {'retry_after': self.retry_after}
+                }
+
+        handler = getattr(self, f"_api_{api_method}", None)
+        result = await handler(params) if handler else True
+        return '200 OK', {'ok': True, 'result': result}
+
+    async def _api_getMe(self, params):
+        return BOT_USER
+
+    async def _api_getUpdates(self, params):
+        # 丢弃已确认的更新
+        offset = params.get('offset') or 0
+        self._updates = [update for update in self._updates if update['update_id'] >= offset]
+
+        if not self._updates:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), params.get('timeout') or 0)
+            except asyncio.TimeoutError:
+                pass
+        return self._updates[:params.get('limit') or 100]
+
+    async def _api_sendMessage(self, params):
+        message = self.make_message(params['chat_id'], str(params.get('text', '')), reply_markup=params.get('reply_markup'))
+        self.sent_messages.append(message)
+        return message
+
+    async def _api_sendPhoto(self, params):
+        message = self.make_message(params['chat_id'], None, reply_markup=params.get('reply_markup'))
+        del message['text']
+        message['caption'] = str(params.get('caption', ''))
+        message['photo'] = [{
+            'file_id': f"photo-{message['message_id']}",
+            'file_unique_id': f"unique-{message['message_id']}",
+            'width': 500,
+            'height': 750
+        }]
+        self.sent_messages.append(message)
+        return message
+
+    async def _api_copyMessage(self, params):
+        self.copied_messages += 1
+        return {'message_id': self.next_message_id()}
+
+    async def _api_copyMessages(self, params):
+        message_ids = params.get('message_ids') or []
+        self.copied_messages += len(message_ids)
+        return [{'message_id': self.next_message_id()} for _ in message_ids]
+
+    async def _api_editMessageCaption(self, params):
+        message = self.make_message(
+            params.get('chat_id', 0),
+            None,
+            message_id=params.get('message_id'),
+            reply_markup=params.get('reply_markup')
+        )
+        del message['text']
+        message['caption'] = str(params.get('caption', ''))
+        return message
+
+    async def _api_editMessageText(self, params):
+        return self.make_message(
+            params.get('chat_id', 0),
+            str(params.get('text', '')),
+            message_id=params.get('message_id'),
+            reply_markup=params.get('reply_markup')
+        )
+
+    async def _api_getChatMember(self, params):
+        return {
+            'status': 'member',
+            'user': {'id': params.get('user_id', 0), 'is_bot': False, 'first_name': 'user'}
+        }
+
+    async def _api_getMyCommands(self, params):
+        return []
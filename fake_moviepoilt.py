@@ -0,0 +1,130 @@
+import asyncio
+import json
+import logging
+import random
+import time
+from urllib.parse import parse_qsl
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+class FakeMoviePoilt:
+    """本地模拟的 MoviePoilt，只提供登录和添加订阅接口，用于测试订阅客户端
+
+    令牌在 token_ttl 秒后过期（返回 401）；error_rate 为请求返回 503 的概率；
+    max_active 记录同时处理的最大请求数，用于检查并发限制
+    """
+
+    def __init__(self, username='admin', password='password', latency=0.0, token_ttl=None, error_rate=0.0):
+        self.username = username
+        self.password = password
+        self.latency = latency
+        self.token_ttl = token_ttl
+        self.error_rate = error_rate
+        self.tokens = {}
+        self.subscriptions = {}
+        self.logins = 0
+        self.requests = 0
+        self.active = 0
+        self.max_active = 0
+        self._server = None
+        self.port = None
+
+    @property
+    def base_url(self):
+        """供 moviepoilt_url 配置使用的地址"""
+        return f"http://127.0.0.1:{self.port}"
+
+    async def start(self, host='127.0.0.1', port=0):
+        """启动 HTTP 服务，port 为 0 时自动分配"""
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info("模拟 MoviePoilt 已启动: %s", self.base_url)
+
+    async def stop(self):
+        """停止 HTTP 服务"""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def expire_tokens(self):
+        """使已发放的令牌全部失效"""
+        self.tokens.clear()
+
+    async def _handle_connection(self, reader, writer):
+        """处理一个 HTTP 连接，支持 keep-alive"""
+        try:
+            while self._server is not None:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get('content-length', 0))
+                body = await reader.readexactly(length) if length else b''
+
+                parts = request_line.decode('latin-1').split()
+                path = parts[1] if len(parts) >= 2 else '/'
+                self.active += 1
+                self.max_active = max(self.max_active, self.active)
+                try:
+                    status, payload = await self._dispatch(path, headers, body)
+                finally:
+                    self.active -= 1
+
+                data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                writer.write(
+                    f"HTTP/1.1 {status}\r\n"
+                    "Content-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    "Connection: keep-alive\r\n\r\n".encode('latin-1') + data
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            logger.error("处理模拟 MoviePoilt 请求失败: %s", e)
+        finally:
+            writer.close()
+
+    async def _dispatch(self, path, headers, body):
+        """按路径处理登录和订阅请求"""
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.error_rate and random.random() < self.error_rate:
+            return '503 Service Unavailable', {'detail': 'Service Unavailable'}
+
+        if path == '/api/v1/login/access-token':
+            form = dict(parse_qsl(body.decode('utf-8')))
+            if (form.get('username'), form.get('password')) != (self.username, self.password):
+                return '401 Unauthorized', {'detail': '用户名或密码不正确'}
+            self.logins += 1
+            token = f"token-{self.logins}"
+            self.tokens[token] = time.monotonic()
+            return '200 OK', {'access_token': token, 'token_type': 'bearer'}
+
+        if path != '/api/v1/subscribe/':
+            return '404 Not Found', {'detail': 'Not Found'}
+
+        token = headers.get('authorization', '').removeprefix('Bearer ')
+        issued_at = self.tokens.get(token)
+        if issued_at is None or (self.token_ttl is not None and time.monotonic() - issued_at > self.token_ttl):
+            return '401 Unauthorized', {'detail': 'Could not validate credentials'}
+
+        data = json.loads(body or b'{}')
+        key = (data.get('tmdbid'), data.get('type'))
+        if not data.get('tmdbid'):
+            return '200 OK', {'success': False, 'message': '未识别到媒体信息'}
+        if key in self.subscriptions:
+            return '200 OK', {'success': False, 'message': f"{data.get('name')} 已存在"}
+        self.subscriptions[key] = data
+        return '200 OK', {'success': True, 'message': '', 'data': {'id': len(self.subscriptions)}}
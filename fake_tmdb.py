@@ -0,0 +1,99 @@
+import asyncio
+import json
+import logging
+from collections import Counter
+from urllib.parse import urlsplit, parse_qsl
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+class FakeTMDB:
+    """本地模拟的 TMDB API，只提供 /movie/{id} 和 /tv/{id}，用于性能测试
+
+    未通过 add_title 添加的影片按 ID 生成标题和海报路径，missing 中的 ID 返回 404
+    """
+
+    def __init__(self, latency=0.0, missing=()):
+        self.latency = latency
+        self.missing = set(missing)
+        self.titles = {}
+        self.request_counts = Counter()
+        self._server = None
+        self.port = None
+
+    @property
+    def base_url(self):
+        """供 tmdb_base_url 配置使用的地址"""
+        return f"http://127.0.0.1:{self.port}/3"
+
+    async def start(self, host='127.0.0.1', port=0):
+        """启动 HTTP 服务，port 为 0 时自动分配"""
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info("模拟 TMDB 已启动: %s", self.base_url)
+
+    async def stop(self):
+        """停止 HTTP 服务"""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def add_title(self, media_type, tmdb_id, title, date, poster_path=None):
+        """添加一部影片"""
+        self.titles[(media_type, tmdb_id)] = (title, date, poster_path)
+
+    def _details(self, media_type, tmdb_id):
+        """生成影片详情，字段名与 TMDB 一致"""
+        title, date, poster_path = self.titles.get(
+            (media_type, tmdb_id),
+            (f"影片 {tmdb_id}", f"{1990 + tmdb_id % 35}-01-01", f"/poster{tmdb_id}.jpg")
+        )
+        if media_type == 'movie':
+            return {'id': tmdb_id, 'title': title, 'release_date': date, 'poster_path': poster_path}
+        return {'id': tmdb_id, 'name': title, 'first_air_date': date, 'poster_path': poster_path}
+
+    async def _handle_connection(self, reader, writer):
+        """处理一个 HTTP 连接，支持 keep-alive"""
+        try:
+            while self._server is not None:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass
+
+                parts = request_line.decode('latin-1').split()
+                url = urlsplit(parts[1] if len(parts) >= 2 else '/')
+                params = dict(parse_qsl(url.query))
+                status, payload = await self._dispatch(url.path.strip('/').split('/'), params)
+
+                data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                writer.write(
+                    f"HTTP/1.1 {status}\r\n"
+                    "Content-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    "Connection: keep-alive\r\n\r\n".encode('latin-1') + data
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            logger.error("处理模拟 TMDB 请求失败: %s", e)
+        finally:
+            writer.close()
+
+    async def _dispatch(self, path, params):
+        """返回影片详情，路径为 3/{movie|tv}/{id}"""
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if not params.get('api_key'):
+            return '401 Unauthorized', {'status_code': 7, 'status_message': 'Invalid API key'}
+        if len(path) != 3 or path[1] not in ('movie', 'tv') or not path[2].isdigit():
+            return '404 Not Found', {'status_code': 34, 'status_message': 'Not found'}
+
+        media_type, tmdb_id = path[1], int(path[2])
+        self.request_counts[media_type] += 1
+        if tmdb_id in self.missing:
+            return '404 Not Found', {'status_code': 34, 'status_message': 'Not found'}
+        return '200 OK', self._details(media_type, tmdb_id)
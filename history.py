@@ -0,0 +1,133 @@
+import logging
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import ContextTypes
+from database import get_user_feedback_page, get_user_stats, find_user_by_name
+from logsetup import with_log_context
+from metrics import timed, HANDLER_LATENCY
+from config import get_config, FEEDBACK_ICONS, PRIORITY_ICONS
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 每页显示的反馈数
+HISTORY_PAGE_SIZE = 10
+
+# 每条反馈显示的内容长度
+HISTORY_CONTENT_LIMIT = 60
+
+# 状态图标
+STATUS_ICONS = {
+    'pending': '⏳',
+    'resolved': '✅',
+    'rejected': '❌'
+}
+
+def encode_cursor(created_at, feedback_id):
+    """分页位置编码到回调数据中：创建时间只保留数字"""
+    return f"{''.join(ch for ch in created_at if ch.isdigit())}_{feedback_id}"
+
+def decode_cursor(digits, feedback_id):
+    """还原为 (created_at, id)"""
+    created_at = f"{digits[0:4]}-{digits[4:6]}-{digits[6:8]} {digits[8:10]}:{digits[10:12]}:{digits[12:14]}"
+    return created_at, int(feedback_id)
+
+def format_history(stats, rows, first_page):
+    """格式化用户的反馈统计和一页反馈记录"""
+    user_id, username, total, pending, resolved, rejected, first_at, last_at = stats
+    lines = []
+    if first_page:
+        lines.append(f"📜 {username or user_id} 的反馈记录\n")
+        lines.append(
+            f"共 {total} 条：{STATUS_ICONS['pending']} 待处理 {pending}，"
+            f"{STATUS_ICONS['resolved']} 已解决 {resolved}，{STATUS_ICONS['rejected']} 已拒绝 {rejected}"
+        )
+        lines.append(f"首次 {first_at}，最近 {last_at}\n")
+    else:
+        lines.append(f"📜 {username or user_id} 的反馈记录（续）\n")
+
+    for feedback_id, content, feedback_type, priority, status, created_at in rows:
+        content = content or ""
+        if len(content) > HISTORY_CONTENT_LIMIT:
+            content = content[:HISTORY_CONTENT_LIMIT] + "…"
+        lines.append(
+            f"{STATUS_ICONS.get(status, '❔')} #{feedback_id} {FEEDBACK_ICONS.get(feedback_type, '')}"
+            f"{PRIORITY_ICONS.get(priority, '')} {created_at[:16]} {content}"
+        )
+    if not rows:
+        lines.append("暂无反馈记录")
+    return "\n".join(lines)
+
+def history_page(user_id, before=None):
+    """生成一页反馈记录的文字和翻页按钮，用户没有反馈时返回 (None, None)"""
+    stats = get_user_stats(user_id)
+    if not stats or not stats[2]:
+        return None, None
+    rows = get_user_feedback_page(user_id, before, HISTORY_PAGE_SIZE + 1)
+    if rows is None:
+        return None, None
+
+    # 多读一条判断是否还有下一页
+    has_more = len(rows) > HISTORY_PAGE_SIZE
+    rows = rows[:HISTORY_PAGE_SIZE]
+    reply_markup = None
+    if has_more:
+        last = rows[-1]
+        reply_markup = InlineKeyboardMarkup([[InlineKeyboardButton(
+            "下一页 ▶️", callback_data=f"history_{user_id}_{encode_cursor(last[5], last[0])}"
+        )]])
+    return format_history(stats, rows, before is None), reply_markup
+
+@timed(HANDLER_LATENCY)
+@with_log_context
+async def mine_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """查看自己提交过的反馈"""
+    text, reply_markup = history_page(update.effective_user.id)
+    if text is None:
+        await update.message.reply_text("您还没有提交过反馈。")
+        return
+    await update.message.reply_text(text, reply_markup=reply_markup)
+
+@timed(HANDLER_LATENCY)
+@with_log_context
+async def history_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """查看用户的反馈记录，/history @用户名 或 /history 用户ID，也可以回复该用户的消息"""
+    if update.effective_user.id not in get_config().admin_ids:
+        await update.message.reply_text("❌ 抱歉，您没有权限执行此操作。")
+        return
+
+    user_id = None
+    reply = update.message.reply_to_message
+    if context.args:
+        target = context.args[0]
+        if target.lstrip('-').isdigit():
+            user_id = int(target)
+        else:
+            user_id = find_user_by_name(target.lstrip('@'))
+    elif reply and reply.from_user:
+        user_id = reply.from_user.id
+    else:
+        await update.message.reply_text("用法：/history @用户名 或 /history 用户ID，也可以回复该用户的消息")
+        return
+
+    text, reply_markup = history_page(user_id) if user_id is not None else (None, None)
+    if text is None:
+        await update.message.reply_text("未找到该用户的反馈记录。")
+        return
+    await update.message.reply_text(text, reply_markup=reply_markup)
+
+@timed(HANDLER_LATENCY)
+@with_log_context
+async def handle_history_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """反馈记录翻页，只有本人和管理员可以翻页"""
+    query = update.callback_query
+    _, user_id, digits, feedback_id = query.data.split('_')
+    user_id = int(user_id)
+    if query.from_user.id != user_id and query.from_user.id not in get_config().admin_ids:
+        await query.answer("只能查看自己的反馈记录", show_alert=True)
+        return
+
+    await query.answer()
+    text, reply_markup = history_page(user_id, decode_cursor(digits, feedback_id))
+    if text is None:
+        return
+    await query.edit_message_text(text, reply_markup=reply_markup)
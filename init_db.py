@@ -4,27 +4,38 @@ import os
 from datetime import datetime
 
 # 配置日志
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
 logger = logging.getLogger(__name__)
 
 # 数据库文件
 DB_FILE = 'feedback.db'
 
+# 优先级排序值，与 database.py 中的表达式保持一致
+PRIORITY_RANK = '''CASE priority
+                       WHEN '!!!' THEN 0
+                       WHEN '!!' THEN 1
+                       WHEN 'high' THEN 1
+                       WHEN '!' THEN 2
+                       WHEN 'normal' THEN 2
+                       WHEN 'low' THEN 3
+                       ELSE 4
+                   END'''
+
 def init_db():
     """初始化数据库"""
     try:
         # 如果数据库文件已存在，先删除
         if os.path.exists(DB_FILE):
             os.remove(DB_FILE)
-            logger.info(f"已删除旧的数据库文件: {DB_FILE}")
+            logger.info("已删除旧的数据库文件: %s", DB_FILE)
 
         # 创建新的数据库连接
         conn = sqlite3.connect(DB_FILE)
         c = conn.cursor()
 
+        # WAL 模式下读写互不阻塞，机器人和独立的投递进程可以同时访问数据库；
+        # 必须在任何写操作之前执行，否则会处于隐式事务中而无法切换
+        c.execute('PRAGMA journal_mode = WAL')
+
         # 创建反馈表
         c.execute('''CREATE TABLE feedback
                      (id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -39,6 +50,35 @@ def init_db():
                       created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                       updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
 
+        # 创建反馈表索引
+        c.execute('''CREATE INDEX idx_feedback_message_id
+                     ON feedback (message_id)''')
+        c.execute('''CREATE INDEX idx_feedback_status_created_at
+                     ON feedback (status, created_at)''')
+        c.execute(f'''CREATE INDEX idx_feedback_status_priority
+                      ON feedback (status, ({PRIORITY_RANK}), created_at)''')
+
+        # 创建反馈事件表和按小时、天累计的汇总表
+        c.execute('''CREATE TABLE feedback_events
+                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                      feedback_id INTEGER NOT NULL,
+                      event TEXT NOT NULL,
+                      actor_id INTEGER,
+                      actor_name TEXT,
+                      created_at REAL NOT NULL)''')
+        c.execute('''CREATE INDEX idx_feedback_events_feedback_id
+                     ON feedback_events (feedback_id, id)''')
+        c.execute('''CREATE TABLE feedback_rollups
+                     (period TEXT NOT NULL,
+                      period_start INTEGER NOT NULL,
+                      dimension TEXT NOT NULL,
+                      value TEXT NOT NULL,
+                      outcome TEXT NOT NULL,
+                      bucket INTEGER NOT NULL,
+                      count INTEGER DEFAULT 0,
+                      total_seconds REAL DEFAULT 0,
+                      PRIMARY KEY (period, period_start, dimension, value, outcome, bucket))''')
+
         # 创建群组表
         c.execute('''CREATE TABLE groups
                      (id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -47,6 +87,205 @@ def init_db():
                       is_admin_group INTEGER DEFAULT 0,
                       created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
 
+        # 创建置顶看板表
+        c.execute('''CREATE TABLE dashboards
+                     (chat_id INTEGER PRIMARY KEY,
+                      message_id INTEGER,
+                      updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+
+        # 创建定时任务表（如延迟删除消息）
+        c.execute('''CREATE TABLE scheduled_actions
+                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                      action TEXT,
+                      chat_id INTEGER,
+                      message_id INTEGER,
+                      due_at REAL,
+                      created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+        c.execute('''CREATE INDEX idx_scheduled_actions_due_at
+                     ON scheduled_actions (due_at)''')
+
+        # 创建运行状态表（如已注册命令的哈希）
+        c.execute('''CREATE TABLE bot_state
+                     (key TEXT PRIMARY KEY,
+                      value TEXT,
+                      updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+
+        # 创建租约表（保证只有一个实例在轮询）
+        c.execute('''CREATE TABLE leases
+                     (name TEXT PRIMARY KEY,
+                      owner TEXT,
+                      expires_at REAL,
+                      handover_to TEXT,
+                      handover_at REAL)''')
+
+        # 创建投递任务表
+        c.execute('''CREATE TABLE jobs
+                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                      kind TEXT,
+                      payload TEXT,
+                      status TEXT DEFAULT 'queued',
+                      attempts INTEGER DEFAULT 0,
+                      max_attempts INTEGER,
+                      available_at REAL,
+                      owner TEXT,
+                      last_error TEXT,
+                      created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                      updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+        c.execute('''CREATE INDEX idx_jobs_available_at
+                     ON jobs (available_at)''')
+
+        # 创建汇总通知表
+        c.execute('''CREATE TABLE digest_entries
+                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                      chat_id INTEGER NOT NULL,
+                      entry TEXT NOT NULL,
+                      created_at REAL)''')
+        c.execute('''CREATE INDEX idx_digest_entries_chat_id
+                     ON digest_entries (chat_id, id)''')
+
+        # 创建求片订阅、求片用户和 TMDB 元数据缓存表
+        c.execute('''CREATE TABLE subscriptions
+                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                      tmdb_id INTEGER NOT NULL,
+                      media_type TEXT NOT NULL,
+                      status TEXT DEFAULT 'pending',
+                      request_count INTEGER DEFAULT 0,
+                      admin_chat_id INTEGER,
+                      admin_message_id INTEGER,
+                      card_request_count INTEGER DEFAULT 0,
+                      card_is_photo INTEGER DEFAULT 0,
+                      created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                      updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                      UNIQUE (tmdb_id, media_type))''')
+        c.execute('''CREATE INDEX idx_subscriptions_status
+                     ON subscriptions (status)''')
+        c.execute('''CREATE TABLE subscription_requesters
+                     (subscription_id INTEGER NOT NULL,
+                      user_id INTEGER NOT NULL,
+                      username TEXT,
+                      group_id INTEGER,
+                      original_message TEXT,
+                      created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                      PRIMARY KEY (subscription_id, user_id))''')
+        c.execute('''CREATE TABLE tmdb_cache
+                     (tmdb_id INTEGER NOT NULL,
+                      media_type TEXT NOT NULL,
+                      title TEXT,
+                      year TEXT,
+                      poster_path TEXT,
+                      poster_file_id TEXT,
+                      fetched_at REAL,
+                      PRIMARY KEY (tmdb_id, media_type))''')
+        c.execute('''CREATE TABLE attachments
+                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                      feedback_id INTEGER,
+                      chat_id INTEGER NOT NULL,
+                      message_id INTEGER NOT NULL,
+                      media_group_id TEXT,
+                      kind TEXT NOT NULL,
+                      file_id TEXT NOT NULL,
+                      file_unique_id TEXT,
+                      file_name TEXT,
+                      mime_type TEXT,
+                      file_size INTEGER,
+                      width INTEGER,
+                      height INTEGER,
+                      duration INTEGER,
+                      relay_chat_id INTEGER,
+                      relay_message_id INTEGER,
+                      created_at REAL)''')
+        c.execute('''CREATE INDEX idx_attachments_feedback_id
+                     ON attachments (feedback_id, message_id)''')
+        c.execute('''CREATE INDEX idx_attachments_media_group_id
+                     ON attachments (media_group_id) WHERE media_group_id IS NOT NULL''')
+
+        # 创建反馈管理消息表
+        c.execute('''CREATE TABLE feedback_admin_messages
+                     (feedback_id INTEGER PRIMARY KEY,
+                      chat_id INTEGER NOT NULL,
+                      message_id INTEGER NOT NULL)''')
+
+        c.execute('''CREATE TABLE feedback_predictions
+                     (feedback_id INTEGER PRIMARY KEY,
+                      feedback_type TEXT NOT NULL,
+                      confidence REAL,
+                      model TEXT,
+                      created_at REAL)''')
+
+        # 按用户分页读取反馈的索引和用户反馈统计表
+        c.execute('''CREATE INDEX idx_feedback_user_id_created_at
+                     ON feedback (user_id, created_at)''')
+        c.execute('''CREATE TABLE user_stats
+                     (user_id INTEGER PRIMARY KEY,
+                      username TEXT,
+                      total INTEGER DEFAULT 0,
+                      pending INTEGER DEFAULT 0,
+                      resolved INTEGER DEFAULT 0,
+                      rejected INTEGER DEFAULT 0,
+                      first_at TIMESTAMP,
+                      last_at TIMESTAMP)''')
+        c.execute('''CREATE INDEX idx_user_stats_username
+                     ON user_stats (username COLLATE NOCASE)''')
+
+        # 用户反馈统计随反馈的新增、状态变更和删除同步更新
+        c.execute('''CREATE TRIGGER user_stats_insert
+                     AFTER INSERT ON feedback
+                     BEGIN
+                         INSERT INTO user_stats
+                         (user_id, username, total, pending, resolved, rejected, first_at, last_at)
+                         VALUES (NEW.user_id, NEW.username, 1, NEW.status = 'pending',
+                                 NEW.status = 'resolved', NEW.status = 'rejected', NEW.created_at, NEW.created_at)
+                         ON CONFLICT (user_id) DO UPDATE SET
+                             username = excluded.username,
+                             total = total + 1,
+                             pending = pending + excluded.pending,
+                             resolved = resolved + excluded.resolved,
+                             rejected = rejected + excluded.rejected,
+                             last_at = excluded.last_at;
+                     END;''')
+        c.execute('''CREATE TRIGGER user_stats_status
+                     AFTER UPDATE OF status ON feedback
+                     WHEN OLD.status IS NOT NEW.status
+                     BEGIN
+                         UPDATE user_stats SET
+                             pending = pending + (NEW.status = 'pending') - (OLD.status = 'pending'),
+                             resolved = resolved + (NEW.status = 'resolved') - (OLD.status = 'resolved'),
+                             rejected = rejected + (NEW.status = 'rejected') - (OLD.status = 'rejected')
+                         WHERE user_id = NEW.user_id;
+                     END;''')
+        c.execute('''CREATE TRIGGER user_stats_delete
+                     AFTER DELETE ON feedback
+                     BEGIN
+                         UPDATE user_stats SET
+                             total = total - 1,
+                             pending = pending - (OLD.status = 'pending'),
+                             resolved = resolved - (OLD.status = 'resolved'),
+                             rejected = rejected - (OLD.status = 'rejected')
+                         WHERE user_id = OLD.user_id;
+                     END;''')
+
+        # 反馈内容的全文索引（三元组分词）及同步触发器
+        c.execute('''CREATE VIRTUAL TABLE feedback_search
+                     USING fts5(content, content = 'feedback', content_rowid = 'id', tokenize = 'trigram')''')
+        c.execute('''CREATE TRIGGER feedback_search_insert
+                     AFTER INSERT ON feedback
+                     BEGIN
+                         INSERT INTO feedback_search (rowid, content) VALUES (NEW.id, NEW.content);
+                     END;''')
+        c.execute('''CREATE TRIGGER feedback_search_delete
+                     AFTER DELETE ON feedback
+                     BEGIN
+                         INSERT INTO feedback_search (feedback_search, rowid, content)
+                         VALUES ('delete', OLD.id, OLD.content);
+                     END;''')
+        c.execute('''CREATE TRIGGER feedback_search_update
+                     AFTER UPDATE OF content ON feedback
+                     BEGIN
+                         INSERT INTO feedback_search (feedback_search, rowid, content)
+                         VALUES ('delete', OLD.id, OLD.content);
+                         INSERT INTO feedback_search (rowid, content) VALUES (NEW.id, NEW.content);
+                     END;''')
+
         # 创建触发器，自动更新 updated_at
         c.execute('''CREATE TRIGGER update_feedback_timestamp
                      AFTER UPDATE ON feedback
@@ -57,12 +296,16 @@ def init_db():
 
         conn.commit()
         conn.close()
-        logger.info(f"数据库初始化成功: {DB_FILE}")
+        logger.info("数据库初始化成功: %s", DB_FILE)
         return True
 
     except Exception as e:
-        logger.error(f"数据库初始化失败: {str(e)}")
+        logger.error("数据库初始化失败: %s", str(e))
         return False
 
 if __name__ == '__main__':
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
     init_db() 
\ No newline at end of file
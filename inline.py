@@ -0,0 +1,206 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from telegram import Update, InlineQueryResultArticle, InputTextMessageContent
+from telegram.ext import ContextTypes
+from database import (
+    get_feedback_by_id, find_users_by_prefix, get_users_feedback_page, search_feedback_content,
+    FEEDBACK_STATUS, SEARCH_MIN_LENGTH
+)
+from history import STATUS_ICONS
+from logsetup import with_log_context
+from metrics import timed, HANDLER_LATENCY, INLINE_QUERIES
+from utils import MAX_MESSAGE_LENGTH
+from config import get_config, FEEDBACK_TYPES, PRIORITY_ICONS, PRIORITY_LEVELS
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 每页结果数（Telegram 上限 50）
+INLINE_PAGE_SIZE = 20
+
+# 本地缓存的结果页数
+INLINE_CACHE_SIZE = 512
+
+# 结果在本地缓存的时间（秒），反馈状态变化后最多这么久才反映在搜索结果中
+INLINE_CACHE_TTL = 30
+
+# Telegram 服务器缓存结果的时间（秒）
+INLINE_CACHE_TIME = 10
+
+# 同一用户连续输入时，停止输入这么久（秒）后才查询数据库
+INLINE_DEBOUNCE = 0.35
+
+# 按用户名前缀查找时最多匹配的用户数
+INLINE_USER_LIMIT = 5
+
+# 少于 SEARCH_MIN_LENGTH 个字符的内容查询只匹配最近的这么多条反馈
+INLINE_SHORT_WINDOW = 5000
+
+# 结果列表中反馈内容的显示长度
+INLINE_CONTENT_LIMIT = 100
+
+def parse_query(text):
+    """解析查询：#123 或 123 按反馈 ID，@name 按用户名前缀，其余按内容查找，返回 (方式, 查询词)"""
+    text = text.strip()
+    if text.lstrip('#').isdigit():
+        return 'id', int(text.lstrip('#'))
+    if text.startswith('@'):
+        return 'user', text[1:].strip().casefold()
+    return 'text', text.casefold()
+
+def matches(mode, term, row):
+    """缓存中的结果是否满足更长的查询词"""
+    if mode == 'user':
+        return (row[2] or '').casefold().startswith(term)
+    return term in (row[3] or '').casefold()
+
+def feedback_result(row):
+    """一条反馈的内联结果，选中后发送反馈摘要"""
+    feedback_id, user_id, username, content, feedback_type, priority, status, created_at = row
+    content = content or ""
+    snippet = content if len(content) <= INLINE_CONTENT_LIMIT else content[:INLINE_CONTENT_LIMIT] + "…"
+    text = (
+        f"📋 反馈 #{feedback_id}\n"
+        f"👤 {username or user_id}（ID: {user_id}）\n"
+        f"📌 类型：{FEEDBACK_TYPES.get(feedback_type, feedback_type)}\n"
+        f"🔢 优先级：{PRIORITY_ICONS.get(priority, '')} {PRIORITY_LEVELS.get(priority, priority)}\n"
+        f"{STATUS_ICONS.get(status, '❔')} 状态：{FEEDBACK_STATUS.get(status, status)}\n"
+        f"🕒 {created_at}\n\n"
+        f"📝 {content}"
+    )
+    return InlineQueryResultArticle(
+        id=str(feedback_id),
+        title=f"{STATUS_ICONS.get(status, '❔')} #{feedback_id} {FEEDBACK_TYPES.get(feedback_type, feedback_type)} "
+              f"{PRIORITY_ICONS.get(priority, '')}",
+        description=f"{username or user_id} · {(created_at or '')[:16]}\n{snippet}",
+        input_message_content=InputTextMessageContent(text[:MAX_MESSAGE_LENGTH])
+    )
+
+class InlineSearch:
+    """内联查询的结果缓存和按用户防抖
+
+    缓存按 (方式, 查询词, 翻页位置) 保存结果页，按最近使用排序，超出容量时淘汰最久未用的条目。
+    没有下一页的结果是完整的，继续输入（查询词以其为前缀）时直接在缓存结果中过滤，不再查询数据库。
+    每个用户只有最后一次输入在防抖等待后查询数据库，输入过程中的中间查询直接丢弃。
+    """
+
+    def __init__(self, size=INLINE_CACHE_SIZE, ttl=INLINE_CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self._cache = OrderedDict()
+        self._latest = {}
+        self._sequence = 0
+
+    def __len__(self):
+        """缓存的结果页数"""
+        return len(self._cache)
+
+    def get(self, mode, term, offset):
+        """缓存中的结果页 (结果, 下一页位置)，没有时返回 None"""
+        now = time.monotonic()
+        entry = self._cache.get((mode, term, offset))
+        if entry is not None:
+            if entry[0] > now:
+                self._cache.move_to_end((mode, term, offset))
+                INLINE_QUERIES.labels('hit').inc()
+                return entry[1], entry[2]
+            del self._cache[(mode, term, offset)]
+        if offset or mode == 'id':
+            return None
+
+        # 从最长的前缀开始查找完整的结果；短查询只匹配最近的反馈，不能用于过滤更长的查询
+        shortest = SEARCH_MIN_LENGTH if mode == 'text' else 0
+        for length in range(len(term) - 1, shortest - 1, -1):
+            entry = self._cache.get((mode, term[:length], ''))
+            if entry is None or entry[0] <= now or not entry[3]:
+                continue
+            rows = [row for row in entry[1] if matches(mode, term, row)]
+            self.put(mode, term, offset, rows, None, True)
+            INLINE_QUERIES.labels('refined').inc()
+            return rows, None
+        return None
+
+    def put(self, mode, term, offset, rows, next_offset, complete):
+        """保存一页结果，complete 表示该查询的全部结果都在这一页中"""
+        self._cache[(mode, term, offset)] = (time.monotonic() + self.ttl, rows, next_offset, complete)
+        self._cache.move_to_end((mode, term, offset))
+        while len(self._cache) > self.size:
+            self._cache.popitem(last=False)
+
+    def fetch(self, mode, term, offset):
+        """查询数据库并缓存结果页，查询失败时返回 None"""
+        before = int(offset) if offset.isdigit() else None
+        complete = True
+        if mode == 'id':
+            feedback = get_feedback_by_id(term)
+            rows = [feedback] if feedback else []
+        elif mode == 'user':
+            user_ids = find_users_by_prefix(term, INLINE_USER_LIMIT)
+            rows = get_users_feedback_page(user_ids, before, INLINE_PAGE_SIZE + 1) if user_ids else user_ids
+            # 匹配的用户数达到上限时，更长的用户名前缀可能匹配到其他用户
+            complete = user_ids is not None and len(user_ids) < INLINE_USER_LIMIT
+        else:
+            rows = search_feedback_content(term, before, INLINE_PAGE_SIZE + 1, INLINE_SHORT_WINDOW)
+        if rows is None:
+            return None
+        INLINE_QUERIES.labels('miss').inc()
+
+        # 多读一条判断是否还有下一页，下一页从本页最后一条的 ID 继续
+        next_offset = None
+        if len(rows) > INLINE_PAGE_SIZE:
+            rows = rows[:INLINE_PAGE_SIZE]
+            next_offset = str(rows[-1][0])
+        self.put(mode, term, offset, rows, next_offset, complete and next_offset is None and not offset)
+        return rows, next_offset
+
+    def begin(self, user_id):
+        """记录用户的最新一次查询"""
+        self._sequence += 1
+        self._latest[user_id] = self._sequence
+        return self._sequence
+
+    def finish(self, user_id, sequence):
+        """防抖等待结束：是否仍是该用户的最新查询"""
+        if self._latest.get(user_id) != sequence:
+            return False
+        del self._latest[user_id]
+        return True
+
+    def clear(self):
+        """清空缓存（如清除数据库后）"""
+        self._cache.clear()
+
+@timed(HANDLER_LATENCY)
+@with_log_context
+async def handle_inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """内联模式查找反馈：@机器人 加反馈 ID、@用户名 或内容，仅管理员可用"""
+    query = update.inline_query
+    if query.from_user.id not in get_config().admin_ids:
+        INLINE_QUERIES.labels('denied').inc()
+        await query.answer([], cache_time=INLINE_CACHE_TIME, is_personal=True)
+        return
+
+    search = context.bot_data['inline_search']
+    mode, term = parse_query(query.query)
+    page = search.get(mode, term, query.offset)
+    if page is None:
+        # 翻页不需要防抖；新的输入等待片刻，期间又有新输入时放弃本次查询，不作应答
+        if not query.offset:
+            sequence = search.begin(query.from_user.id)
+            await asyncio.sleep(INLINE_DEBOUNCE)
+            if not search.finish(query.from_user.id, sequence):
+                INLINE_QUERIES.labels('debounced').inc()
+                return
+        page = search.fetch(mode, term, query.offset)
+        if page is None:
+            return
+
+    rows, next_offset = page
+    await query.answer(
+        [feedback_result(row) for row in rows],
+        cache_time=INLINE_CACHE_TIME,
+        is_personal=True,
+        next_offset=next_offset or ''
+    )
@@ -0,0 +1,184 @@
+import asyncio
+import logging
+import os
+import random
+import socket
+import time
+from telegram.error import RetryAfter, BadRequest, Forbidden
+from database import enqueue_jobs, claim_jobs, complete_job, retry_job, dead_letter_job
+from metrics import JOB_EVENTS, JOB_LATENCY
+from journal import current_update_id
+from config import get_config
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 任务类型 -> (处理函数, 进入死信时的回调)
+JOB_HANDLERS = {}
+
+# 重试间隔上限（秒）
+MAX_RETRY_DELAY = 300
+
+# 停止时等待到期任务执行完的最长时间（秒）
+JOB_DRAIN_TIMEOUT = 10
+
+class PermanentJobError(Exception):
+    """重试也不会成功的错误，任务直接进入死信"""
+
+def job_handler(kind, on_dead=None):
+    """注册任务处理函数 handler(pool, payload)，on_dead(pool, payload, error) 在任务进入死信时调用"""
+    def decorator(func):
+        JOB_HANDLERS[kind] = (func, on_dead)
+        return func
+    return decorator
+
+def with_update_id(jobs):
+    """在任务参数中记下当前处理的更新 ID，执行时恢复，使录制日志中的 API 调用归属到触发它的更新"""
+    update_id = current_update_id.get()
+    if update_id is None:
+        return jobs
+    return [(kind, dict(payload, update_id=update_id)) for kind, payload in jobs]
+
+def submit_jobs(bot_data, jobs, delay=0):
+    """添加投递任务（(类型, 参数) 列表），本进程有投递线程时立即唤醒"""
+    job_ids = enqueue_jobs(with_update_id(jobs), get_config().job_max_attempts, delay)
+    pool = bot_data.get('job_pool')
+    if job_ids and pool is not None:
+        pool.wake()
+    return job_ids
+
+def retry_delay(attempts, base):
+    """指数退避加随机抖动，避免多个失败任务同时重试"""
+    delay = min(MAX_RETRY_DELAY, base * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1.5)
+
+class JobWorkerPool:
+    """从 jobs 表领取任务并发执行
+
+    同一数据库可以由多个进程同时领取：领取时用 UPDATE ... RETURNING 写入租约，
+    进程异常退出后任务在可见性超时后重新出现。任务至少执行一次，处理函数应尽量幂等。
+    """
+
+    def __init__(self, bot, services, settings):
+        self.bot = bot
+        self.services = services
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._running = set()
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task = None
+        self.configure(settings)
+
+    def __len__(self):
+        """正在执行的任务数"""
+        return len(self._running)
+
+    def configure(self, settings):
+        """读取并发数、可见性超时等配置，修改后在下次领取时生效"""
+        self.concurrency = settings.job_workers
+        self.visibility_timeout = settings.job_visibility_timeout
+        self.retry_base = settings.job_retry_base
+        self.poll_interval = settings.job_poll_interval
+        self.wake()
+
+    def start(self):
+        """启动领取任务的循环"""
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+            logger.info("投递任务线程已启动: %s，并发 %s", self.owner, self.concurrency)
+
+    async def stop(self, timeout=JOB_DRAIN_TIMEOUT):
+        """停止领取新任务，先执行完已到期的任务，超时后取消，未完成的任务在可见性超时后由其他进程接管"""
+        if self._task is None:
+            return
+        self._stopping = True
+        self.wake()
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("等待投递任务超时，%s 个任务未完成", len(self._running))
+            self._task.cancel()
+            for task in list(self._running):
+                task.cancel()
+            await asyncio.gather(self._task, *self._running, return_exceptions=True)
+        self._task = None
+
+    def wake(self):
+        """有新任务或空闲线程时唤醒领取循环"""
+        self._wakeup.set()
+
+    def submit(self, jobs, delay=0):
+        """在任务处理函数中添加后续任务"""
+        job_ids = enqueue_jobs(with_update_id(jobs), get_config().job_max_attempts, delay)
+        if job_ids:
+            self.wake()
+        return job_ids
+
+    async def _run(self):
+        """有空闲线程时领取到期任务，没有任务时等待唤醒或定期检查其他进程添加的任务"""
+        while True:
+            self._wakeup.clear()
+            free = self.concurrency - len(self._running)
+            jobs = claim_jobs(self.owner, free, self.visibility_timeout) if free > 0 else []
+            for job in jobs:
+                task = asyncio.create_task(self._execute(*job))
+                self._running.add(task)
+                task.add_done_callback(self._on_done)
+
+            if self._stopping and not jobs and not self._running:
+                return
+            if jobs and len(jobs) == free:
+                # 线程已满，等任务完成时唤醒
+                await self._wakeup.wait()
+            elif not jobs:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    def _on_done(self, task):
+        """任务结束后释放线程"""
+        self._running.discard(task)
+        self.wake()
+
+    async def _execute(self, job_id, kind, payload, attempts, max_attempts):
+        """执行单个任务，按结果删除、重试或移入死信"""
+        handler, on_dead = JOB_HANDLERS.get(kind, (None, None))
+        # 每个任务在各自的协程中执行，设置的更新 ID 只对本任务及其添加的后续任务有效
+        current_update_id.set(payload.get('update_id'))
+        start = time.perf_counter()
+        count_attempt = True
+        try:
+            if handler is None:
+                raise PermanentJobError(f"未知的任务类型: {kind}")
+            if attempts > max_attempts:
+                raise PermanentJobError("执行中的进程多次超时未完成")
+            await handler(self, payload)
+        except RetryAfter as e:
+            # 被限流不算失败，按服务端要求的时间重试
+            error, delay, permanent, count_attempt = str(e), e.retry_after, False, False
+        except (BadRequest, Forbidden, PermanentJobError) as e:
+            error, delay, permanent = str(e), None, True
+        except Exception as e:
+            error, delay, permanent = str(e), retry_delay(attempts, self.retry_base), False
+        else:
+            JOB_LATENCY.labels(kind).observe(time.perf_counter() - start)
+            JOB_EVENTS.labels(kind, 'done').inc()
+            if not complete_job(job_id, self.owner, attempts):
+                logger.warning("任务 %s 已完成，但租约已过期并被重新领取", job_id)
+            return
+
+        JOB_LATENCY.labels(kind).observe(time.perf_counter() - start)
+        if permanent or (count_attempt and attempts >= max_attempts):
+            logger.error("任务 %s (%s) 第 %s 次执行失败，移入死信: %s", job_id, kind, attempts, error)
+            JOB_EVENTS.labels(kind, 'dead').inc()
+            if dead_letter_job(job_id, self.owner, attempts, error) and on_dead is not None:
+                try:
+                    await on_dead(self, payload, error)
+                except Exception as e:
+                    logger.error("任务 %s 的死信回调失败: %s", job_id, e)
+        else:
+            logger.warning("任务 %s (%s) 第 %s 次执行失败，%.1f 秒后重试: %s", job_id, kind, attempts, delay, error)
+            JOB_EVENTS.labels(kind, 'retry').inc()
+            retry_job(job_id, self.owner, attempts, delay, error, count_attempt)
@@ -0,0 +1,129 @@
+import contextvars
+import gzip
+import json
+import logging
+import time
+from datetime import datetime
+from telegram import Update
+from metrics import InstrumentedRequest
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 日志格式版本
+JOURNAL_VERSION = 1
+
+# 记录到日志头部的配置项，回放时使用相同的设置
+RECORDED_SETTINGS = (
+    'pin_mode', 'digest_window', 'dashboard_debounce', 'dashboard_min_interval', 'delete_delay',
+    'throttle_user_per_minute', 'throttle_user_burst', 'throttle_chat_per_minute',
+    'throttle_chat_burst', 'throttle_notice_window', 'feedback_tag'
+)
+
+# 当前正在处理的更新 ID，处理期间创建的后台任务会继承该值
+current_update_id = contextvars.ContextVar('current_update_id', default=None)
+
+class Journal:
+    """gzip 压缩的 JSONL 日志，记录收到的更新和发出的 API 调用
+
+    每次启动追加一个 header 记录，之后记录的 t 为相对本次启动的秒数
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.start = time.monotonic()
+        self._file = gzip.open(path, 'at', encoding='utf-8')
+
+    def elapsed(self, moment=None):
+        """距本次启动的秒数"""
+        return round((moment if moment is not None else time.monotonic()) - self.start, 6)
+
+    def write(self, record):
+        """写入一条记录，失败时只记录错误"""
+        if self._file is None:
+            return
+        try:
+            self._file.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+        except Exception as e:
+            logger.error("写入回放日志失败: %s", e)
+
+    def write_header(self, settings, admin_groups, user_groups):
+        """写入本次启动的配置、全部管理群组和路由规则，回放时按同样的方式分配反馈"""
+        self.write({
+            'type': 'header',
+            'version': JOURNAL_VERSION,
+            'started_at': datetime.now().isoformat(timespec='seconds'),
+            'settings': {key: getattr(settings, key) for key in RECORDED_SETTINGS},
+            'admin_group': admin_groups[0][0] if admin_groups else None,
+            'admin_groups': [group[0] for group in admin_groups],
+            'admin_routes': settings.get('admin_routes', []),
+            'user_groups': [group[0] for group in user_groups]
+        })
+
+    def close(self):
+        """关闭文件，写入 gzip 结尾"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+def read_journal(path):
+    """逐条读取日志记录，文件末尾不完整（如进程异常退出）时停止"""
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    logger.warning("回放日志中有不完整的记录，停止读取: %s", path)
+                    return
+    except EOFError:
+        logger.warning("回放日志未正常结束，已读取到文件末尾: %s", path)
+
+class RecordingRequest(InstrumentedRequest):
+    """在指标之外，将每次 Bot API 调用（getUpdates 除外）写入回放日志"""
+
+    def __init__(self, journal, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.journal = journal
+
+    async def do_request(self, url, method, request_data=None, *args, **kwargs):
+        api_method = url.rsplit('/', 1)[-1]
+        if api_method == 'getUpdates':
+            return await super().do_request(url, method, request_data, *args, **kwargs)
+
+        start = time.monotonic()
+        code = None
+        try:
+            code, payload = await super().do_request(url, method, request_data, *args, **kwargs)
+            return code, payload
+        finally:
+            self.journal.write({
+                'type': 'call',
+                't': self.journal.elapsed(start),
+                'update_id': current_update_id.get(),
+                'method': api_method,
+                'params': request_data.parameters if request_data else {},
+                'duration': round(time.monotonic() - start, 6),
+                'ok': code == 200
+            })
+
+def install_recorder(application, journal):
+    """包装 process_update，记录每个更新及其处理耗时"""
+    process_update = application.process_update
+
+    async def recording_process_update(update):
+        token = current_update_id.set(getattr(update, 'update_id', None))
+        start = time.monotonic()
+        try:
+            await process_update(update)
+        finally:
+            current_update_id.reset(token)
+            if isinstance(update, Update):
+                journal.write({
+                    'type': 'update',
+                    't': journal.elapsed(start),
+                    'duration': round(time.monotonic() - start, 6),
+                    'update': update.to_dict()
+                })
+
+    application.process_update = recording_process_update
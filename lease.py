@@ -0,0 +1,95 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+from database import acquire_lease, renew_lease, request_lease_handover, withdraw_lease_handover, release_lease
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 轮询租约名称
+LEASE_NAME = 'poller'
+
+# 租约有效期（秒），持有者异常退出后最多等待这么久
+LEASE_TTL = 15
+
+# 续约及检查接管请求的间隔（秒）
+LEASE_RENEW_INTERVAL = 1
+
+# 等待获取租约时的重试间隔（秒）
+LEASE_RETRY_INTERVAL = 0.5
+
+class PollerLease:
+    """基于数据库的租约，保证同一时间只有一个实例调用 getUpdates"""
+
+    def __init__(self, name=LEASE_NAME, ttl=LEASE_TTL):
+        self.name = name
+        self.ttl = ttl
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.expires_at = 0
+
+    async def acquire(self, stop_event):
+        """获取租约；已被占用时请求接管并等待旧实例释放，放弃等待时撤回请求"""
+        requested = None
+        started = time.monotonic()
+        try:
+            while not stop_event.is_set():
+                deadline = time.time() + self.ttl
+                if acquire_lease(self.name, self.owner, self.ttl):
+                    self.expires_at = deadline
+                    logger.info("已获取轮询租约: %s，等待 %.2f 秒", self.owner, time.monotonic() - started)
+                    requested = None
+                    return True
+                # 请求超过一个有效期未刷新即失效，等待期间定期刷新
+                if requested is None or time.monotonic() - requested > self.ttl / 3:
+                    if requested is None:
+                        logger.info("轮询租约已被占用，已请求旧实例交接")
+                    request_lease_handover(self.name, self.owner)
+                    requested = time.monotonic()
+                try:
+                    await asyncio.wait_for(stop_event.wait(), LEASE_RETRY_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+            return False
+        finally:
+            # 收到停止信号或异常退出：撤回请求，旧实例继续轮询
+            if requested is not None:
+                withdraw_lease_handover(self.name, self.owner)
+                logger.info("已撤回轮询租约交接请求")
+
+    async def hold(self, stop_event):
+        """持续续约，直到收到停止信号、被请求交接或失去租约，返回原因
+
+        续约出错（如 WAL 争用时数据库短暂被锁）不等于失去租约：在上次续约的有效期内继续重试，
+        过期后其他实例已可以接管，才停止轮询。
+        """
+        while True:
+            try:
+                await asyncio.wait_for(stop_event.wait(), LEASE_RENEW_INTERVAL)
+                return 'stop'
+            except asyncio.TimeoutError:
+                pass
+
+            deadline = time.time() + self.ttl
+            result = renew_lease(self.name, self.owner, self.ttl)
+            if result is None:
+                if time.time() < self.expires_at:
+                    logger.warning("续约失败，%.1f 秒内继续重试", self.expires_at - time.time())
+                    continue
+                logger.error("续约持续失败，轮询租约已过期，停止轮询")
+                return 'lost'
+            renewed, handover_to = result
+            if renewed:
+                self.expires_at = deadline
+            else:
+                logger.error("轮询租约已失效，停止轮询")
+                return 'lost'
+            if handover_to and handover_to != self.owner:
+                logger.info("收到交接请求: %s", handover_to)
+                return 'handover'
+
+    def release(self):
+        """释放租约，等待中的新实例随即接管"""
+        release_lease(self.name, self.owner)
+        logger.info("已释放轮询租约")
@@ -0,0 +1,151 @@
+import atexit
+import contextvars
+import functools
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import sys
+from datetime import datetime
+
+# 文本日志格式
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# 附加到每条日志的上下文字段
+CONTEXT_FIELDS = ('chat_id', 'feedback_id', 'handler')
+
+# 当前上下文字段，处理更新期间创建的后台任务会继承
+_log_context = contextvars.ContextVar('log_context', default={})
+
+# 后台写日志的监听器
+_listener = None
+
+def bind_log_context(**fields):
+    """为当前上下文（及之后创建的任务）的日志附加字段"""
+    _log_context.set({**_log_context.get(), **fields})
+
+def with_log_context(func):
+    """处理器装饰器：处理期间的日志附加处理器名称和会话 ID"""
+    @functools.wraps(func)
+    async def wrapper(update, context, *args, **kwargs):
+        chat = getattr(update, 'effective_chat', None)
+        token = _log_context.set({
+            'handler': func.__name__,
+            'chat_id': chat.id if chat else None
+        })
+        try:
+            return await func(update, context, *args, **kwargs)
+        finally:
+            _log_context.reset(token)
+    return wrapper
+
+class ContextFilter(logging.Filter):
+    """将上下文字段写入日志记录，未设置的字段为 None"""
+
+    def filter(self, record):
+        fields = _log_context.get()
+        for name in CONTEXT_FIELDS:
+            if not hasattr(record, name):
+                setattr(record, name, fields.get(name))
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出一行 JSON"""
+
+    def format(self, record):
+        data = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        for name in CONTEXT_FIELDS:
+            value = getattr(record, name, None)
+            if value is not None:
+                data[name] = value
+        if record.exc_info:
+            data['exception'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+def _gzip_namer(name):
+    """轮转后的文件名加 .gz 后缀"""
+    return name + '.gz'
+
+def _gzip_rotator(source, dest):
+    """压缩轮转出的日志文件"""
+    with open(source, 'rb') as f_in, gzip.open(dest, 'wb') as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+def _file_handler(settings):
+    """按大小或时间轮转并压缩的文件处理器"""
+    if settings.log_rotate_when:
+        handler = logging.handlers.TimedRotatingFileHandler(
+            settings.log_file,
+            when=settings.log_rotate_when,
+            backupCount=settings.log_backup_count,
+            encoding='utf-8'
+        )
+    else:
+        handler = logging.handlers.RotatingFileHandler(
+            settings.log_file,
+            maxBytes=settings.log_max_bytes,
+            backupCount=settings.log_backup_count,
+            encoding='utf-8'
+        )
+    handler.namer = _gzip_namer
+    handler.rotator = _gzip_rotator
+    return handler
+
+def setup_logging(settings):
+    """配置日志：调用方只把记录放入队列，格式化和写文件在后台线程完成"""
+    global _listener
+    stop_logging()
+
+    formatter = JsonFormatter() if settings.log_format == 'json' else logging.Formatter(LOG_FORMAT)
+    handlers = []
+    if settings.log_file:
+        handlers.append(_file_handler(settings))
+    # 未配置日志文件或在终端中运行时同时输出到控制台
+    if not settings.log_file or sys.stderr.isatty():
+        handlers.append(logging.StreamHandler())
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    set_log_level(settings.log_level)
+
+    # httpx 每个请求都会输出 INFO 日志
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+def set_log_level(level):
+    """修改根日志级别，无效的级别名称忽略"""
+    try:
+        logging.getLogger().setLevel(level.upper())
+    except (AttributeError, ValueError) as e:
+        logging.getLogger(__name__).error("无效的日志级别 %s: %s", level, e)
+
+def stop_logging():
+    """写完队列中剩余的日志并停止后台线程"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+atexit.register(stop_logging)
@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from metrics import LOOP_LAG, LOOP_BLOCKS
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 心跳及检查间隔（秒）
+CHECK_INTERVAL = 0.05
+
+# 默认阻塞阈值（秒）
+BLOCK_THRESHOLD = 0.1
+
+# 每次采样保留的栈帧数
+STACK_DEPTH = 8
+
+# 最多统计的不同调用栈数
+MAX_STACKS = 100
+
+class LoopWatchdog:
+    """事件循环阻塞检测：协程心跳测量延迟，后台线程在心跳停滞时采样事件循环线程的调用栈"""
+
+    def __init__(self, threshold=BLOCK_THRESHOLD, interval=CHECK_INTERVAL):
+        self.threshold = threshold
+        self.interval = interval
+        self.blocks = 0
+        self.max_lag = 0.0
+        self.stacks = Counter()
+        self._beat = time.monotonic()
+        self._loop_thread_id = None
+        self._task = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        """在当前事件循环中启动检测"""
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name='loop-watchdog', daemon=True)
+        self._thread.start()
+        logger.info("事件循环阻塞检测已启动，阈值 %s 秒", self.threshold)
+
+    def stop(self):
+        """停止检测"""
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _heartbeat(self):
+        """定期醒来，记录实际延迟"""
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._beat = now
+            lag = max(now - start - self.interval, 0)
+            LOOP_LAG.labels().observe(lag)
+            if lag > self.max_lag:
+                self.max_lag = lag
+
+    def _watch(self):
+        """后台线程：心跳停滞超过阈值时采样一次调用栈"""
+        sampled = False
+        while not self._stop.wait(self.interval):
+            stalled = time.monotonic() - self._beat
+            if stalled < self.threshold + self.interval:
+                sampled = False
+                continue
+            # 同一次阻塞只采样一次
+            if sampled:
+                continue
+            sampled = True
+
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = tuple(
+                f"{os.path.basename(item.filename)}:{item.lineno} {item.name}"
+                for item in traceback.extract_stack(frame)[-STACK_DEPTH:]
+            )
+            del frame
+
+            self.blocks += 1
+            if stack in self.stacks or len(self.stacks) < MAX_STACKS:
+                self.stacks[stack] += 1
+            LOOP_BLOCKS.labels().inc()
+            logger.warning("事件循环阻塞超过 %.3f 秒，调用栈:\n%s", stalled, "\n".join(stack))
+
+    def report(self, top=5):
+        """生成阻塞情况报告"""
+        lines = [
+            "🩺 事件循环阻塞检测\n",
+            f"阈值: {self.threshold * 1000:.0f} ms",
+            f"最大延迟: {self.max_lag * 1000:.1f} ms",
+            f"阻塞次数: {self.blocks}"
+        ]
+        for stack, count in self.stacks.most_common(top):
+            lines.append(f"\n[{count} 次]")
+            # 只展示最内层的几帧
+            lines.extend(stack[-3:])
+        return "\n".join(lines)
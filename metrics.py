@@ -0,0 +1,281 @@
+import abc
+import asyncio
+import bisect
+import functools
+import logging
+import time
+from telegram.request import HTTPXRequest
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 默认的耗时分桶（秒）
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+def _format_labels(labelnames, values, extra=None):
+    """生成 Prometheus 标签文本"""
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    body = ",".join(f'{name}="{_escape(value)}"' for name, value in pairs)
+    return "{" + body + "}"
+
+def _escape(value):
+    """转义标签值中的反斜杠、引号和换行"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class Metric(abc.ABC):
+    """指标基类，按标签值缓存子指标"""
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def labels(self, *values, **labels):
+        """获取指定标签值的子指标"""
+        if labels:
+            values = tuple(labels[name] for name in self.labelnames)
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new_child()
+        return child
+
+    @abc.abstractmethod
+    def _new_child(self):
+        """创建一个标签值对应的子指标"""
+
+    def collect(self):
+        """生成该指标的文本行"""
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.kind}"
+        for values, child in list(self._children.items()):
+            yield from child.collect(self.name, self.labelnames, values)
+
+class _CounterChild:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def collect(self, name, labelnames, values):
+        yield f"{name}{_format_labels(labelnames, values)} {self.value}"
+
+class Counter(Metric):
+    """只增不减的计数器"""
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+class _GaugeChild:
+    __slots__ = ('value', 'function')
+
+    def __init__(self):
+        self.value = 0
+        self.function = None
+
+    def set(self, value):
+        self.value = value
+
+    def set_function(self, function):
+        """采集时调用 function 获取当前值"""
+        self.function = function
+
+    def collect(self, name, labelnames, values):
+        value = self.value
+        if self.function is not None:
+            try:
+                value = self.function()
+            except Exception as e:
+                logger.error("采集指标 %s 失败: %s", name, e)
+                return
+        yield f"{name}{_format_labels(labelnames, values)} {value}"
+
+class Gauge(Metric):
+    """可增可减的瞬时值"""
+    kind = 'gauge'
+
+    def _new_child(self):
+        return _GaugeChild()
+
+class _HistogramChild:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def collect(self, name, labelnames, values):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f"{name}_bucket{_format_labels(labelnames, values, ('le', bound))} {cumulative}"
+        yield f"{name}_bucket{_format_labels(labelnames, values, ('le', '+Inf'))} {self.count}"
+        yield f"{name}_sum{_format_labels(labelnames, values)} {self.sum}"
+        yield f"{name}_count{_format_labels(labelnames, values)} {self.count}"
+
+class Histogram(Metric):
+    """分桶统计的耗时分布"""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+class Registry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+
+    def render(self):
+        """生成 Prometheus 文本格式"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+def cached(function, ttl=1):
+    """在 ttl 秒内复用 function 的结果，供采集时读取同一数据的多个指标共享一次查询"""
+    state = {'at': None, 'value': None}
+
+    def wrapper():
+        now = time.monotonic()
+        if state['at'] is None or now - state['at'] >= ttl:
+            state['value'] = function()
+            state['at'] = now
+        return state['value']
+    return wrapper
+
+def timed(histogram, **labels):
+    """记录函数耗时的装饰器，支持同步和异步函数
+
+    未指定标签时，使用函数名作为唯一标签的值
+    """
+    def decorator(func):
+        child = histogram.labels(**labels) if labels else histogram.labels(func.__name__)
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    child.observe(time.perf_counter() - start)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                child.observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+# 处理器耗时
+HANDLER_LATENCY = Histogram('bot_handler_seconds', '更新处理器耗时', ['handler'])
+
+# 数据库查询耗时
+DB_LATENCY = Histogram('bot_db_query_seconds', 'database.py 中各函数的耗时', ['function'])
+
+# Bot API 调用耗时及错误数
+API_LATENCY = Histogram('bot_api_call_seconds', 'Bot API 调用耗时', ['method'])
+API_ERRORS = Counter('bot_api_errors_total', 'Bot API 调用失败次数', ['method'])
+
+# 队列深度
+QUEUE_DEPTH = Gauge('bot_queue_depth', '内部队列中等待处理的条目数', ['queue'])
+
+# 反馈数量（按类型、优先级、状态）
+FEEDBACK_EVENTS = Counter('bot_feedback_total', '反馈创建及状态变更次数', ['type', 'priority', 'status'])
+
+# 投递任务执行结果（done、retry、dead）及耗时
+JOB_EVENTS = Counter('bot_jobs_total', '投递任务执行结果', ['kind', 'outcome'])
+JOB_LATENCY = Histogram('bot_job_seconds', '投递任务执行耗时', ['kind'])
+
+# 分配到各管理群组的反馈和求片卡片数（按路由规则和群组）
+ADMIN_ROUTES = Counter('bot_admin_route_total', '分配到管理群组的消息数', ['route', 'chat'])
+
+# 内联查询结果来源（hit、refined、miss）及被防抖丢弃、无权限的次数
+INLINE_QUERIES = Counter('bot_inline_queries_total', '内联查询次数', ['outcome'])
+
+# 事件循环延迟及阻塞次数
+LOOP_LAG = Histogram('bot_event_loop_lag_seconds', '事件循环调度延迟')
+LOOP_BLOCKS = Counter('bot_event_loop_blocks_total', '事件循环阻塞超过阈值的次数')
+
+class InstrumentedRequest(HTTPXRequest):
+    """记录每个 Bot API 方法耗时和失败次数的请求类"""
+
+    async def do_request(self, url, method, *args, **kwargs):
+        api_method = url.rsplit('/', 1)[-1]
+        start = time.perf_counter()
+        try:
+            code, payload = await super().do_request(url, method, *args, **kwargs)
+        except Exception:
+            API_ERRORS.labels(api_method).inc()
+            raise
+        finally:
+            API_LATENCY.labels(api_method).observe(time.perf_counter() - start)
+        if code != 200:
+            API_ERRORS.labels(api_method).inc()
+        return code, payload
+
+async def _handle_request(reader, writer):
+    """处理 HTTP 请求，只提供 GET /metrics"""
+    try:
+        request_line = await reader.readline()
+        # 读取并丢弃请求头
+        while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+            pass
+
+        parts = request_line.decode('latin-1').split()
+        if len(parts) >= 2 and parts[0] == 'GET' and parts[1].split('?')[0] == '/metrics':
+            status, body = '200 OK', REGISTRY.render().encode('utf-8')
+        else:
+            status, body = '404 Not Found', b'not found\n'
+
+        writer.write(
+            f"HTTP/1.1 {status}\r\n"
+            "Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n".encode('latin-1') + body
+        )
+        await writer.drain()
+    except Exception as e:
+        logger.error("处理指标请求失败: %s", e)
+    finally:
+        writer.close()
+
+async def start_metrics_server(host, port):
+    """启动本地 /metrics HTTP 服务"""
+    server = await asyncio.start_server(_handle_request, host, port)
+    logger.info("指标服务已启动: http://%s:%s/metrics", host, port)
+    return server
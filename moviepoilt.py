@@ -0,0 +1,161 @@
+import asyncio
+import logging
+import httpx
+from jobqueue import retry_delay
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 请求超时（秒）
+MOVIEPOILT_TIMEOUT = 15
+
+# 首次重试间隔（秒），之后按指数退避并加随机抖动
+MOVIEPOILT_RETRY_BASE = 0.5
+
+# 订阅接口中的媒体类型
+SUBSCRIBE_TYPES = {
+    'movie': '电影',
+    'tv': '电视剧'
+}
+
+# 可以重试的 HTTP 状态码
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+class MoviePoiltError(Exception):
+    """MoviePoilt 请求失败，retryable 为 False 时重试也不会成功（如影片无法识别、账号密码错误）"""
+
+    def __init__(self, message, retryable=True):
+        super().__init__(message)
+        self.retryable = retryable
+
+class MoviePoiltClient:
+    """MoviePoilt 订阅接口的异步客户端
+
+    所有请求共用一个连接池，同一主机的并发请求数受 moviepoilt_concurrency 限制。
+    登录令牌缓存在内存中，过期（返回 401）时只由一个请求重新登录，其他请求等待新令牌。
+    连接错误和 5xx 按指数退避加随机抖动重试 moviepoilt_retries 次。
+    """
+
+    def __init__(self, settings):
+        self._client = None
+        self._token = None
+        self._login_lock = asyncio.Lock()
+        self._host_limits = {}
+        self._account = None
+        self.concurrency = None
+        self.configure(settings)
+
+    def configure(self, settings):
+        """读取地址、账号和并发限制，地址或账号修改后丢弃缓存的令牌"""
+        account = (settings.moviepoilt_url.rstrip('/'), settings.moviepoilt_username, settings.moviepoilt_password)
+        if account != self._account:
+            self._token = None
+        self._account = account
+        self.base_url, self.username, self.password = account
+        self.retries = settings.moviepoilt_retries
+        if settings.moviepoilt_concurrency != self.concurrency:
+            # 新的限制对之后的请求生效，进行中的请求仍释放旧的信号量
+            self.concurrency = settings.moviepoilt_concurrency
+            self._host_limits = {}
+
+    @property
+    def enabled(self):
+        """是否已配置 MoviePoilt 地址"""
+        return bool(self.base_url)
+
+    def _host_limit(self, url):
+        """同一主机共用一个信号量"""
+        host = httpx.URL(url).netloc
+        limit = self._host_limits.get(host)
+        if limit is None:
+            limit = self._host_limits[host] = asyncio.Semaphore(self.concurrency)
+        return limit
+
+    def _http(self):
+        """共用的连接池，首次使用时创建"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=MOVIEPOILT_TIMEOUT,
+                limits=httpx.Limits(max_connections=None, max_keepalive_connections=self.concurrency)
+            )
+        return self._client
+
+    async def _send(self, method, path, **kwargs):
+        """在主机并发限制内发送一个请求"""
+        url = f"{self.base_url}{path}"
+        async with self._host_limit(url):
+            return await self._http().request(method, url, **kwargs)
+
+    async def _login(self, stale_token):
+        """获取登录令牌；多个请求同时发现令牌过期时只登录一次"""
+        async with self._login_lock:
+            if self._token is not None and self._token != stale_token:
+                return self._token
+            response = await self._send(
+                'POST', '/api/v1/login/access-token',
+                data={'username': self.username, 'password': self.password}
+            )
+            if response.status_code in (400, 401, 403):
+                raise MoviePoiltError("MoviePoilt 登录失败，请检查用户名和密码", retryable=False)
+            response.raise_for_status()
+            self._token = response.json()['access_token']
+            logger.info("MoviePoilt 登录成功")
+            return self._token
+
+    async def _request(self, method, path, **kwargs):
+        """带令牌发送请求，令牌过期时重新登录，可重试的错误退避后重试"""
+        if not self.enabled:
+            raise MoviePoiltError("未配置 MoviePoilt 地址", retryable=False)
+
+        attempt = 0
+        refreshed = False
+        while True:
+            try:
+                token = self._token or await self._login(None)
+                response = await self._send(method, path, headers={'Authorization': f"Bearer {token}"}, **kwargs)
+                if response.status_code == 401:
+                    # 令牌过期，重新登录后重试，第一次立即重试且不计入重试次数
+                    await self._login(token)
+                    if not refreshed:
+                        refreshed = True
+                        continue
+                    error = "MoviePoilt 令牌无效"
+                elif response.status_code not in RETRYABLE_STATUS:
+                    if response.status_code >= 400:
+                        raise MoviePoiltError(
+                            f"MoviePoilt 返回 {response.status_code}: {response.text[:200]}", retryable=False
+                        )
+                    return response.json()
+                else:
+                    error = f"MoviePoilt 返回 {response.status_code}"
+            except httpx.HTTPStatusError as e:
+                # 登录接口暂时不可用
+                error = f"MoviePoilt 登录返回 {e.response.status_code}"
+            except httpx.TransportError as e:
+                error = f"连接 MoviePoilt 失败: {e!r}"
+
+            attempt += 1
+            if attempt > self.retries:
+                raise MoviePoiltError(error)
+            delay = retry_delay(attempt, MOVIEPOILT_RETRY_BASE)
+            logger.warning("%s，%.1f 秒后重试", error, delay)
+            await asyncio.sleep(delay)
+
+    async def subscribe(self, tmdb_id, media_type, title=None, year=None):
+        """添加订阅，影片已订阅时视为成功，返回 MoviePoilt 的提示信息"""
+        result = await self._request('POST', '/api/v1/subscribe/', json={
+            'name': title,
+            'tmdbid': tmdb_id,
+            'type': SUBSCRIBE_TYPES.get(media_type, media_type),
+            'year': year
+        })
+        message = result.get('message') or ''
+        if not result.get('success') and '已存在' not in message:
+            raise MoviePoiltError(f"添加订阅失败: {message}", retryable=False)
+        return message
+
+    async def close(self):
+        """关闭连接池"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,177 @@
+import asyncio
+import heapq
+import logging
+import math
+import time
+from datetime import datetime, timezone
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 优先级排序值（0 最紧急），与 database.PRIORITY_RANK 一致
+PRIORITY_RANKS = {
+    '!!!': 0,
+    '!!': 1,
+    'high': 1,
+    '!': 2,
+    'normal': 2,
+    'low': 3
+}
+
+# 超过 SLA 后提醒的优先级
+ESCALATION_PRIORITIES = {'!!!'}
+
+# 默认 SLA（秒）
+ESCALATION_SLA = 3600
+
+def parse_created_at(value):
+    """数据库中的 created_at（UTC 文本）转换为时间戳"""
+    try:
+        return datetime.strptime(value, '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc).timestamp()
+    except (TypeError, ValueError):
+        return time.time()
+
+class PendingIndex:
+    """待处理反馈的内存索引：按优先级和创建时间排列的二叉堆，紧急反馈超过 SLA 后提醒管理群组
+
+    启动时从数据库分页加载一次，之后随新增和处理增量更新，不再扫描反馈表。
+    已处理的反馈只从字典中删除，堆中的过期条目在超过有效条目数时重建。
+    超过 SLA 的提醒由一个定时器驱动，只在最早的到期时间触发，之后每隔一个 SLA 再次提醒。
+    """
+
+    def __init__(self, on_escalate, sla=ESCALATION_SLA):
+        self.on_escalate = on_escalate
+        self.sla = sla
+        self._heap = []
+        self._open = {}
+        self._escalations = []
+        self._timer = None
+        self._timer_due = None
+
+    def __len__(self):
+        """待处理反馈数"""
+        return len(self._open)
+
+    def load(self, feedbacks):
+        """加载待处理反馈（feedback 表的整行）"""
+        for feedback in feedbacks:
+            self.add(feedback[:11])
+        logger.info("已加载 %s 条待处理反馈", len(self._open))
+
+    def add(self, feedback, created=None):
+        """加入一条待处理反馈，created 为创建时间戳，缺省时取记录中的 created_at"""
+        feedback_id, priority = feedback[0], feedback[7]
+        created = parse_created_at(feedback[9]) if created is None else created
+        entry = (PRIORITY_RANKS.get(priority, 4), created, feedback_id)
+        self._open[feedback_id] = (entry, feedback)
+        heapq.heappush(self._heap, entry)
+
+        if priority in ESCALATION_PRIORITIES and self.sla:
+            self._push_escalation(entry, time.time())
+
+    def remove(self, feedback_id):
+        """反馈已处理，移出索引"""
+        if self._open.pop(feedback_id, None) is None:
+            return
+        if len(self._heap) > 2 * len(self._open) + 64:
+            self._heap = [entry for entry, _ in self._open.values()]
+            heapq.heapify(self._heap)
+
+    def created_at(self, feedback_id):
+        """反馈的创建时间戳"""
+        return self._open[feedback_id][0][1]
+
+    def clear(self):
+        """清空索引（如清除数据库后）"""
+        self._open.clear()
+        self._heap.clear()
+        self._escalations.clear()
+        self._cancel_timer()
+
+    def top(self, k):
+        """最紧急的 k 条反馈：从堆顶开始只展开候选节点的子节点，复杂度 O(k log n)"""
+        result = []
+        candidates = [(self._heap[0], 0)] if self._heap else []
+        while candidates and len(result) < k:
+            entry, index = heapq.heappop(candidates)
+            current = self._open.get(entry[2])
+            if current is not None and current[0] == entry:
+                result.append(current[1])
+            for child in (2 * index + 1, 2 * index + 2):
+                if child < len(self._heap):
+                    heapq.heappush(candidates, (self._heap[child], child))
+        return result
+
+    def configure(self, sla):
+        """修改 SLA，按新的间隔重新计算提醒时间"""
+        if sla == self.sla:
+            return
+        self.sla = sla
+        self._escalations.clear()
+        self._cancel_timer()
+        if sla:
+            now = time.time()
+            for entry, feedback in self._open.values():
+                if feedback[7] in ESCALATION_PRIORITIES:
+                    self._push_escalation(entry, now)
+
+    def start(self):
+        """启动提醒定时器（需在事件循环中调用）"""
+        self._schedule()
+
+    def stop(self):
+        """停止提醒定时器"""
+        self._cancel_timer()
+
+    def _push_escalation(self, entry, now):
+        """在创建后第 k 个 SLA（尚未到达的第一个）时提醒"""
+        created = entry[1]
+        periods = max(1, math.ceil((now - created) / self.sla))
+        if created + periods * self.sla <= now:
+            periods += 1
+        heapq.heappush(self._escalations, (created + periods * self.sla, entry))
+        self._schedule()
+
+    def _schedule(self):
+        """定时器只在最早的提醒时间触发，新的提醒更早时才重新设置"""
+        if not self._escalations:
+            return
+        due = self._escalations[0][0]
+        if self._timer is not None and self._timer_due <= due:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # 尚未启动事件循环（启动前加载），由 start 设置
+            return
+        self._cancel_timer()
+        self._timer_due = due
+        self._timer = loop.call_later(max(0, due - time.time()), self._fire)
+
+    def _cancel_timer(self):
+        """取消定时器"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+            self._timer_due = None
+
+    def _fire(self):
+        """提醒所有已到期且仍未处理的紧急反馈，之后按 SLA 间隔安排下一次提醒"""
+        self._timer = None
+        self._timer_due = None
+        now = time.time()
+        due = []
+        while self._escalations and self._escalations[0][0] <= now:
+            _, entry = heapq.heappop(self._escalations)
+            current = self._open.get(entry[2])
+            if current is None or current[0] != entry:
+                continue
+            due.append((current[1], now - entry[1]))
+            self._push_escalation(entry, now)
+
+        if due:
+            try:
+                self.on_escalate(due)
+            except Exception as e:
+                logger.error("发送超时提醒失败: %s", e)
+        self._schedule()
@@ -0,0 +1,237 @@
+"""回放 record_journal 记录的更新：在本地模拟的 Bot API 上重新处理，核对发出的 API 调用并比较耗时
+
+用法示例：
+    python3 replay.py journal.jsonl.gz                # 按记录时的节奏回放
+    python3 replay.py journal.jsonl.gz --speed 0      # 尽快回放
+    python3 replay.py journal.jsonl.gz --speed 10 --latency 0.02 --output replay.json --strict
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+from bench_bot import write_bench_config, summarize, git_revision
+from journal import read_journal
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 输出的不一致样例数
+MAX_EXAMPLES = 20
+
+# 消息文本中的时间（如汇总通知的处理时间），比较时忽略
+TIMESTAMP_PATTERN = re.compile(r'\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}(:\d{2})?')
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='回放日志并核对 API 调用')
+    parser.add_argument('journal', help='record_journal 生成的日志文件')
+    parser.add_argument('--speed', type=float, default=1.0, help='回放倍速，0 表示尽快回放')
+    parser.add_argument('--latency', type=float, default=0.0, help='模拟 API 每次调用的延迟（秒）')
+    parser.add_argument('--drain-timeout', type=float, default=60, help='发送结束后等待处理完成的最长时间（秒）')
+    parser.add_argument('--output', help='结果文件（JSON）')
+    parser.add_argument('--strict', action='store_true', help='API 调用不一致时以非零状态退出')
+    return parser.parse_args()
+
+def load_journal(path):
+    """读取日志，多次启动的记录按先后顺序拼接到同一时间轴上"""
+    header = None
+    updates = []
+    calls = []
+    offset = 0.0
+    last_t = 0.0
+    for record in read_journal(path):
+        kind = record.get('type')
+        if kind == 'header':
+            if header is None:
+                header = record
+            offset = last_t
+        elif kind in ('update', 'call'):
+            record['t'] += offset
+            last_t = max(last_t, record['t'])
+            (updates if kind == 'update' else calls).append(record)
+    updates.sort(key=lambda record: record['t'])
+    return header, updates, calls
+
+def call_key(call):
+    """比较调用时使用的键：方法、目标会话和文本，忽略各次运行不同的消息 ID 和时间"""
+    params = call.get('params') or {}
+    text = params.get('text')
+    if isinstance(text, str):
+        text = TIMESTAMP_PATTERN.sub('<time>', text)
+    return (call['method'], params.get('chat_id'), text)
+
+def compare_calls(recorded, replayed):
+    """按更新分组比较 API 调用，返回统计和不一致样例"""
+    expected = defaultdict(Counter)
+    actual = defaultdict(Counter)
+    for call in recorded:
+        expected[call.get('update_id')][call_key(call)] += 1
+    for call in replayed:
+        actual[call.get('update_id')][call_key(call)] += 1
+
+    matched = missing = extra = 0
+    examples = []
+    for update_id in sorted(set(expected) | set(actual), key=lambda value: (value is None, value or 0)):
+        want, got = expected[update_id], actual[update_id]
+        matched += sum((want & got).values())
+        lost, added = want - got, got - want
+        missing += sum(lost.values())
+        extra += sum(added.values())
+        if (lost or added) and len(examples) < MAX_EXAMPLES:
+            examples.append({
+                'update_id': update_id,
+                'missing': [list(key) for key in lost.elements()],
+                'extra': [list(key) for key in added.elements()]
+            })
+    return {'matched': matched, 'missing': missing, 'extra': extra, 'examples': examples}
+
+def method_latency(calls):
+    """按方法汇总 API 调用耗时"""
+    durations = defaultdict(list)
+    for call in calls:
+        durations[call['method']].append(call['duration'])
+    return {method: summarize(values) for method, values in sorted(durations.items())}
+
+def admin_groups(header):
+    """录制时的全部管理群组，旧版日志只记录了第一个"""
+    if 'admin_groups' in header:
+        return header['admin_groups']
+    return [header['admin_group']] if header.get('admin_group') is not None else []
+
+async def replay(args, header, updates, bot, database):
+    """启动模拟服务和应用，按记录的时间轴发送更新"""
+    from fake_bot_api import FakeBotAPI
+    from fake_tmdb import FakeTMDB
+    from fake_moviepoilt import FakeMoviePoilt
+
+    api = FakeBotAPI(args.latency)
+    await api.start()
+    # 求片消息会查询 TMDB、同意后会添加订阅，同样指向本地模拟服务，不发出外部请求
+    tmdb = FakeTMDB(args.latency)
+    await tmdb.start()
+    moviepoilt = FakeMoviePoilt(latency=args.latency)
+    await moviepoilt.start()
+
+    database.init_db()
+    for group_id in admin_groups(header):
+        database.add_group(group_id, 'replay admin', True)
+    for group_id in header.get('user_groups', []):
+        database.add_group(group_id, 'replay users')
+
+    application = bot.build_application(api.base_url)
+    application.bot_data['tmdb'].base_url = tmdb.base_url
+    application.bot_data['moviepoilt'].base_url = moviepoilt.base_url
+    processed = []
+    process_update = application.process_update
+
+    async def counting_process_update(update):
+        try:
+            await process_update(update)
+        finally:
+            processed.append(update)
+
+    application.process_update = counting_process_update
+
+    await application.initialize()
+    await application.start()
+    await application.updater.start_polling(poll_interval=0, timeout=1)
+    await bot.post_init(application)
+
+    start = time.monotonic()
+    for record in updates:
+        if args.speed > 0:
+            delay = start + record['t'] / args.speed - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        api.add_update(record['update'])
+
+    deadline = time.monotonic() + args.drain_timeout
+    while len(processed) < len(updates) and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+    elapsed = time.monotonic() - start
+
+    await application.updater.stop()
+    await application.stop()
+    await bot.post_stop(application)
+    await application.shutdown()
+    await api.stop()
+    await tmdb.stop()
+    await moviepoilt.stop()
+    return elapsed
+
+def main():
+    """主函数"""
+    args = parse_args()
+    header, updates, recorded_calls = load_journal(args.journal)
+    if header is None:
+        sys.exit(f"日志中没有 header 记录: {args.journal}")
+
+    with tempfile.TemporaryDirectory(prefix='feedback-replay-') as directory:
+        replay_path = os.path.join(directory, 'replay.jsonl.gz')
+        os.environ['FEEDBACK_BOT_CONFIG'] = write_bench_config(
+            directory,
+            admin_group_id=header.get('admin_group'),
+            admin_routes=header.get('admin_routes', []),
+            feedback_groups=header.get('user_groups', []),
+            record_journal=replay_path,
+            **header['settings']
+        )
+        import database
+        database.DB_FILE = os.path.join(directory, 'feedback.db')
+        import bot
+
+        # 业务日志会严重拖慢回放，只保留警告和错误
+        logging.getLogger().setLevel(logging.WARNING)
+
+        elapsed = asyncio.run(replay(args, header, updates, bot, database))
+        _, replayed_updates, replayed_calls = load_journal(replay_path)
+
+    comparison = compare_calls(recorded_calls, replayed_calls)
+    recorded_duration = [record['duration'] for record in updates]
+    replayed_duration = [record['duration'] for record in replayed_updates]
+    result = {
+        'revision': git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'journal': args.journal,
+        'params': vars(args),
+        'updates_recorded': len(updates),
+        'updates_replayed': len(replayed_updates),
+        'elapsed_seconds': round(elapsed, 3),
+        'recorded_span_seconds': round(updates[-1]['t'] - updates[0]['t'], 3) if updates else 0,
+        'calls': comparison,
+        'handler_latency': {
+            'recorded': summarize(recorded_duration),
+            'replayed': summarize(replayed_duration)
+        },
+        'api_latency': {
+            'recorded': method_latency(recorded_calls),
+            'replayed': method_latency(replayed_calls)
+        }
+    }
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+    recorded, replayed = result['handler_latency']['recorded'], result['handler_latency']['replayed']
+    print(f"回放 {result['updates_replayed']}/{result['updates_recorded']} 条更新，耗时 {result['elapsed_seconds']} 秒")
+    print(f"API 调用：一致 {comparison['matched']}，缺少 {comparison['missing']}，多出 {comparison['extra']}")
+    print(f"处理耗时 p50：记录 {recorded['p50_ms']} ms，回放 {replayed['p50_ms']} ms")
+    print(f"处理耗时 p99：记录 {recorded['p99_ms']} ms，回放 {replayed['p99_ms']} ms")
+    for example in comparison['examples'][:5]:
+        print(f"  更新 {example['update_id']}：缺少 {str(example['missing'])[:200]}，多出 {str(example['extra'])[:200]}")
+    if args.output:
+        print(f"结果已写入 {args.output}")
+
+    if args.strict and (comparison['missing'] or comparison['extra']):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+import logging
+import time
+from collections import defaultdict
+from database import get_feedback_rollups, bucket_upper_bound, DURATION_BUCKET_GROWTH, ROLLUP_PERIODS
+from config import FEEDBACK_TYPES, PRIORITY_LEVELS
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 报告时间范围：参数 -> (汇总粒度, 包含的周期数, 显示名称)
+REPORT_WINDOWS = {
+    'day': ('hour', 24, '近 24 小时'),
+    'week': ('day', 7, '近 7 天'),
+    'month': ('day', 30, '近 30 天')
+}
+
+# 报告中的百分位数
+REPORT_PERCENTILES = (50, 90, 99)
+
+# 各维度的标题和取值名称
+REPORT_DIMENSIONS = [
+    ('type', "📌 按类型", FEEDBACK_TYPES),
+    ('priority', "🔢 按优先级", PRIORITY_LEVELS),
+    ('admin', "👮 按处理人", {})
+]
+
+def histogram_percentile(histogram, q):
+    """由分桶计数估算百分位数，取所在分桶上下限的几何中点（秒）"""
+    total = sum(histogram.values())
+    if not total:
+        return None
+    rank = q / 100 * total
+    seen = 0
+    for bucket in sorted(histogram):
+        seen += histogram[bucket]
+        if seen >= rank:
+            return bucket_upper_bound(bucket) / (DURATION_BUCKET_GROWTH ** 0.5 if bucket else 1)
+    return bucket_upper_bound(max(histogram))
+
+def format_duration(seconds):
+    """格式化时长"""
+    if seconds < 60:
+        return f"{seconds:.0f} 秒"
+    if seconds < 3600:
+        return f"{seconds / 60:.0f} 分钟"
+    if seconds < 86400:
+        return f"{seconds / 3600:.1f} 小时"
+    return f"{seconds / 86400:.1f} 天"
+
+def format_percentiles(histogram):
+    """格式化一组处理耗时的百分位数"""
+    count = sum(histogram.values())
+    if not count:
+        return "暂无已解决"
+    parts = [f"P{q} {format_duration(histogram_percentile(histogram, q))}" for q in REPORT_PERCENTILES]
+    return f"{'，'.join(parts)}（{count} 条）"
+
+def build_report(window, now=None):
+    """生成反馈处理报告：读取时间范围内的汇总，与反馈总量无关"""
+    period, periods, label = REPORT_WINDOWS[window]
+    length = ROLLUP_PERIODS[period]
+    now = time.time() if now is None else now
+    since = int(now // length * length) - (periods - 1) * length
+    rows = get_feedback_rollups(period, since)
+    if rows is None:
+        return None
+
+    # (维度, 值) -> 事件 -> 数量；(维度, 值) -> 已解决的耗时分桶
+    counts = defaultdict(lambda: defaultdict(int))
+    histograms = defaultdict(lambda: defaultdict(int))
+    for dimension, value, outcome, bucket, count, total_seconds in rows:
+        counts[(dimension, value)][outcome] += count
+        if outcome == 'resolved':
+            histograms[(dimension, value)][bucket] += count
+
+    overall = counts[('all', '')]
+    lines = [
+        f"📈 反馈处理报告（{label}）\n",
+        f"新增 {overall['created']}，已解决 {overall['resolved']}，"
+        f"已驳回 {overall['rejected']}，重新打开 {overall['reopened']}",
+        f"⏱ 解决耗时：{format_percentiles(histograms[('all', '')])}"
+    ]
+    for dimension, title, names in REPORT_DIMENSIONS:
+        values = sorted(
+            (value for dim, value in counts if dim == dimension),
+            key=lambda value: -sum(histograms[(dimension, value)].values())
+        )
+        if not values:
+            continue
+        lines.append(f"\n{title}：")
+        for value in values:
+            rejected = counts[(dimension, value)]['rejected']
+            suffix = f"，驳回 {rejected}" if rejected else ""
+            lines.append(f"- {names.get(value, value or '未知')}：{format_percentiles(histograms[(dimension, value)])}{suffix}")
+    return "\n".join(lines)
@@ -1,10 +1,8 @@
 #!/bin/bash
 
-# 停止机器人
-./stop_bot.sh
+# 进入项目目录
+cd "$(dirname "$0")"
 
-# 等待5秒
-sleep 5
-
-# 启动机器人
-./start_bot.sh 
\ No newline at end of file
+# 启动新实例：新实例预热完成后请求交接，
+# 旧实例处理完已拉取的更新后释放轮询租约并自动退出
+./start_bot.sh
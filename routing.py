@@ -0,0 +1,137 @@
+import hashlib
+import logging
+from collections import Counter
+from database import get_admin_groups, get_user_groups
+from metrics import ADMIN_ROUTES
+from config import get_config, ROUTE_TYPES, ROUTE_PRIORITIES
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 没有规则匹配时使用的路由名，分配到所有管理群组
+DEFAULT_ROUTE = 'default'
+
+def rendezvous(targets, key):
+    """最高随机权重哈希：同一个 key 总是分配到同一群组，增删群组时只有该群组的 key 改变去向"""
+    return max(targets, key=lambda target: hashlib.blake2b(f"{target}:{key}".encode(), digest_size=8).digest())
+
+class AdminRouter:
+    """按 admin_routes 规则把反馈和求片卡片分配到多个管理群组
+
+    加载时把规则展开为 (来源群组, 类型, 优先级) -> (路由名, 目标群组, 哈希依据) 的查找表，
+    分配时只查一次字典；目标有多个群组时按用户、来源群组或单条消息做一致性哈希，
+    counts 记录本进程启动以来每条路由分配到各群组的数量，用于查看负载是否均衡。
+    """
+
+    def __init__(self):
+        self.routes = ()
+        self.admin_groups = ()
+        self.user_groups = frozenset()
+        self.counts = Counter()
+        self._table = {}
+        self._default = (DEFAULT_ROUTE, (), 'user')
+
+    def compile(self, routes, admin_groups, user_groups):
+        """生成查找表，规则中的管理群组为空时使用所有管理群组"""
+        self.routes = routes
+        self.admin_groups = tuple(sorted(admin_groups))
+        self.user_groups = frozenset(user_groups)
+        self._default = (DEFAULT_ROUTE, self.admin_groups, 'user')
+
+        # 规则中的群组必须已用 /set_admin_group 设置，否则处理按钮在该群组中无效
+        for route in routes:
+            missing = route.admin_groups.difference(self.admin_groups)
+            if missing:
+                logger.warning("路由 %s 中的群组不是管理群组，已忽略: %s", route.name, sorted(missing))
+
+        # 来源群组为 None 的条目用于未在任何规则中单独列出的群组
+        sources = {None, *user_groups}
+        for route in routes:
+            sources.update(route.source_groups)
+        table = {}
+        for source in sources:
+            for feedback_type in ROUTE_TYPES:
+                for priority in ROUTE_PRIORITIES:
+                    table[(source, feedback_type, priority)] = self._match(source, feedback_type, priority)
+        self._table = table
+        logger.info("已加载 %s 条管理群组路由规则，%s 个管理群组", len(routes), len(self.admin_groups))
+
+    def _match(self, source, feedback_type, priority):
+        """第一条条件全部满足的规则"""
+        for route in self.routes:
+            if route.source_groups and source not in route.source_groups:
+                continue
+            if route.types and feedback_type not in route.types:
+                continue
+            if route.priorities and priority not in route.priorities:
+                continue
+            targets = tuple(chat_id for chat_id in self.admin_groups if chat_id in route.admin_groups)
+            return (route.name, targets or self.admin_groups, route.hash_by)
+        return self._default
+
+    def reload(self, settings=None):
+        """从配置和数据库重新生成查找表（启动、修改配置、增删群组时调用）"""
+        settings = settings or get_config()
+        self.compile(
+            settings.admin_routes,
+            [group[0] for group in get_admin_groups()],
+            [group[0] for group in get_user_groups()]
+        )
+
+    def is_user_group(self, chat_id):
+        """是否为用户群组，使用加载时的群组列表，不查询数据库"""
+        return chat_id in self.user_groups
+
+    def route(self, source, feedback_type, priority, user_id, item):
+        """查找目标管理群组，返回 (路由名, 群组 ID)，没有管理群组时群组 ID 为 None"""
+        name, targets, hash_by = (
+            self._table.get((source, feedback_type, priority))
+            or self._table.get((None, feedback_type, priority))
+            or self._default
+        )
+        if not targets:
+            return name, None
+        if len(targets) == 1:
+            return name, targets[0]
+        key = {'user': user_id, 'group': source, 'item': item}[hash_by]
+        return name, rendezvous(targets, key)
+
+    def count(self, name, chat_id):
+        """记录一次分配"""
+        self.counts[(name, chat_id)] += 1
+        ADMIN_ROUTES.labels(name, str(chat_id)).inc()
+
+    def assign(self, source, feedback_type, priority, user_id, item):
+        """分配目标管理群组并计数，没有管理群组时返回 None"""
+        name, chat_id = self.route(source, feedback_type, priority, user_id, item)
+        if chat_id is not None:
+            self.count(name, chat_id)
+        return chat_id
+
+    def report(self):
+        """路由规则和各群组的分配数量"""
+        lines = ["🧭 管理群组路由\n"]
+        for index, route in enumerate(self.routes, 1):
+            conditions = []
+            if route.source_groups:
+                conditions.append(f"来源 {', '.join(map(str, sorted(route.source_groups)))}")
+            if route.types:
+                conditions.append(f"类型 {', '.join(sorted(route.types))}")
+            if route.priorities:
+                conditions.append(f"优先级 {' '.join(sorted(route.priorities))}")
+            targets = ', '.join(map(str, sorted(route.admin_groups))) or "所有管理群组"
+            lines.append(f"{index}. {route.name}：{'，'.join(conditions) or '全部'} → {targets}（按 {route.hash_by} 分配）")
+        lines.append(f"{len(self.routes) + 1}. {DEFAULT_ROUTE}：其余 → 所有管理群组（{len(self.admin_groups)} 个）")
+
+        lines.append("\n📊 分配数量（本次启动以来）：")
+        if not self.counts:
+            lines.append("暂无")
+        for name in [route.name for route in self.routes] + [DEFAULT_ROUTE]:
+            counts = {chat_id: count for (route, chat_id), count in self.counts.items() if route == name}
+            if not counts:
+                continue
+            total = sum(counts.values())
+            lines.append(f"- {name}（共 {total}）：")
+            for chat_id, count in sorted(counts.items(), key=lambda item: -item[1]):
+                lines.append(f"  {chat_id}: {count}（{count / total:.0%}）")
+        return "\n".join(lines)
@@ -0,0 +1,105 @@
+import asyncio
+import heapq
+import logging
+import time
+from telegram.error import RetryAfter
+from database import add_scheduled_action, get_scheduled_actions, remove_scheduled_actions
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 单次 deleteMessages 调用最多可删除的消息数
+DELETE_BATCH_SIZE = 100
+
+# 到期时顺带执行此时间窗口（秒）内即将到期的任务，以便合并为批量调用
+BATCH_WINDOW = 1.0
+
+class ActionScheduler:
+    """持久化的定时任务调度器：单个任务按最早到期时间休眠，到期后批量执行"""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self._heap = []
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def __len__(self):
+        """等待执行的任务数"""
+        return len(self._heap)
+
+    def start(self):
+        """从数据库加载未执行的任务并启动调度"""
+        if self._task is not None:
+            return
+        for action_id, action, chat_id, message_id, due_at in get_scheduled_actions():
+            heapq.heappush(self._heap, (due_at, action_id, action, chat_id, message_id))
+        logger.info("已加载 %s 个未执行的定时任务", len(self._heap))
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """停止调度，未执行的任务保留在数据库中"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def schedule_deletion(self, chat_id, message_id, delay):
+        """在 delay 秒后删除消息"""
+        due_at = time.time() + delay
+        action_id = add_scheduled_action('delete', chat_id, message_id, due_at)
+        if action_id is None:
+            return
+        heapq.heappush(self._heap, (due_at, action_id, 'delete', chat_id, message_id))
+        # 新任务成为最早到期的任务时唤醒调度器
+        if self._heap[0][1] == action_id:
+            self._wakeup.set()
+
+    async def _run(self):
+        """等待最早到期的任务，到期后批量执行"""
+        while True:
+            timeout = self._heap[0][0] - time.time() if self._heap else None
+            if timeout is None or timeout > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            deadline = time.time() + BATCH_WINDOW
+            due = []
+            while self._heap and self._heap[0][0] <= deadline:
+                due.append(heapq.heappop(self._heap))
+            await self._execute(due)
+
+    async def _execute(self, due):
+        """按群组分批执行到期任务"""
+        batches = {}
+        for item in due:
+            _, _, action, chat_id, _ = item
+            batches.setdefault((action, chat_id), []).append(item)
+
+        for (action, chat_id), items in batches.items():
+            for start in range(0, len(items), DELETE_BATCH_SIZE):
+                batch = items[start:start + DELETE_BATCH_SIZE]
+                try:
+                    if action == 'delete':
+                        await self.bot.delete_messages(
+                            chat_id=chat_id,
+                            message_ids=[item[4] for item in batch]
+                        )
+                        logger.info("已在群组 %s 删除 %s 条消息", chat_id, len(batch))
+                    else:
+                        logger.warning("未知的定时任务类型: %s", action)
+                except RetryAfter as e:
+                    # 被限流时稍后重试，任务仍保留在数据库中
+                    retry_at = time.time() + e.retry_after
+                    for item in batch:
+                        heapq.heappush(self._heap, (retry_at,) + item[1:])
+                    continue
+                except Exception as e:
+                    logger.error("在群组 %s 执行定时任务 %s 失败: %s", chat_id, action, e)
+                remove_scheduled_actions([item[1] for item in batch])
@@ -6,9 +6,10 @@ cd "$(dirname "$0")"
 # 激活虚拟环境（如果有的话）
 # source venv/bin/activate
 
-# 启动机器人
-nohup python3 bot.py > bot.log 2>&1 &
+# 启动机器人（已有实例在运行时，新实例会在预热后接管轮询）
+# 日志由程序写入 bot.log 并自动轮转，这里只保存启动失败等未进入日志的输出
+nohup python3 bot.py >> bot.out 2>&1 &
 
 # 输出进程ID
 echo $! > bot.pid
-echo "Bot started with PID $(cat bot.pid)" 
\ No newline at end of file
+echo "Bot started with PID $(cat bot.pid)"
@@ -0,0 +1,325 @@
+import logging
+import re
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import ContextTypes
+from telegram.error import BadRequest
+from database import (
+    add_subscription_request, get_subscription, get_subscription_requesters,
+    set_subscription_card, update_subscription_status, approve_pending_subscriptions,
+    get_tmdb_metadata, get_admin_group, is_admin_group
+)
+from jobqueue import job_handler, submit_jobs, PermanentJobError
+from moviepoilt import MoviePoiltError
+from throttle import check_throttle
+from logsetup import with_log_context
+from metrics import timed, HANDLER_LATENCY
+from tmdb import MEDIA_TYPES
+from config import get_config
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 求片标签
+REQUEST_TAG = '#求片'
+
+# TMDB 影片链接
+TMDB_URL_PATTERN = re.compile(r'https?://(?:www\.)?themoviedb\.org/(movie|tv)/(\d+)')
+
+# 卡片上列出的请求用户数
+CARD_REQUESTERS = 10
+
+# 图片说明的最大长度
+MAX_CAPTION_LENGTH = 1024
+
+# 处理结果
+STATUS_TEXT = {
+    'approved': "✅ 已同意",
+    'rejected': "❌ 已拒绝"
+}
+
+def format_title(tmdb_id, media_type, metadata):
+    """影片名称，没有元数据时使用 TMDB ID"""
+    if metadata and metadata['title']:
+        return f"{metadata['title']} ({metadata['year']})" if metadata['year'] else metadata['title']
+    return f"TMDB ID {tmdb_id}"
+
+def format_card(subscription, metadata, requesters, footer=None):
+    """生成管理群组中的求片卡片，footer 为附在末尾的处理结果"""
+    subscription_id, tmdb_id, media_type, status, request_count = subscription[:5]
+    lines = [
+        "🎬 收到求片请求\n",
+        f"📺 {format_title(tmdb_id, media_type, metadata)}",
+        f"📌 类型：{MEDIA_TYPES.get(media_type, media_type)}",
+        f"🔗 https://www.themoviedb.org/{media_type}/{tmdb_id}",
+        f"👥 请求人数：{request_count}"
+    ]
+    for user_id, username, group_id in requesters:
+        lines.append(f"- {username or user_id} (ID: {user_id})")
+    if request_count > len(requesters):
+        lines.append(f"- …等 {request_count} 人")
+    if footer:
+        return "\n".join(lines)[:MAX_CAPTION_LENGTH - len(footer) - 2] + f"\n\n{footer}"
+    return "\n".join(lines)[:MAX_CAPTION_LENGTH]
+
+def card_markup(subscription_id):
+    """卡片上的处理按钮"""
+    return InlineKeyboardMarkup([[
+        InlineKeyboardButton("✅ 同意", callback_data=f"sub_approve_{subscription_id}"),
+        InlineKeyboardButton("❌ 拒绝", callback_data=f"sub_reject_{subscription_id}")
+    ]])
+
+@timed(HANDLER_LATENCY)
+@with_log_context
+async def handle_movie_request(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """处理求片请求：同一影片的请求合并到一张卡片，重复请求只更新卡片上的人数"""
+    try:
+        user = update.effective_user
+        message = update.effective_message
+        chat_id = update.effective_chat.id
+
+        content = message.text
+        if not content or not content.startswith(REQUEST_TAG):
+            return
+
+        # 检查是否在用户群组中（内存中的群组列表），其他群组的消息不计入限流，也不回复限流提示
+        if not context.bot_data['admin_router'].is_user_group(chat_id):
+            return
+
+        # 限流检查，在任何数据库或 API 操作之前
+        if not await check_throttle(update, context):
+            return
+
+        def reply(text):
+            return ('reply', {'chat_id': chat_id, 'reply_to': message.message_id, 'text': text})
+
+        # 提取TMDB链接
+        match = TMDB_URL_PATTERN.search(content)
+        if not match:
+            submit_jobs(context.bot_data, [reply("❌ 请提供有效的TMDB链接（例如：https://www.themoviedb.org/movie/12345）")])
+            return
+        media_type, tmdb_id = match.group(1), int(match.group(2))
+
+        # 按路由规则选择管理群组，同一影片的后续请求只更新已发出的卡片
+        router = context.bot_data['admin_router']
+        route_name, admin_chat_id = router.route(chat_id, 'request', '!', user.id, f"{media_type}/{tmdb_id}")
+        if admin_chat_id is None:
+            submit_jobs(context.bot_data, [reply("❌ 未设置管理群组，请联系管理员")])
+            return
+
+        result = add_subscription_request(
+            tmdb_id, media_type, user.id, user.username or user.first_name, chat_id, content
+        )
+        if result is None:
+            submit_jobs(context.bot_data, [reply("❌ 提交求片请求时出错，请稍后重试")])
+            return
+        subscription_id, status, request_count, first, new_requester = result
+
+        if status == 'approved':
+            jobs = [reply("✅ 该影片已同意订阅，无需重复请求")]
+        elif not new_requester:
+            jobs = [reply(f"您已经请求过该影片，目前共 {request_count} 人请求")]
+        else:
+            text = "✅ 您的求片请求已提交，请等待管理员处理"
+            if request_count > 1:
+                text += f"（目前共 {request_count} 人请求）"
+            jobs = [reply(text)]
+            # 首次请求发送卡片，之后的请求编辑卡片上的人数
+            if first:
+                router.count(route_name, admin_chat_id)
+            jobs.append(('subscription_card', {
+                'subscription_id': subscription_id,
+                'chat_id': admin_chat_id,
+                'create': first
+            }))
+        submit_jobs(context.bot_data, jobs)
+
+    except Exception as e:
+        logger.error("处理求片请求时出错: %s", str(e))
+        await message.reply_text("❌ 处理求片请求时出错，请稍后重试")
+
+@job_handler('subscription_card')
+async def deliver_subscription_card(pool, payload):
+    """发送或更新求片卡片，处理后在卡片上附上结果并去掉按钮"""
+    subscription = get_subscription(payload['subscription_id'])
+    if subscription is None:
+        raise PermanentJobError(f"订阅不存在: {payload['subscription_id']}")
+    (subscription_id, tmdb_id, media_type, status, request_count,
+     admin_chat_id, admin_message_id, card_count, card_is_photo) = subscription
+    resolution = payload.get('resolution')
+    if resolution is None and status != 'pending':
+        return
+
+    if payload['create']:
+        # 重复执行时不重复发送
+        if admin_message_id is not None:
+            return
+    elif admin_message_id is None:
+        if resolution is not None:
+            # 卡片发出前已被批量处理，不再发送
+            return
+        # 首次请求的卡片还未发出，稍后重试
+        raise RuntimeError("求片卡片尚未发送")
+    elif resolution is None and card_count >= request_count:
+        # 之前的编辑已显示最新人数，多次请求合并为一次编辑
+        return
+
+    metadata = await pool.services['tmdb'].get(tmdb_id, media_type)
+    text = format_card(subscription, metadata, get_subscription_requesters(subscription_id, CARD_REQUESTERS), resolution)
+
+    if not payload['create']:
+        reply_markup = card_markup(subscription_id) if resolution is None else None
+        try:
+            if card_is_photo:
+                await pool.bot.edit_message_caption(
+                    chat_id=admin_chat_id, message_id=admin_message_id,
+                    caption=text, reply_markup=reply_markup
+                )
+            else:
+                await pool.bot.edit_message_text(
+                    chat_id=admin_chat_id, message_id=admin_message_id,
+                    text=text, reply_markup=reply_markup
+                )
+        except BadRequest as e:
+            if 'not modified' not in str(e).lower():
+                raise
+        if resolution is None:
+            set_subscription_card(subscription_id, admin_chat_id, admin_message_id, request_count, card_is_photo)
+        elif get_config().pin_mode != 'dashboard':
+            pool.submit([('unpin', {'chat_id': admin_chat_id, 'message_id': admin_message_id})])
+        return
+
+    chat_id = payload['chat_id']
+    card = None
+    photo = metadata and (metadata['poster_file_id'] or metadata['poster_url'])
+    if photo:
+        try:
+            card = await pool.bot.send_photo(
+                chat_id=chat_id, photo=photo, caption=text, reply_markup=card_markup(subscription_id)
+            )
+            if not metadata['poster_file_id'] and card.photo:
+                pool.services['tmdb'].remember_poster(tmdb_id, media_type, card.photo[-1].file_id)
+        except BadRequest as e:
+            # 海报无法获取时改为发送文字卡片
+            logger.warning("发送海报失败，改为文字卡片: %s", e)
+    if card is None:
+        card = await pool.bot.send_message(chat_id=chat_id, text=text, reply_markup=card_markup(subscription_id))
+    set_subscription_card(subscription_id, chat_id, card.message_id, request_count, bool(card.photo))
+
+    if get_config().pin_mode != 'dashboard':
+        pool.submit([('pin', {'chat_id': chat_id, 'message_id': card.message_id})])
+
+async def subscribe_failed(pool, payload, error):
+    """添加订阅失败时在管理群组中回复求片卡片"""
+    subscription = get_subscription(payload['subscription_id'])
+    admin_group = get_admin_group()
+    chat_id = subscription[5] if subscription and subscription[5] else admin_group and admin_group[0]
+    if not chat_id:
+        return
+    pool.submit([('reply', {
+        'chat_id': chat_id,
+        'reply_to': subscription[6] if subscription else None,
+        'text': f"❌ 添加订阅失败：{payload['title']}\n{error}\n\n可在配置修正后使用 /jobs retry 重试"
+    })])
+
+@job_handler('subscribe', on_dead=subscribe_failed)
+async def deliver_subscribe(pool, payload):
+    """在 MoviePoilt 中添加订阅"""
+    subscription = get_subscription(payload['subscription_id'])
+    if subscription is None:
+        raise PermanentJobError(f"订阅不存在: {payload['subscription_id']}")
+    tmdb_id, media_type = subscription[1], subscription[2]
+
+    metadata = await pool.services['tmdb'].get(tmdb_id, media_type)
+    try:
+        message = await pool.services['moviepoilt'].subscribe(
+            tmdb_id, media_type, metadata and metadata['title'], metadata and metadata['year']
+        )
+    except MoviePoiltError as e:
+        if not e.retryable:
+            raise PermanentJobError(str(e))
+        raise
+    logger.info("已添加订阅 %s/%s %s", media_type, tmdb_id, message)
+
+def resolution_jobs(subscription_id, status, handler_name, subscribe):
+    """处理求片后的任务：更新卡片、通知每个请求用户，同意且 subscribe 为真时添加订阅"""
+    subscription = get_subscription(subscription_id)
+    if subscription is None:
+        return []
+    tmdb_id, media_type = subscription[1], subscription[2]
+    cached = get_tmdb_metadata(tmdb_id, media_type)
+    metadata = {'title': cached[0], 'year': cached[1]} if cached else None
+    title = format_title(tmdb_id, media_type, metadata)
+    content = f"求片 {title}（{MEDIA_TYPES.get(media_type, media_type)}）"
+
+    jobs = [('subscription_card', {
+        'subscription_id': subscription_id,
+        'create': False,
+        'resolution': f"{STATUS_TEXT[status]}\n👮 处理人：{handler_name}"
+    })]
+    if status == 'approved' and subscribe:
+        jobs.append(('subscribe', {'subscription_id': subscription_id, 'title': title}))
+
+    # 在每个请求用户所在的群组加入汇总通知
+    for user_id, username, group_id in get_subscription_requesters(subscription_id):
+        jobs.append(('notify', {
+            'chat_id': group_id,
+            'user_id': user_id,
+            'username': username,
+            'content': content,
+            'status': STATUS_TEXT[status]
+        }))
+    return jobs
+
+@timed(HANDLER_LATENCY)
+@with_log_context
+async def handle_subscription_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """处理求片卡片上的同意/拒绝按钮，卡片更新、用户通知和添加订阅交给投递任务"""
+    query = update.callback_query
+
+    # 检查是否在管理群组中
+    if not is_admin_group(query.message.chat_id):
+        await query.answer()
+        return
+
+    _, action, subscription_id = query.data.split('_')
+    subscription_id = int(subscription_id)
+    status = 'approved' if action == 'approve' else 'rejected'
+
+    if not update_subscription_status(subscription_id, status):
+        await query.answer("⚠️ 该请求已被处理")
+        return
+    await query.answer()
+
+    handler_name = query.from_user.username or query.from_user.first_name
+    subscribe = context.bot_data['moviepoilt'].enabled
+    submit_jobs(context.bot_data, resolution_jobs(subscription_id, status, handler_name, subscribe))
+
+@timed(HANDLER_LATENCY)
+@with_log_context
+async def approve_all_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """同意全部待处理的求片，订阅请求由投递任务并发发送"""
+    if update.effective_user.id not in get_config().admin_ids:
+        await update.message.reply_text("❌ 抱歉，您没有权限执行此操作。")
+        return
+
+    # 检查是否为管理员群组
+    if not is_admin_group(update.effective_chat.id):
+        await update.message.reply_text("此命令只能在管理员群组中使用。")
+        return
+
+    subscription_ids = approve_pending_subscriptions()
+    if not subscription_ids:
+        await update.message.reply_text("目前没有待处理的求片。")
+        return
+
+    handler_name = update.effective_user.username or update.effective_user.first_name
+    subscribe = context.bot_data['moviepoilt'].enabled
+    jobs = []
+    for subscription_id in subscription_ids:
+        jobs.extend(resolution_jobs(subscription_id, 'approved', handler_name, subscribe))
+    submit_jobs(context.bot_data, jobs)
+
+    text = f"✅ 已同意 {len(subscription_ids)} 个求片请求"
+    if subscribe:
+        text += "，正在添加订阅"
+    await update.message.reply_text(text)
@@ -0,0 +1,47 @@
+import logging
+from datetime import time
+from itertools import islice
+from zoneinfo import ZoneInfo
+from database import iter_pending_feedback, get_feedback_admin_chats
+from utils import format_daily_summary
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 按组查询反馈所在管理群组的条数
+SUMMARY_BATCH_SIZE = 500
+
+def parse_daily_time(value, timezone):
+    """将 HH:MM 形式的时间和时区名解析为带时区的 time"""
+    hour, minute = (int(part) for part in value.split(':'))
+    return time(hour, minute, tzinfo=ZoneInfo(timezone))
+
+def schedule_daily_summary(application, callback, value, timezone):
+    """在 JobQueue 中注册每日汇总任务"""
+    when = parse_daily_time(value, timezone)
+    application.job_queue.run_daily(callback, time=when, name='daily_summary')
+    logger.info("已注册每日汇总任务: %s (%s)", value, timezone)
+
+def iter_group_feedback(chat_id, route, batch_size=SUMMARY_BATCH_SIZE):
+    """逐行读取发送到 chat_id 的待处理反馈；没有发送记录的（升级前的反馈）由 route(feedback) 给出所在群组"""
+    pending = iter_pending_feedback()
+    while True:
+        batch = list(islice(pending, batch_size))
+        if not batch:
+            return
+        posted = get_feedback_admin_chats([feedback[0] for feedback in batch]) or {}
+        for feedback in batch:
+            target = posted.get(feedback[0])
+            if (target if target is not None else route(feedback)) == chat_id:
+                yield feedback
+
+async def send_daily_summary(bot, chat_id, feedbacks=None):
+    """分块发送未解决反馈汇总（默认为全部待处理反馈），逐行读取数据库，内存占用与积压量无关"""
+    count = 0
+    for text in format_daily_summary(iter_pending_feedback() if feedbacks is None else feedbacks):
+        try:
+            await bot.send_message(chat_id=chat_id, text=text)
+            count += 1
+        except Exception as e:
+            logger.error("发送每日汇总失败: %s", e)
+    logger.info("已向群组 %s 发送每日汇总，共 %s 条消息", chat_id, count)
@@ -0,0 +1,122 @@
+import logging
+import time
+from collections import OrderedDict
+from config import get_config
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 每个限流器最多保存的条目数
+MAX_ENTRIES = 10000
+
+# 空闲超过此时间（秒）的条目会被清除
+IDLE_TTL = 600
+
+class TokenBucketLimiter:
+    """按键的令牌桶限流，条目按最近访问排序，超出上限或空闲过久时清除"""
+
+    def __init__(self, per_minute, burst, max_entries=MAX_ENTRIES, idle_ttl=IDLE_TTL):
+        self.configure(per_minute, burst)
+        self.max_entries = max_entries
+        self.idle_ttl = idle_ttl
+        self._buckets = OrderedDict()
+
+    def configure(self, per_minute, burst):
+        """调整速率和容量，已有的桶保持不变"""
+        self.rate = per_minute / 60
+        self.burst = burst
+
+    def allow(self, key, now=None):
+        """尝试消耗一个令牌"""
+        now = time.monotonic() if now is None else now
+        self._evict(now)
+
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = [self.burst, now]
+            self._buckets[key] = bucket
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return True
+        return False
+
+    def refund(self, key):
+        """退还一个令牌"""
+        bucket = self._buckets.get(key)
+        if bucket is not None:
+            bucket[0] = min(self.burst, bucket[0] + 1)
+
+    def _evict(self, now):
+        """清除最久未访问的条目"""
+        while self._buckets:
+            key, (_, last) = next(iter(self._buckets.items()))
+            if len(self._buckets) < self.max_entries and now - last < self.idle_ttl:
+                break
+            del self._buckets[key]
+
+    def __len__(self):
+        return len(self._buckets)
+
+class FeedbackThrottle:
+    """反馈提交限流：按用户和按群组各一个令牌桶，被限流时每个窗口只提示一次"""
+
+    def __init__(self, settings):
+        self.users = TokenBucketLimiter(settings.throttle_user_per_minute, settings.throttle_user_burst)
+        self.chats = TokenBucketLimiter(settings.throttle_chat_per_minute, settings.throttle_chat_burst)
+        self.notice_window = settings.throttle_notice_window
+        self._notices = OrderedDict()
+
+    def configure(self, settings):
+        """配置热更新时原地调整参数"""
+        self.users.configure(settings.throttle_user_per_minute, settings.throttle_user_burst)
+        self.chats.configure(settings.throttle_chat_per_minute, settings.throttle_chat_burst)
+        self.notice_window = settings.throttle_notice_window
+
+    def allow(self, chat_id, user_id):
+        """检查是否允许提交"""
+        if not self.users.allow(user_id):
+            return False
+        if not self.chats.allow(chat_id):
+            self.users.refund(user_id)
+            return False
+        return True
+
+    def should_notify(self, chat_id, user_id):
+        """被限流时是否需要发送提示（每个窗口只提示一次）"""
+        now = time.monotonic()
+        while self._notices:
+            key, sent_at = next(iter(self._notices.items()))
+            if len(self._notices) < MAX_ENTRIES and now - sent_at < self.notice_window:
+                break
+            del self._notices[key]
+
+        key = (chat_id, user_id)
+        if key in self._notices:
+            return False
+        self._notices[key] = now
+        return True
+
+async def check_throttle(update, context):
+    """在群组检查之后、其余数据库或 API 操作前检查限流，被限流时返回 False"""
+    throttle = context.bot_data.get('throttle')
+    if throttle is None:
+        throttle = FeedbackThrottle(get_config())
+        context.bot_data['throttle'] = throttle
+
+    chat_id = update.effective_chat.id
+    user_id = update.effective_user.id
+    if throttle.allow(chat_id, user_id):
+        return True
+
+    logger.info("反馈提交被限流: chat_id=%s, user_id=%s", chat_id, user_id)
+    if throttle.should_notify(chat_id, user_id):
+        try:
+            await update.effective_message.reply_text("⏳ 提交过于频繁，请稍后再试。")
+        except Exception as e:
+            logger.error("发送限流提示失败: %s", e)
+    return False
@@ -0,0 +1,96 @@
+import asyncio
+import logging
+import time
+import httpx
+from database import get_tmdb_metadata, save_tmdb_metadata, set_tmdb_poster_file_id
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 请求超时（秒）
+TMDB_TIMEOUT = 10
+
+# 影片类型名称
+MEDIA_TYPES = {
+    'movie': '电影',
+    'tv': '剧集'
+}
+
+class TMDBMetadata:
+    """TMDB 元数据（标题、年份、海报），先查本地缓存，过期或不存在时请求 TMDB
+
+    同一影片的并发查询共用一个请求；请求失败时返回过期的缓存。
+    未配置 API Key 时只使用缓存，不发出请求。
+    """
+
+    def __init__(self, settings):
+        self._client = None
+        self._inflight = {}
+        self.configure(settings)
+
+    def configure(self, settings):
+        """读取 API 地址、Key 和缓存有效期"""
+        self.api_key = settings.tmdb_api_key
+        self.base_url = settings.tmdb_base_url.rstrip('/')
+        self.image_base_url = settings.tmdb_image_base_url.rstrip('/')
+        self.ttl = settings.tmdb_cache_ttl
+
+    async def get(self, tmdb_id, media_type):
+        """获取元数据字典，没有可用数据时返回 None"""
+        cached = get_tmdb_metadata(tmdb_id, media_type)
+        if cached and time.time() - cached[4] < self.ttl:
+            return self._to_dict(cached)
+        if not self.api_key:
+            return self._to_dict(cached) if cached else None
+
+        key = (tmdb_id, media_type)
+        future = self._inflight.get(key)
+        if future is None:
+            future = self._inflight[key] = asyncio.ensure_future(self._fetch(tmdb_id, media_type))
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        try:
+            if await asyncio.shield(future):
+                return self._to_dict(get_tmdb_metadata(tmdb_id, media_type))
+        except Exception as e:
+            logger.warning("获取 TMDB 元数据失败 %s/%s: %s", media_type, tmdb_id, e)
+        return self._to_dict(cached) if cached else None
+
+    async def _fetch(self, tmdb_id, media_type):
+        """请求 TMDB 并写入缓存，影片不存在时返回 False"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=TMDB_TIMEOUT)
+        response = await self._client.get(
+            f"{self.base_url}/{media_type}/{tmdb_id}",
+            params={'api_key': self.api_key, 'language': 'zh-CN'}
+        )
+        if response.status_code == 404:
+            logger.warning("TMDB 中不存在 %s/%s", media_type, tmdb_id)
+            return False
+        response.raise_for_status()
+        data = response.json()
+
+        # 电影和剧集的标题、日期字段名不同
+        title = data.get('title') or data.get('name')
+        date = data.get('release_date') or data.get('first_air_date') or ''
+        save_tmdb_metadata(tmdb_id, media_type, title, date[:4] or None, data.get('poster_path'))
+        return True
+
+    def _to_dict(self, row):
+        """缓存记录转换为字典，附带海报地址"""
+        title, year, poster_path, poster_file_id, fetched_at = row
+        return {
+            'title': title,
+            'year': year,
+            'poster_url': f"{self.image_base_url}{poster_path}" if poster_path else None,
+            'poster_file_id': poster_file_id
+        }
+
+    def remember_poster(self, tmdb_id, media_type, file_id):
+        """记录海报上传到 Telegram 后的 file_id"""
+        set_tmdb_poster_file_id(tmdb_id, media_type, file_id)
+
+    async def close(self):
+        """关闭连接池"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
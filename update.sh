@@ -1,13 +1,9 @@
 #!/bin/bash
 
-# 停止当前运行的机器人进程
-echo "正在停止当前运行的机器人..."
-pkill -f "python bot.py"
+# 进入项目目录
+cd "$(dirname "$0")"
 
-# 等待进程完全停止
-sleep 2
-
-# 执行 git pull 更新代码
+# 执行 git pull 更新代码（旧实例继续运行）
 echo "正在更新代码..."
 git pull
 
@@ -19,15 +15,15 @@ else
     exit 1
 fi
 
-# 启动机器人
-echo "正在启动机器人..."
-nohup python bot.py > bot.log 2>&1 &
+# 启动新实例，预热完成后由旧实例交接轮询
+echo "正在启动新实例..."
+./start_bot.sh
 
 # 检查机器人是否成功启动
 sleep 2
-if pgrep -f "python bot.py" > /dev/null; then
-    echo "机器人已成功启动"
+if ps -p $(cat bot.pid) > /dev/null; then
+    echo "机器人已成功启动，旧实例将在交接后自动退出"
     echo "日志文件：bot.log"
 else
     echo "机器人启动失败，请检查日志文件"
-fi 
\ No newline at end of file
+fi
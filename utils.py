@@ -1,6 +1,14 @@
 import logging
 import json
 import os
+import html
+from datetime import datetime
+
+# Telegram 单条消息最大长度
+MAX_MESSAGE_LENGTH = 4096
+
+# 汇总通知中单条反馈内容的最大长度
+DIGEST_CONTENT_LIMIT = 200
 
 # 配置文件路径
 VIRTUAL_USERS_FILE = 'virtual_users.json'
@@ -15,7 +23,7 @@ def load_virtual_users():
         with open(VIRTUAL_USERS_FILE, 'r', encoding='utf-8') as f:
             return json.load(f)
     except Exception as e:
-        logging.error(f"加载皮套用户配置失败: {e}")
+        logging.error("加载皮套用户配置失败: %s", e)
         return {"virtual_users": [], "keywords": ["皮套", "vtuber", "虚拟"]}
 
 # 检查是否是皮套用户
@@ -41,15 +49,6 @@ def is_virtual_user(user):
     
     return False, None
 
-# 配置日志
-def setup_logging():
-    """配置日志"""
-    logging.basicConfig(
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        level=logging.INFO
-    )
-    return logging.getLogger(__name__)
-
 # 格式化反馈消息
 def format_feedback_message(user, content, category="general", priority="normal"):
     """格式化反馈消息"""
@@ -99,13 +98,106 @@ def format_status_update_message(content, status):
            f"您的反馈: {content}\n" \
            f"状态: {status_icon} {status}"
 
+# 格式化汇总通知中的单条记录
+def format_digest_entry(user_id, username, content, status):
+    """格式化汇总通知条目（HTML，带用户提及）"""
+    status_icon = {
+        "已解决": "✅",
+        "已驳回": "❌"
+    }.get(status, "")
+
+    if len(content) > DIGEST_CONTENT_LIMIT:
+        content = content[:DIGEST_CONTENT_LIMIT] + "…"
+
+    mention = f'<a href="tg://user?id={user_id}">{html.escape(username or str(user_id))}</a>'
+    return f"{mention} 您的反馈: {html.escape(content)}\n状态: {status_icon} {status}\n\n"
+
+# 按长度拆分消息
+def iter_message_chunks(parts, header="", limit=MAX_MESSAGE_LENGTH):
+    """将多段文本依次拼接，生成不超过 limit 的消息块"""
+    for text, _ in iter_message_batches(parts, header, limit):
+        yield text
+
+def iter_message_batches(parts, header="", limit=MAX_MESSAGE_LENGTH):
+    """同 iter_message_chunks，同时给出每个消息块包含的段数 (消息块, 段数)"""
+    chunk = []
+    size = len(header)
+    for part in parts:
+        # 单段超长时截断，避免无法发送
+        if len(header) + len(part) > limit:
+            part = part[:limit - len(header) - 1] + "…"
+        if chunk and size + len(part) > limit:
+            yield header + "".join(chunk), len(chunk)
+            chunk = []
+            size = len(header)
+        chunk.append(part)
+        size += len(part)
+    if chunk:
+        yield header + "".join(chunk), len(chunk)
+
+# 格式化置顶看板
+def format_dashboard(feedbacks, limit=MAX_MESSAGE_LENGTH, total=None):
+    """格式化待处理反馈看板，超出长度时省略剩余条目；total 为待处理总数，默认为 feedbacks 的条数"""
+    total = len(feedbacks) if total is None else total
+    header = f"📌 待处理反馈看板（共 {total} 条）\n\n"
+    if not feedbacks:
+        return header + "目前没有待处理的反馈。"
+
+    text = header
+    for index, feedback in enumerate(feedbacks):
+        content = feedback[3] or ""
+        if len(content) > 60:
+            content = content[:60] + "…"
+        line = f"- #{feedback[0]} {content} (来自: {feedback[2]})\n"
+        # 预留省略提示的位置
+        if len(text) + len(line) > limit - 40:
+            text += f"…还有 {total - index} 条待处理反馈"
+            break
+        text += line
+    else:
+        # feedbacks 只是最紧急的一部分时同样提示剩余条数
+        if total > len(feedbacks):
+            text += f"…还有 {total - len(feedbacks)} 条待处理反馈"
+    return text
+
+# 每日汇总中的优先级分组标题（对应 iter_pending_feedback 的 priority_rank）
+SUMMARY_PRIORITY_TITLES = {
+    0: "🔴 紧急",
+    1: "🟡 高优先级",
+    2: "⚪ 普通",
+    3: "🟢 低优先级",
+    4: "未设置优先级"
+}
+
 # 格式化每日汇总消息
-def format_daily_summary(feedbacks):
-    """格式化每日汇总消息"""
-    summary = "📊 未解决反馈汇总\n\n"
+def format_daily_summary(feedbacks, now=None):
+    """格式化每日汇总消息，按优先级分组，逐块生成不超过长度上限的消息"""
+    return iter_message_chunks(
+        _iter_summary_parts(feedbacks, now or datetime.utcnow()),
+        header="📊 未解决反馈汇总\n\n"
+    )
+
+def _iter_summary_parts(feedbacks, now):
+    """逐条生成每日汇总的文本片段"""
+    current_rank = None
     for feedback in feedbacks:
-        summary += f"用户: {feedback[2]}\n内容: {feedback[3]}\n时间: {feedback[7]}\n\n"
-    return summary
+        rank = feedback[11]  # priority_rank
+        if rank != current_rank:
+            current_rank = rank
+            yield f"【{SUMMARY_PRIORITY_TITLES.get(rank, SUMMARY_PRIORITY_TITLES[4])}】\n"
+
+        # created_at 由 SQLite 以 UTC 写入
+        created_at = feedback[9]
+        try:
+            age = now - datetime.strptime(created_at, '%Y-%m-%d %H:%M:%S')
+            age_text = f"{age.days} 天 {age.seconds // 3600} 小时"
+        except (TypeError, ValueError):
+            age_text = "未知"
+
+        content = feedback[3] or ""
+        if len(content) > DIGEST_CONTENT_LIMIT:
+            content = content[:DIGEST_CONTENT_LIMIT] + "…"
+        yield f"用户: {feedback[2]}\n内容: {content}\n时间: {created_at}（已等待 {age_text}）\n\n"
 
 # 格式化统计信息
 def format_stats_message(stats):
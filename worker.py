@@ -0,0 +1,91 @@
+"""独立的投递进程：与机器人共享数据库，领取并执行 jobs 表中的投递任务
+
+用法示例：
+    python3 worker.py                    # 并发数取配置中的 job_workers
+    python3 worker.py --concurrency 32
+
+机器人的 job_workers 设为 0 时只负责校验和入库，全部由独立进程投递；
+两者也可以同时运行，多个进程通过任务租约分配，互不重复
+"""
+import argparse
+import asyncio
+import dataclasses
+import logging
+import signal
+from telegram import Bot
+from database import init_db
+from dashboard import PendingDashboard
+from jobqueue import JobWorkerPool
+from tmdb import TMDBMetadata
+from moviepoilt import MoviePoiltClient
+from logsetup import setup_logging
+from metrics import InstrumentedRequest
+from config import get_config, add_config_listener, watch_config, install_reload_signal
+import delivery  # 注册各类投递任务的处理函数
+import subscriptions  # 注册求片卡片和添加订阅的处理函数
+import attachments  # 注册复制附件的处理函数
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='投递任务进程')
+    parser.add_argument('--concurrency', type=int, help='同时执行的任务数，默认取配置中的 job_workers')
+    return parser.parse_args()
+
+async def run(args):
+    """领取并执行投递任务，直到收到停止信号"""
+    loop = asyncio.get_running_loop()
+    stop_event = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    def effective(settings):
+        """命令行指定的并发数优先于配置"""
+        if args.concurrency:
+            return dataclasses.replace(settings, job_workers=args.concurrency)
+        return settings
+
+    settings = get_config()
+    bot = Bot(settings.bot_token, request=InstrumentedRequest(connection_pool_size=256))
+    await bot.initialize()
+
+    services = {
+        'dashboard': PendingDashboard(bot, settings.dashboard_debounce, settings.dashboard_min_interval),
+        'tmdb': TMDBMetadata(settings),
+        'moviepoilt': MoviePoiltClient(settings)
+    }
+    pool = JobWorkerPool(bot, services, effective(settings))
+
+    def on_config_change(old, new):
+        """配置热更新"""
+        pool.configure(effective(new))
+        services['dashboard'].debounce = new.dashboard_debounce
+        services['dashboard'].min_interval = new.dashboard_min_interval
+        services['tmdb'].configure(new)
+        services['moviepoilt'].configure(new)
+
+    add_config_listener(on_config_change)
+    watcher = asyncio.create_task(watch_config())
+    install_reload_signal()
+
+    pool.start()
+    await stop_event.wait()
+    logger.info("停止投递进程")
+
+    await pool.stop()
+    await services['tmdb'].close()
+    await services['moviepoilt'].close()
+    watcher.cancel()
+    await bot.shutdown()
+
+def main():
+    """主函数"""
+    args = parse_args()
+    setup_logging(get_config())
+    init_db()
+    asyncio.run(run(args))
+
+if __name__ == '__main__':
+    main()